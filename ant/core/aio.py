@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+"""
+asyncio front end to the ANT node.
+
+AsyncEventMachine, AsyncNode and AsyncChannel mirror EventMachine, Node and
+Channel, but every round-trip to the stick is a coroutine and all
+dispatching happens on the event loop. Drivers exposing a file descriptor
+(USB1Driver) are watched with loop.add_reader; any other driver is read on a
+helper thread that hands the data over to the loop.
+"""
+
+import asyncio
+import collections
+import logging
+import threading
+import time
+import uuid
+
+from ant.core.constants import *
+from ant.core.exceptions import *
+from ant.core import event
+from ant.core import message
+from ant.core.node import NetworkKey
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the startup notification after a reset
+RESET_TIMEOUT = 1.0
+
+
+class AsyncEventMachine(object):
+    def __init__(self, driver):
+        self.driver = driver
+        self.loop = None
+        self.callbacks = []
+        self.running = False
+        self.ack = {}
+        self.msg = {}
+        self.ack_waiters = {}
+        self.msg_waiters = []
+        self.framer = event.FrameBuffer()
+        self._fd = None
+        self._thread = None
+
+    def registerCallback(self, callback):
+        if callback not in self.callbacks:
+            self.callbacks.append(callback)
+
+    def removeCallback(self, callback):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    async def start(self):
+        if self.running:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.running = True
+
+        fileno = getattr(self.driver, 'fileno', None)
+        if fileno is not None:
+            try:
+                self._fd = fileno()
+                self.loop.add_reader(self._fd, self._readable)
+                return
+            except (NotImplementedError, ValueError, OSError):
+                self._fd = None
+
+        self._thread = threading.Thread(target=self._read_thread)
+        self._thread.daemon = True
+        self._thread.start()
+
+    async def stop(self):
+        if not self.running:
+            return
+        self.running = False
+
+        if self._fd is not None:
+            self.loop.remove_reader(self._fd)
+            self._fd = None
+        if self._thread is not None:
+            await self.loop.run_in_executor(None, self._thread.join)
+            self._thread = None
+
+        for waiters in self.ack_waiters.values():
+            for future in waiters:
+                future.cancel()
+        for class_, future in self.msg_waiters:
+            future.cancel()
+        self.ack_waiters = {}
+        self.msg_waiters = []
+
+    def _readable(self):
+        try:
+            data = self.driver.read(event.READ_SIZE)
+        except DriverError as e:
+            logger.error(e)
+            return
+        self.feed(data)
+
+    def _read_thread(self):
+        driver = self.driver
+        while self.running:
+            data = driver.read(event.READ_SIZE)
+            if data:
+                try:
+                    self.loop.call_soon_threadsafe(self.feed, data)
+                except RuntimeError:
+                    break  # Event loop is closed
+            elif not driver.blocking:
+                time.sleep(event.IDLE_SLEEP)
+
+    def feed(self, data):
+        """
+        Frames and dispatches bytes read from the stick. Must be called on
+        the event loop.
+        """
+        if not data:
+            return
+        self.framer.feed(data)
+        for frame in self.framer.frames():
+            try:
+                msg = message.get_proper_message(frame, verify=False)
+            except MessageError as e:
+                logger.debug(e)
+                continue
+            self.dispatch(msg)
+
+    def dispatch(self, msg):
+        if isinstance(msg, message.ChannelEventMessage):
+            self._deliverAck(msg)
+        self._deliverMessage(msg)
+
+        for callback in self.callbacks:
+            callback.process(msg)
+
+    def _deliverAck(self, msg):
+        msg_id = msg.getMessageID()
+        waiters = self.ack_waiters.get(msg_id)
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(msg)
+                return
+
+        queue = self.ack.get(msg_id)
+        if queue is None:
+            queue = self.ack[msg_id] = collections.deque(maxlen=event.MAX_ACK_QUEUE)
+        queue.append(msg)
+
+    def _deliverMessage(self, msg):
+        for idx, (class_, future) in enumerate(self.msg_waiters):
+            if isinstance(msg, class_) and not future.done():
+                del self.msg_waiters[idx]
+                future.set_result(msg)
+                return
+
+        key = msg.__class__
+        queue = self.msg.get(key)
+        if queue is None:
+            queue = self.msg[key] = collections.deque(maxlen=event.MAX_MSG_QUEUE)
+        queue.append(msg)
+
+    async def waitForAck(self, msg, timeout=event.RESPONSE_TIMEOUT):
+        """
+        Awaits the channel response to msg and returns its message code.
+        :raises EventTimeoutError: if no response arrived in time
+        """
+        queue = self.ack.get(msg.msg_id)
+        if queue:
+            return queue.popleft().getMessageCode()
+
+        future = self.loop.create_future()
+        waiters = self.ack_waiters.get(msg.msg_id)
+        if waiters is None:
+            waiters = self.ack_waiters[msg.msg_id] = collections.deque()
+        waiters.append(future)
+        try:
+            response = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise EventTimeoutError('Timed out waiting for response '
+                                    'to message {:02X}.'.format(msg.msg_id))
+        finally:
+            if future in waiters:
+                waiters.remove(future)
+        return response.getMessageCode()
+
+    async def waitForMessage(self, class_, timeout=event.RESPONSE_TIMEOUT):
+        """
+        Awaits a message that is an instance of class_ and returns it.
+        :raises EventTimeoutError: if no such message arrived in time
+        """
+        queue = self.msg.get(class_)
+        if queue:
+            return queue.popleft()
+        for key, queue in self.msg.items():
+            if queue and issubclass(key, class_):
+                return queue.popleft()
+
+        future = self.loop.create_future()
+        waiter = (class_, future)
+        self.msg_waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise EventTimeoutError('Timed out waiting for '
+                                    '{}.'.format(class_.__name__))
+        finally:
+            if waiter in self.msg_waiters:
+                self.msg_waiters.remove(waiter)
+
+
+class AsyncChannel(event.EventCallback):
+    def __init__(self, node, number=0):
+        self.node = node
+        self.is_free = True
+        self.name = str(uuid.uuid4())
+        self.cb = []
+        self.change_filter = None
+        self._queue = asyncio.Queue(maxsize=event.MAX_MSG_QUEUE)
+        # The node hands each channel its own messages only
+        self._number = number
+        self.node.registerChannel(number, self)
+
+    def __del__(self):
+        self.node.removeChannel(self._number, self)
+
+    @property
+    def number(self):
+        return self._number
+
+    @number.setter
+    def number(self, number):
+        self.node.removeChannel(self._number, self)
+        self._number = number
+        self.node.registerChannel(number, self)
+
+    async def _request(self, msg, error):
+        self.write(msg)
+        if await self.node.evm.waitForAck(msg) != RESPONSE_NO_ERROR:
+            raise ChannelError(error)
+
+    async def assign(self, net_key, ch_type):
+        msg = message.ChannelAssignMessage(number=self.number)
+        msg.setNetworkNumber(self.node.getNetworkKey(net_key).number)
+        msg.setChannelType(ch_type)
+        await self._request(msg, 'Could not assign channel.')
+        self.is_free = False
+
+    async def setID(self, dev_type, dev_num, trans_type):
+        msg = message.ChannelIDMessage(number=self.number)
+        msg.setDeviceType(dev_type)
+        msg.setDeviceNumber(dev_num)
+        msg.setTransmissionType(trans_type)
+        await self._request(msg, 'Could not set channel ID.')
+
+    async def setSearchTimeout(self, timeout):
+        msg = message.ChannelSearchTimeoutMessage(number=self.number)
+        msg.setTimeout(timeout)
+        await self._request(msg, 'Could not set channel search timeout.')
+
+    async def setPeriod(self, counts):
+        msg = message.ChannelPeriodMessage(number=self.number)
+        msg.setChannelPeriod(counts)
+        await self._request(msg, 'Could not set channel period.')
+
+    async def setFrequency(self, frequency):
+        msg = message.ChannelFrequencyMessage(number=self.number)
+        msg.setFrequency(frequency)
+        await self._request(msg, 'Could not set channel frequency.')
+
+    async def open(self):
+        msg = message.ChannelOpenMessage(number=self.number)
+        await self._request(msg, 'Could not open channel.')
+
+    async def close(self):
+        msg = message.ChannelCloseMessage(number=self.number)
+        await self._request(msg, 'Could not close channel.')
+
+        while True:
+            msg = await self.node.evm.waitForMessage(message.ChannelEventMessage)
+            if msg.getMessageCode() == EVENT_CHANNEL_CLOSED:
+                break
+
+    async def unassign(self):
+        msg = message.ChannelUnassignMessage(number=self.number)
+        await self._request(msg, 'Could not unassign channel.')
+        self.is_free = True
+
+    def registerCallback(self, callback):
+        if callback not in self.cb:
+            self.cb.append(callback)
+
+    def removeCallback(self, callback):
+        if callback in self.cb:
+            self.cb.remove(callback)
+
+    def setChangeFilter(self, change_filter):
+        """
+        Filters the messages queued and handed to the callbacks through
+        change_filter, see dedup.ChangeFilter, or stops filtering when None.
+        """
+        self.change_filter = change_filter
+
+    def process(self, msg):
+        if self.change_filter is not None and not self.change_filter.accept(msg):
+            return
+        # Keep the newest messages if nobody is consuming messages()
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(msg)
+
+        for callback in self.cb:
+            try:
+                callback.process(msg)
+            except Exception as e:
+                logger.exception(e)
+
+    async def messages(self):
+        """
+        Async iterator over the messages received on this channel.
+        """
+        while True:
+            yield await self._queue.get()
+
+    def __aiter__(self):
+        return self.messages()
+
+    def write(self, msg):
+        logger.debug("Channel writing message:{}".format(msg))
+        self.node.driver.write(msg.encode())
+
+    async def configure_for_profile(self, profile, network=0):
+        for net_key in self.node.networks:
+            if net_key.key == profile.network_key:
+                break
+        else:
+            net_key = NetworkKey(key=profile.network_key)
+            await self.node.setNetworkKey(network, net_key)
+        if self.is_free:
+            await self.assign(net_key.name, profile.channel_type)
+        await self.setID(profile.device_type, profile.device_number,
+                         profile.transmission_type)
+        await self.setFrequency(profile.rf_channel_frequency)
+        await self.setPeriod(profile.channel_period)
+        await self.setSearchTimeout(profile.search_timeout)
+
+
+class AsyncNode(event.EventCallback):
+    def __init__(self, driver):
+        self.driver = driver
+        self.evm = AsyncEventMachine(self.driver)
+        self.evm.registerCallback(self)
+        self.networks = []
+        self.channels = []
+        # Channel number -> the AsyncChannel its messages go to
+        self.routes = {}
+        self.running = False
+        self.options = [0x00, 0x00, 0x00, 0x00]
+
+    async def start(self):
+        if self.running:
+            raise NodeError('Could not start ANT node (already started).')
+
+        if not self.driver.isOpen():
+            self.driver.open()
+
+        await self.evm.start()
+        self.running = True
+        await self.reset()
+        await self.init()
+
+    async def stop(self, reset=True):
+        if not self.running:
+            raise NodeError('Could not stop ANT node (not started).')
+
+        if reset:
+            await self.reset()
+        await self.evm.stop()
+        self.running = False
+        self.driver.close()
+
+    async def reset(self):
+        logger.debug("Sending reset message")
+        self.write(message.SystemResetMessage())
+        try:
+            await self.evm.waitForMessage(message.NotificationStartupMessage,
+                                          timeout=RESET_TIMEOUT)
+        except EventTimeoutError:
+            pass  # Not every stick announces itself after a reset
+
+    async def init(self):
+        if not self.running:
+            raise NodeError('Could not reset ANT node (not started).')
+
+        msg = message.ChannelRequestMessage()
+        msg.setMessageID(MESSAGE_CAPABILITIES)
+        self.write(msg)
+
+        try:
+            caps = await self.evm.waitForMessage(message.CapabilitiesMessage)
+        except EventTimeoutError:
+            raise NodeError('Could not initialize ANT node (no capabilities received).')
+
+        self.networks = []
+        for i in range(0, caps.getMaxNetworks()):
+            self.networks.append(NetworkKey())
+        self.channels = []
+        self.routes = {}
+        for i in range(0, caps.getMaxChannels()):
+            self.channels.append(AsyncChannel(self, i))
+        self.options = (caps.getStdOptions(),
+                        caps.getAdvOptions(),
+                        caps.getAdvOptions2(),
+                        caps.getAdvOptions3(),)
+
+    def getCapabilities(self):
+        return (len(self.channels),
+                len(self.networks),
+                self.options,)
+
+    async def setNetworkKey(self, number, key=None):
+        if not key:
+            return
+        self.networks[number] = key
+
+        msg = message.NetworkKeyMessage()
+        msg.setNumber(number)
+        msg.setKey(self.networks[number].key)
+        self.write(msg)
+        await self.evm.waitForAck(msg)
+        self.networks[number].number = number
+
+    def getNetworkKey(self, name):
+        for netkey in self.networks:
+            if netkey.name == name:
+                return netkey
+        raise NodeError('Could not find network key with the supplied name.')
+
+    def getFreeChannel(self):
+        for channel in self.channels:
+            if channel.is_free:
+                return channel
+        raise NodeError('Could not find free channel.')
+
+    def registerEventListener(self, callback):
+        self.evm.registerCallback(callback)
+
+    def registerChannel(self, number, channel):
+        """
+        Routes the ChannelMessages for channel number to channel, replacing
+        the channel previously routed there.
+        """
+        self.routes[number] = channel
+
+    def removeChannel(self, number, channel=None):
+        """
+        Stops routing channel number, only if it is routed to channel when
+        one is given.
+        """
+        if channel is None or self.routes.get(number) is channel:
+            self.routes.pop(number, None)
+
+    def process(self, msg):
+        if isinstance(msg, message.ChannelMessage):
+            channel = self.routes.get(msg.get_channel_number())
+            if channel is not None:
+                channel.process(msg)
+
+    def write(self, msg):
+        logger.debug("Writing message: {}".format(msg))
+        self.driver.write(msg.encode())
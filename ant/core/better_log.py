@@ -26,6 +26,8 @@
 import time
 import datetime
 
+from ant.core.log import LogThread
+
 
 EVENT_OPEN = 0x01
 EVENT_CLOSE = 0x02
@@ -44,6 +46,14 @@ def event_code(int_code):
         return "EVENT_WRITE"
 
 
+EVENT_CODES = {
+    "EVENT_OPEN": EVENT_OPEN,
+    "EVENT_CLOSE": EVENT_CLOSE,
+    "EVENT_READ": EVENT_READ,
+    "EVENT_WRITE": EVENT_WRITE,
+}
+
+
 class LogReader(object):
     def __init__(self, filename):
         self.is_open = False
@@ -60,8 +70,9 @@ class LogReader(object):
         self.fd = open(filename, 'r')
         self.is_open = True
 
-        header = self.fd.read()
+        header = self.fd.readline().rstrip('\n')
         if header != 'ANT-LOG':
+            self.close()
             raise IOError('Could not open log file (unknown format).')
 
     def close(self):
@@ -70,7 +81,28 @@ class LogReader(object):
             self.is_open = False
 
     def read(self):
-        return self.fd.read()
+        """
+        Returns the next event as (event, timestamp, data), timestamp being
+        in nanoseconds since the epoch, or None at the end of the log. Lines
+        written by logMsg are skipped.
+        """
+        for line in self.fd:
+            fields = line.split(None, 2)
+            if len(fields) < 2 or not fields[1].endswith(':'):
+                continue
+            event = EVENT_CODES.get(fields[1][:-1])
+            if event is None:
+                continue
+            data = bytes.fromhex(fields[2]) if len(fields) > 2 else b''
+            return (event, int(fields[0]) * 1000000000, data)
+        return None
+
+    def __iter__(self):
+        while True:
+            record = self.read()
+            if record is None:
+                return
+            yield record
 
 
 class LogWriter(object):
@@ -81,7 +113,7 @@ class LogWriter(object):
 
     def __del__(self):
         if self.is_open:
-            self.fd.close()
+            self.close()
 
     def open(self, filename=''):
         if filename == '':
@@ -96,18 +128,33 @@ class LogWriter(object):
 
         header = 'ANT-LOG\n'  # [MAGIC, VERSION]
         self.fd.write(header)
+        self.writer = LogThread(self._writeEvent, self.fd.flush)
+
+    @property
+    def dropped(self):
+        return self.writer.dropped
 
     def close(self):
         if self.is_open:
+            self.writer.stop()
             self.fd.close()
             self.is_open = False
 
+    def flush(self):
+        if self.is_open:
+            self.writer.flush()
+
     def _logEvent(self, event, data=None):
-        if data is None:
+        if not data:
             return
-        timestamp = int(time.time())
-        encoded = self.encode(data)
-        event_str = "{} {}: {}\n".format(timestamp, event_code(event), encoded)
+        self.writer.put((event, int(time.time()), data))
+
+    def _writeEvent(self, event, timestamp, data):
+        if event is None:
+            event_str = "{}: {}\n".format(timestamp, data)
+        else:
+            encoded = self.encode(data)
+            event_str = "{} {}: {}\n".format(timestamp, event_code(event), encoded)
 
         self.fd.write(event_str)
 
@@ -124,10 +171,7 @@ class LogWriter(object):
         self._logEvent(EVENT_WRITE, data)
 
     def encode(self, data):
-        return "".join(["{:02X}".format(byte) for byte in data])
+        return bytes(data).hex().upper()
 
     def logMsg(self, msg):
-        raw_msg = msg.raw()
-        timestamp = int(time.time())
-        event_str = "{}: {}\n".format(timestamp, raw_msg)
-        self.fd.write(event_str)
\ No newline at end of file
+        self.writer.put((None, int(time.time()), msg.raw()))
\ No newline at end of file
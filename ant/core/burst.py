@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import threading
+import time
+
+from ant.core.constants import *
+from ant.core import event
+from ant.core import message
+from ant.core.exceptions import ChannelError
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# Bytes preallocated for each channel's transfer, grown as needed
+BURST_BUFFER_SIZE = 1024
+
+BURST_PACKET_SIZE = 8
+# Packet sizes advanced burst can be configured for, and the matching
+# ConfigureAdvancedBurstMessage max packet length
+ADVANCED_BURST_PACKET_SIZES = {
+    8: ADVANCED_BURST_MAX_PACKET_8_BYTES,
+    16: ADVANCED_BURST_MAX_PACKET_16_BYTES,
+    24: ADVANCED_BURST_MAX_PACKET_24_BYTES,
+}
+
+# Sequence number expected after each one, 0 only ever starts a transfer
+NEXT_SEQUENCE = (1, 2, 3, 1)
+
+# Seconds to wait for a sent transfer to complete, and how many times a
+# failed transfer is sent again
+BURST_TIMEOUT = 10.0
+BURST_RETRIES = 3
+
+# Responses to a burst packet that mean the transfer did not go through
+BURST_ERRORS = (TRANSFER_IN_PROGRESS, TRANSFER_SEQUENCE_NUMBER_ERROR,
+                TRANSFER_IN_ERROR, CHANNEL_NOT_OPENED, CHANNEL_IN_WRONG_STATE)
+
+
+def encode_burst(number, data, packet_size=BURST_PACKET_SIZE):
+    """
+    Splits data into sequenced burst packets, padding the last one with
+    zeros, and encodes them back to back into a single buffer.
+    :param packet_size: 8 for standard burst, 16 or 24 for advanced burst
+    :return: (frames, packets)
+    """
+    if packet_size not in ADVANCED_BURST_PACKET_SIZES:
+        raise ChannelError('Could not encode burst (invalid packet size).')
+    msg_id = MESSAGE_CHANNEL_BURST_DATA
+    if packet_size != BURST_PACKET_SIZE:
+        msg_id = MESSAGE_ADVANCED_BURST_DATA
+    count = max(1, (len(data) + packet_size - 1) // packet_size)
+    frame_size = packet_size + 5
+    frames = bytearray(count * frame_size)
+    sequence = 0
+    for i in range(count):
+        channel = number | (sequence << 5)
+        if i == count - 1:
+            channel |= 0x80
+        start = i * frame_size
+        frames[start:start + 4] = bytes((MESSAGE_TX_SYNC, packet_size + 1,
+                                         msg_id, channel))
+        packet = data[i * packet_size:(i + 1) * packet_size]
+        frames[start + 4:start + 4 + len(packet)] = packet
+        frames[start + frame_size - 1] = message.checksum(
+            memoryview(frames)[start:start + frame_size - 1])
+        sequence = NEXT_SEQUENCE[sequence]
+    return bytes(frames), count
+
+
+class BurstTransfer(object):
+    """
+    A completed burst transfer: the data of all its packets, in order.
+    """
+
+    def __init__(self, number, data, packets, started, finished):
+        self.number = number
+        self.data = data
+        self.packets = packets
+        self.started = started
+        self.finished = finished
+
+    def get_channel_number(self):
+        return self.number
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return '<BurstTransfer channel={} packets={} bytes={}>'.format(
+            self.number, self.packets, len(self.data))
+
+
+class BurstReport(object):
+    """
+    How a transfer sent with Channel.send_burst went.
+    """
+
+    def __init__(self, number, size, packets, attempts, started, finished):
+        self.number = number
+        self.size = size
+        self.packets = packets
+        self.attempts = attempts
+        self.started = started
+        self.finished = finished
+
+    @property
+    def seconds(self):
+        return self.finished - self.started
+
+    @property
+    def throughput(self):
+        """
+        Bytes per second, from the start of the last attempt to its
+        completion.
+        """
+        seconds = self.seconds
+        return self.size / seconds if seconds > 0 else float('inf')
+
+    def __repr__(self):
+        return '<BurstReport channel={} bytes={} attempts={} {:.0f} B/s>'.format(
+            self.number, self.size, self.attempts, self.throughput)
+
+
+class BurstTracker(event.EventCallback):
+    """
+    Follows the events of the transfer being sent on a channel.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.started = None
+        self.result = None
+
+    def reset(self):
+        with self.condition:
+            self.started = None
+            self.result = None
+
+    def process(self, msg):
+        if not isinstance(msg, message.ChannelEventMessage):
+            return
+        msg_id = msg.getMessageID()
+        code = msg.getMessageCode()
+        with self.condition:
+            if msg_id == MESSAGE_CHANNEL_EVENT_RF and code == EVENT_TRANSFER_TX_START:
+                self.started = time.monotonic()
+            elif msg_id == MESSAGE_CHANNEL_EVENT_RF and \
+                    code in (EVENT_TRANSFER_TX_COMPLETED, EVENT_TRANSFER_TX_FAILED):
+                self.result = code
+                self.condition.notify_all()
+            elif msg_id in (MESSAGE_CHANNEL_BURST_DATA, MESSAGE_ADVANCED_BURST_DATA) \
+                    and code in BURST_ERRORS:
+                self.result = EVENT_TRANSFER_TX_FAILED
+                self.condition.notify_all()
+
+    def wait(self, timeout=BURST_TIMEOUT):
+        """
+        Waits for the transfer to complete or fail.
+        :return: EVENT_TRANSFER_TX_COMPLETED, EVENT_TRANSFER_TX_FAILED or
+                 None on timeout
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.result is not None, timeout)
+            return self.result
+
+
+class _BurstState(object):
+    def __init__(self, size):
+        self.buffer = bytearray(size)
+        self.length = 0
+        self.packets = 0
+        self.expected = None
+        self.started = None
+
+    def write(self, data):
+        end = self.length + len(data)
+        if end > len(self.buffer):
+            # Double rather than grow per packet, the buffer is kept and
+            # reused by the next transfer
+            self.buffer.extend(bytes(max(len(self.buffer), end - len(self.buffer))))
+        self.buffer[self.length:end] = data
+        self.length = end
+        self.packets += 1
+
+    def reset(self):
+        self.length = 0
+        self.packets = 0
+        self.expected = None
+        self.started = None
+
+
+class BurstReassembler(event.EventCallback, event.CallbackDispatcher):
+    """
+    Collects ChannelBurstDataMessage packets (and AdvancedBurstDataMessage
+    ones, whatever their size) into whole transfers and hands each
+    completed BurstTransfer to its callbacks, instead of one callback per
+    packet. Register it with a Node (it keeps one transfer per channel)
+    or with a single Channel.
+
+    Transfers with a missing or out-of-order packet, or that the stick
+    reports as EVENT_TRANSFER_RX_FAILED, are discarded and counted.
+    """
+
+    def __init__(self, size=BURST_BUFFER_SIZE):
+        event.CallbackDispatcher.__init__(self)
+        self.size = size
+        self.states = {}
+        self.completed = 0
+        self.failed = 0
+
+    def process(self, msg):
+        if isinstance(msg, message.ChannelBurstDataMessage):
+            self._packet(msg)
+        elif isinstance(msg, message.ChannelEventMessage) and \
+                msg.getMessageID() == MESSAGE_CHANNEL_EVENT_RF and \
+                msg.getMessageCode() == EVENT_TRANSFER_RX_FAILED:
+            state = self.states.get(msg.get_channel_number())
+            if state is not None and state.started is not None:
+                self._fail(msg.get_channel_number(), state, 'reported by the stick')
+
+    def _packet(self, msg):
+        number = msg.get_channel_number()
+        state = self.states.get(number)
+        if state is None:
+            state = self.states[number] = _BurstState(self.size)
+
+        sequence = msg.getSequenceNumber()
+        if sequence == 0:
+            if state.started is not None:
+                self._fail(number, state, 'restarted')
+            state.started = time.monotonic()
+        elif sequence != state.expected:
+            if state.started is not None:
+                self._fail(number, state, 'sequence error')
+            return
+
+        state.write(msg.getData())
+        state.expected = NEXT_SEQUENCE[sequence]
+        if msg.isLastPacket():
+            transfer = BurstTransfer(number, bytes(state.buffer[:state.length]),
+                                     state.packets, state.started, time.monotonic())
+            state.reset()
+            self.completed += 1
+            self._deliver(transfer)
+
+    def _fail(self, number, state, reason):
+        logger.debug('Burst transfer on channel {} failed ({}) after {} '
+                     'packets.'.format(number, reason, state.packets))
+        state.reset()
+        self.failed += 1
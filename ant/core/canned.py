@@ -25,8 +25,10 @@
 
 
 
+import threading
+
 from ant.core.message import *
-from ant.core.driver import Driver
+from ant.core.driver import Driver, READ_TIMEOUT
 
 from ant.core.exceptions import DriverError
 
@@ -38,8 +40,10 @@ logger = logging.getLogger(__name__)
 
 
 class CannedDriver(Driver):
-    def __init__(self, device, log=None, debug=False):
-        Driver.__init__(self, device, log, debug)
+    blocking = True
+
+    def __init__(self, device, log=None, debug=False, timeout=READ_TIMEOUT):
+        Driver.__init__(self, device, log, debug, timeout)
         # self.input_file_name = '/Users/dbrim/Development/python-ant-develop/src/inputfile.ant'
         # self.output_file_name = '/Users/dbrim/Development/python-ant-develop/src/outputfile.ant'
         # self.input_file = None
@@ -47,6 +51,7 @@ class CannedDriver(Driver):
         self.responses = {}
 
         self._next_read_buffer = None
+        self._readable = threading.Event()
 
     def _open(self):
         pass
@@ -60,9 +65,11 @@ class CannedDriver(Driver):
 
     def _read(self, count):
         # print('calling read')
+        self._readable.wait(self.timeout)
         if self._next_read_buffer:
             local = self._next_read_buffer
             self._next_read_buffer = None
+            self._readable.clear()
             return local
 
         read = b''
@@ -71,6 +78,7 @@ class CannedDriver(Driver):
     def _write(self, data):
         if data in self.responses:
             self._next_read_buffer = self.responses[data]() # Call the response generator
+            self._readable.set()
         # count = self.output_file.write(data)
         return len(data)
 
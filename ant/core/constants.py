@@ -36,6 +36,8 @@ MESSAGE_CHANNEL_TX_POWER = 0x60
 MESSAGE_NETWORK_KEY = 0x46
 MESSAGE_TX_POWER = 0x47
 MESSAGE_PROXIMITY_SEARCH = 0x71
+MESSAGE_CONFIGURE_ADVANCED_BURST = 0x78
+MESSAGE_LIB_CONFIG = 0x6E
 
 # Notification messages
 MESSAGE_STARTUP = 0x6F
@@ -46,14 +48,22 @@ MESSAGE_CHANNEL_OPEN = 0x4B
 MESSAGE_CHANNEL_CLOSE = 0x4C
 MESSAGE_CHANNEL_REQUEST = 0x4D
 MESSAGE_CHANNEL_RESPONSE = 0x40
+MESSAGE_OPEN_RX_SCAN_MODE = 0x5B
 
 # Data messages
 MESSAGE_CHANNEL_BROADCAST_DATA = 0x4E
 MESSAGE_CHANNEL_ACKNOWLEDGED_DATA = 0x4F
 MESSAGE_CHANNEL_BURST_DATA = 0x50
+MESSAGE_EXTENDED_BROADCAST_DATA = 0x5D
+MESSAGE_EXTENDED_ACKNOWLEDGED_DATA = 0x5E
+MESSAGE_EXTENDED_BURST_DATA = 0x5F
+MESSAGE_ADVANCED_BURST_DATA = 0x72
 
 # Channel event messages
 MESSAGE_CHANNEL_EVENT = 0x40
+# Message ID of channel events that come from the RF link rather than
+# answer a request
+MESSAGE_CHANNEL_EVENT_RF = 0x01
 
 # Requested response messages
 MESSAGE_CHANNEL_STATUS = 0x52
@@ -62,6 +72,9 @@ MESSAGE_VERSION = 0x3E
 MESSAGE_CAPABILITIES = 0x54
 MESSAGE_SERIAL_NUMBER = 0x61
 
+# Error messages
+MESSAGE_SERIAL_ERROR = 0xAE
+
 # Message parameters
 CHANNEL_TYPE_TWOWAY_RECEIVE = 0x00
 CHANNEL_TYPE_TWOWAY_TRANSMIT = 0x10
@@ -114,8 +127,17 @@ EXTENDED_FORMAT_FLAG_CHANNEL_ID = 0x80
 EXTENDED_FORMAT_FLAG_RSSI = 0x40
 EXTENDED_FORMAT_FLAG_TIMESTAMP = 0x20
 EXTENDED_FORMAT_FLAG_CHANNEL_ID_BYTES = 4
-EXTENDED_FORMAT_FLAG_RSSI_BYTES = 4
-EXTENDED_FORMAT_FLAG_TIMESTAMP = 2
+EXTENDED_FORMAT_FLAG_RSSI_BYTES = 3
+EXTENDED_FORMAT_FLAG_TIMESTAMP_BYTES = 2
+# RX timestamps count ticks of this many per second
+EXTENDED_TIMESTAMP_RATE = 32768
+EXTENDED_MEASUREMENT_TYPE_RSSI = 0x20
+
+
+# Advanced burst maximum packet lengths
+ADVANCED_BURST_MAX_PACKET_8_BYTES = 0x01
+ADVANCED_BURST_MAX_PACKET_16_BYTES = 0x02
+ADVANCED_BURST_MAX_PACKET_24_BYTES = 0x03
 
 
 # Capabilities
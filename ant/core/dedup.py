@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import time
+
+from ant.core import message
+
+
+class ChangeFilter(object):
+    """
+    Drops the broadcast data messages that repeat the last one delivered,
+    see Channel.setChangeFilter(). Sensors rebroadcast their data several
+    times a second while nothing changes, only changes, and an unchanged
+    payload every heartbeat seconds when heartbeat is given, get through.
+    Other messages always do.
+
+    With page_mask given, payloads are compared to the last one of the
+    same page, byte 0 masked with page_mask, so that profiles rotating
+    through several pages are filtered too. Use 0x7F for profiles that
+    flip bit 7 as a toggle, such as heart rate monitors.
+
+    passed and suppressed count the broadcast data messages let through
+    and dropped.
+    """
+
+    def __init__(self, heartbeat=None, page_mask=None, clock=time.monotonic):
+        self.heartbeat = heartbeat
+        self.page_mask = page_mask
+        self.clock = clock
+        self.passed = 0
+        self.suppressed = 0
+        # Page (None when not paged) -> (payload, time delivered)
+        self._last = {}
+
+    def accept(self, msg):
+        """
+        :return: whether msg should be delivered
+        """
+        if not isinstance(msg, message.ChannelBroadcastDataMessage):
+            return True
+        payload = msg.payload
+        if self.page_mask is None:
+            page = None
+            data = bytes(payload[1:9])
+        else:
+            page = payload[1] & self.page_mask
+            data = bytes(payload[2:9])
+
+        now = self.clock() if self.heartbeat is not None else None
+        last = self._last.get(page)
+        if last is not None and last[0] == data and \
+                (now is None or now - last[1] < self.heartbeat):
+            self.suppressed += 1
+            return False
+        self._last[page] = (data, now)
+        self.passed += 1
+        return True
+
+    @property
+    def ratio(self):
+        """
+        The share of broadcast data messages suppressed so far.
+        """
+        total = self.passed + self.suppressed
+        return self.suppressed / float(total) if total else 0.0
+
+    def reset(self):
+        """
+        Forgets the payloads delivered, the next message of each page gets
+        through.
+        """
+        self._last.clear()
@@ -23,6 +23,7 @@
 #
 ##############################################################################
 
+import errno
 import threading
 
 # USB1 driver uses a USB<->Serial bridge
@@ -39,16 +40,31 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+LIBUSB_ERROR_TIMEOUT = -7
+
+# Seconds a read blocks waiting for data before returning empty-handed
+READ_TIMEOUT = 0.1
+
+
 def encode_bytes(data):
     return " ".join(["{:02X}".format(byte) for byte in data])
 
 class Driver(object):
-    _lock = threading.Lock()
-
-    def __init__(self, device, log=None, debug=False):
+    # True if _read blocks for up to self.timeout until data arrives, so
+    # the event pump does not have to sleep between empty reads
+    blocking = False
+
+    def __init__(self, device, log=None, debug=False, timeout=READ_TIMEOUT):
+        # Reads may block, so they get a lock of their own and never keep
+        # writers waiting. Always acquired in the order _read_lock,
+        # _write_lock, _lock.
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._write_lock = threading.Lock()
         self.device = device
         self.debug = debug
         self.log = log
+        self.timeout = timeout
         self.is_open = False
 
     def isOpen(self):
@@ -58,9 +74,7 @@ class Driver(object):
         return io
 
     def open(self):
-        self._lock.acquire()
-
-        try:
+        with self._read_lock, self._write_lock, self._lock:
             if self.is_open:
                 raise DriverError("Could not open device (already open).")
 
@@ -68,13 +82,9 @@ class Driver(object):
             self.is_open = True
             if self.log:
                 self.log.logOpen()
-        finally:
-            self._lock.release()
 
     def close(self):
-        self._lock.acquire()
-
-        try:
+        with self._read_lock, self._write_lock, self._lock:
             if not self.is_open:
                 raise DriverError("Could not close device (not open).")
 
@@ -82,34 +92,29 @@ class Driver(object):
             self.is_open = False
             if self.log:
                 self.log.logClose()
-        finally:
-            self._lock.release()
+                # Make sure everything captured so far reaches the disk
+                self.log.flush()
 
     def read(self, count):
-        self._lock.acquire()
-
-        try:
-            if not self.is_open:
+        with self._read_lock:
+            if not self.isOpen():
                 raise DriverError("Could not read from device (not open).")
             if count <= 0:
                 raise DriverError("Could not read from device (zero request).")
 
             data = self._read(count)
             if self.log:
-                self.log.logRead(data)
+                with self._lock:
+                    self.log.logRead(data)
 
             if self.debug:
                 self._dump(data, 'READ')
-        finally:
-            self._lock.release()
 
         return data
 
     def write(self, data):
-        self._lock.acquire()
-
-        try:
-            if not self.is_open:
+        with self._write_lock:
+            if not self.isOpen():
                 raise DriverError("Could not write to device (not open).")
             if len(data) <= 0:
                 raise DriverError("Could not write to device (no data).")
@@ -118,15 +123,13 @@ class Driver(object):
             ret = self._write(data)
             data_written = data[0:ret]
             if self.log:
-                self.log.logWrite(data_written)
+                with self._lock:
+                    self.log.logWrite(data_written)
 
             # Before logging, to show what we actually wrote
             if self.debug:
                 self._dump(data_written, 'WROTE')
 
-        finally:
-            self._lock.release()
-
         return ret
 
     def _dump(self, data, title):
@@ -150,8 +153,11 @@ class Driver(object):
 
 
 class USB1Driver(Driver):
-    def __init__(self, device, baud_rate=115200, log=None, debug=False):
-        Driver.__init__(self, device, log, debug)
+    blocking = True
+
+    def __init__(self, device, baud_rate=115200, log=None, debug=False,
+                 timeout=READ_TIMEOUT):
+        Driver.__init__(self, device, log, debug, timeout)
         self.baud = baud_rate
 
     def _open(self):
@@ -164,13 +170,22 @@ class USB1Driver(Driver):
             raise DriverError('Could not open device')
 
         self._serial = dev
-        self._serial.timeout = 0.01
+        self._serial.timeout = self.timeout
 
     def _close(self):
         self._serial.close()
 
+    def fileno(self):
+        return self._serial.fileno()
+
     def _read(self, count):
-        return self._serial.read(count)
+        # Block for the first byte, then drain whatever else is buffered
+        data = self._serial.read(1)
+        if data and count > 1:
+            waiting = min(self._serial.in_waiting, count - 1)
+            if waiting:
+                data += self._serial.read(waiting)
+        return data
 
     def _write(self, data):
         try:
@@ -183,6 +198,8 @@ class USB1Driver(Driver):
 
 
 class USB2Driver(Driver):
+    blocking = True
+
     def _open(self):
         # Most of this is straight from the PyUSB example documentation		
         dev = usb.core.find(idVendor=0x0fcf, idProduct=0x1008)
@@ -223,14 +240,19 @@ class USB2Driver(Driver):
         usb.util.release_interface(self._dev, self._int)
 
     def _read(self, count):
-        arr_inp = array('B')
+        # Ask for whole packets so a single transfer drains the endpoint
+        packet_size = self._ep_in.wMaxPacketSize
+        size = max(packet_size, count + (-count % packet_size))
+        timeout = 0 if self.timeout is None else int(self.timeout * 1000)
         try:
-            arr_inp = self._ep_in.read(count)
-        except usb.core.USBError:
-            # Timeout errors seem to occasionally be expected
-            pass
+            arr_inp = self._ep_in.read(size, timeout)
+        except usb.core.USBError as e:
+            if e.errno == errno.ETIMEDOUT or \
+                    getattr(e, 'backend_error_code', None) == LIBUSB_ERROR_TIMEOUT:
+                return b''
+            raise DriverError(str(e))
 
-        return arr_inp.tostring()
+        return arr_inp.tobytes()
 
     def _write(self, data):
         count = self._ep_out.write(data)
@@ -28,45 +28,148 @@
 # don't-fix-it-if-it-ain't-broken kind of threaded code ahead.
 #
 
+import collections
 import logging
 import threading
 import time
 
 from ant.core.constants import *
 import ant.core.message
-from ant.core.exceptions import MessageError
+from ant.core.exceptions import MessageError, EventTimeoutError, EventError
 
 MAX_ACK_QUEUE = 25
 MAX_MSG_QUEUE = 25
 
+# Seconds to wait for a response before giving up, None waits forever
+RESPONSE_TIMEOUT = 10.0
+
+# Bytes requested per driver read, the drivers return whatever is available
+READ_SIZE = 512
+# Seconds to sleep after an empty read from a non-blocking driver
+IDLE_SLEEP = 0.002
+
+FRAME_BUFFER_SIZE = 4096
+MAX_FRAME_PAYLOAD = 64
+
+# Defaults for CallbackExecutor
+EXECUTOR_SHARDS = 4
+MAX_SHARD_QUEUE = 256
+
+# What CallbackExecutor.submit does when a shard's queue is full
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'drop-oldest'
+OVERFLOW_DROP_NEWEST = 'drop-newest'
+
 logger = logging.getLogger(__name__)
 
 
+class FrameBuffer(object):
+    """
+    Streaming framer for the bytes read from the stick.
+
+    Data is appended at a write cursor and complete frames are handed out as
+    memoryview slices at the read cursor, so nothing is re-sliced or copied
+    while parsing. The buffer is never overwritten in place: once it fills
+    up, the unconsumed tail is moved into a fresh buffer, which keeps any
+    previously yielded view valid for as long as it is referenced.
+    """
+
+    def __init__(self, size=FRAME_BUFFER_SIZE):
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self.discarded = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def feed(self, data):
+        count = len(data)
+        if not count:
+            return
+        if self._end + count > len(self._buf):
+            self._renew(count)
+        self._buf[self._end:self._end + count] = data
+        self._end += count
+
+    def _renew(self, count):
+        pending = self._end - self._start
+        size = len(self._buf)
+        while size < pending + count:
+            size *= 2
+        buf = bytearray(size)
+        buf[:pending] = self._view[self._start:self._end]
+        self._buf = buf
+        self._view = memoryview(buf)
+        self._start = 0
+        self._end = pending
+
+    def pending(self):
+        return self._view[self._start:self._end]
+
+    def frames(self):
+        """
+        Yields every complete, checksum-valid frame in the buffer. Leading
+        garbage and frames failing the checksum are dropped by resyncing on
+        the next MESSAGE_TX_SYNC byte.
+        """
+        buf = self._buf
+        view = self._view
+        while True:
+            start = self._start
+            end = self._end
+            if start < end and buf[start] != MESSAGE_TX_SYNC:
+                sync = buf.find(MESSAGE_TX_SYNC, start, end)
+                if sync < 0:
+                    sync = end
+                self.discarded += sync - start
+                self._start = start = sync
+            if end - start < 4:
+                return
+
+            length = buf[start + 1]
+            if length > MAX_FRAME_PAYLOAD:
+                self._resync(start)
+                continue
+            size = length + 4
+            if end - start < size:
+                return
+
+            frame = view[start:start + size]
+            if ant.core.message.checksum(frame[:-1]) != frame[-1]:
+                self._resync(start)
+                continue
+
+            self._start = start + size
+            yield frame
+
+    def _resync(self, start):
+        self.discarded += 1
+        self._start = start + 1
+
+
 def ProcessBuffer(buffer_):
+    # Sized to the input, the framer never grows here
+    framer = FrameBuffer(len(buffer_))
+    framer.feed(buffer_)
     messages = []
 
-    while True:
-        # hf = Message()
+    for frame in framer.frames():
         try:
-            # msg = hf.get_handler(buffer_)
-            msg = ant.core.message.get_proper_message(buffer_)
-            if not msg:
-                break
-            buffer_ = buffer_[len(msg.get_payload()) + 4:]
-            messages.append(msg)
+            messages.append(ant.core.message.get_proper_message(frame, verify=False))
         except MessageError as e:
-            # print("MessageError for: {}".format(hf))
-            if e.internal == "CHECKSUM":
-                buffer_ = buffer_[ord(buffer_[1]) + 4:]
-            else:
-                logger.debug(e)
-                break
-    return (buffer_, messages,)
+            logger.debug(e)
+    return (bytes(framer.pending()), messages,)
 
 
 class EventPumper(object):
     def __init__(self):
-        self._forced_buffer = []
+        self._forced_buffer = collections.deque()
+        # Counters for gauging how busy (or idle) the pump thread is
+        self.reads = 0
+        self.empty_reads = 0
+        self.bytes_read = 0
 
     def force_buffer(self, byte_data=b''):
         self._forced_buffer.append(byte_data)
@@ -77,7 +180,7 @@ class EventPumper(object):
         evm.pump_lock.release()
 
         go = True
-        buffer_ = b''
+        framer = FrameBuffer()
         while go:
             evm.running_lock.acquire()
             if not evm.running:
@@ -85,81 +188,333 @@ class EventPumper(object):
             evm.running_lock.release()
 
             if len(self._forced_buffer):
-                buffer_ += self._forced_buffer[0]
-                self._forced_buffer = [] if len(self._forced_buffer) == 1 else self._forced_buffer[1:]
+                data = self._forced_buffer.popleft()
             else:
-                buffer_ += evm.driver.read(30)
-            if len(buffer_) == 0:
+                driver = evm.driver
+                data = driver.read(READ_SIZE)
+                self.reads += 1
+                if not data:
+                    self.empty_reads += 1
+                    # Drivers that return straight away need throttling,
+                    # blocking ones already waited for data to arrive
+                    if not driver.blocking:
+                        time.sleep(IDLE_SLEEP)
+                    continue
+            self.bytes_read += len(data)
+            framer.feed(data)
+
+            messages = []
+            for frame in framer.frames():
+                try:
+                    messages.append(ant.core.message.get_proper_message(frame, verify=False))
+                except MessageError as e:
+                    logger.debug(e)
+
+            if evm.executor is not None:
+                self._submit(evm, messages)
                 continue
-            buffer_, messages = ProcessBuffer(buffer_)
 
             evm.callbacks_lock.acquire()
             # print("acquired callbacks_lock. messages: {}".format(messages))
+            channels = evm.channels
             for message in messages:
                 for callback in evm.callbacks:
                     # try:
                     callback.process(message)
                     # except Exception as e:
                     # pass
+                if channels and isinstance(message, ant.core.message.ChannelMessage):
+                    channel = channels.get(message.get_channel_number())
+                    if channel is not None:
+                        channel.process(message)
 
             evm.callbacks_lock.release()
 
-            time.sleep(0.002)
-
         evm.pump_lock.acquire()
         evm.pump = False
         evm.pump_lock.release()
 
+    def _submit(self, evm, messages):
+        # Inline callbacks feed the waiters straight away, everything else
+        # is queued once the lock is released, since a full queue may block
+        jobs = []
+        evm.callbacks_lock.acquire()
+        deferred = tuple(callback for callback in evm.callbacks
+                         if not callback.inline)
+        for message in messages:
+            for callback in evm.callbacks:
+                if callback.inline:
+                    callback.process(message)
+
+            key = None
+            callbacks = deferred
+            if isinstance(message, ant.core.message.ChannelMessage):
+                key = message.get_channel_number()
+                channel = evm.channels.get(key)
+                if channel is not None:
+                    callbacks = deferred + (channel,)
+            jobs.append((key, message, callbacks))
+        evm.callbacks_lock.release()
+
+        for key, message, callbacks in jobs:
+            evm.executor.submit(key, message, callbacks)
 
 
 class EventCallback(object):
+    # Inline callbacks always run on the pump thread, even when the event
+    # machine dispatches through a CallbackExecutor
+    inline = False
+
     def process(self, msg):
         pass
 
 
+class CallbackDispatcher(object):
+    """
+    Owns a list of callbacks and hands them what a subclass produces,
+    through _deliver(*args) as process(*args). A callback that raises is
+    logged and does not keep the others from running.
+    """
+
+    def __init__(self):
+        self.cb_lock = threading.Lock()
+        self.cb = []
+
+    def registerCallback(self, callback):
+        self.cb_lock.acquire()
+        if callback not in self.cb:
+            self.cb.append(callback)
+        self.cb_lock.release()
+
+    def removeCallback(self, callback):
+        self.cb_lock.acquire()
+        if callback in self.cb:
+            self.cb.remove(callback)
+        self.cb_lock.release()
+
+    def _deliver(self, *args):
+        self.cb_lock.acquire()
+        callbacks = list(self.cb)
+        self.cb_lock.release()
+        for callback in callbacks:
+            try:
+                callback.process(*args)
+            except Exception:
+                logger.exception('{} callback failed on {!r}.'.format(
+                    self.__class__.__name__, args[-1]))
+
+
 class AckCallback(EventCallback):
+    inline = True
+
     def __init__(self, evm):
         self.evm = evm
 
     def process(self, msg):
         if isinstance(msg, ant.core.message.ChannelEventMessage):
+            msg_id = msg.getMessageID()
             self.evm.ack_lock.acquire()
-            self.evm.ack.append(msg)
-            if len(self.evm.ack) > MAX_ACK_QUEUE:
-                self.evm.ack = self.evm.ack[-MAX_ACK_QUEUE:]
+            queue = self.evm.ack.get(msg_id)
+            if queue is None:
+                queue = self.evm.ack[msg_id] = collections.deque(maxlen=MAX_ACK_QUEUE)
+            queue.append(msg)
+            waiter = self.evm.ack_waiters.get(msg_id)
+            if waiter is not None:
+                waiter.notify_all()
             self.evm.ack_lock.release()
 
 
 class MsgCallback(EventCallback):
+    inline = True
+
     def __init__(self, evm):
         self.evm = evm
 
     def process(self, msg):
+        key = msg.__class__
         self.evm.msg_lock.acquire()
-        self.evm.msg.append(msg)
-        if len(self.evm.msg) > MAX_MSG_QUEUE:
-            self.evm.msg = self.evm.msg[-MAX_MSG_QUEUE:]
+        queue = self.evm.msg.get(key)
+        if queue is None:
+            queue = self.evm.msg[key] = collections.deque(maxlen=MAX_MSG_QUEUE)
+        queue.append(msg)
+        for class_, waiter in self.evm.msg_waiters.items():
+            if isinstance(msg, class_):
+                waiter.notify_all()
         self.evm.msg_lock.release()
 
 
+class _Shard(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.queue = collections.deque()
+        self.thread = None
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'depth': len(self.queue),
+                'max_depth': self.max_depth,
+                'submitted': self.submitted,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'latency_avg': self.latency_total / self.processed if self.processed else 0.0,
+                'latency_max': self.latency_max,
+            }
+
+
+class CallbackExecutor(object):
+    """
+    Runs callbacks on a pool of worker threads, so slow listeners do not
+    hold up the pump. Messages are sharded by channel number, every shard
+    has one worker, so the messages of a channel are processed in the
+    order they arrived. Messages that are not for a channel go to shard 0.
+
+    Each shard queues up to queue_size messages. When a queue is full,
+    overflow decides whether submit() blocks the pump until there is
+    room (OVERFLOW_BLOCK), discards the oldest queued message
+    (OVERFLOW_DROP_OLDEST) or discards the new one (OVERFLOW_DROP_NEWEST).
+    Callbacks that wait for a response must not be used with
+    OVERFLOW_BLOCK, the pump they are waiting on may be blocked on them.
+    """
+
+    def __init__(self, shards=EXECUTOR_SHARDS, queue_size=MAX_SHARD_QUEUE,
+                 overflow=OVERFLOW_BLOCK):
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST):
+            raise EventError('Could not create executor (unknown overflow policy).')
+        if shards < 1 or queue_size < 1:
+            raise EventError('Could not create executor (no room for messages).')
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.shards = [_Shard() for i in range(shards)]
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        for number, shard in enumerate(self.shards):
+            shard.thread = threading.Thread(target=self._work, args=(shard,),
+                                            name='ant-callbacks-{}'.format(number))
+            shard.thread.daemon = True
+            shard.thread.start()
+
+    def stop(self):
+        """
+        Stops the workers once they have processed what is already queued.
+        """
+        if not self.running:
+            return
+        self.running = False
+        for shard in self.shards:
+            with shard.lock:
+                shard.not_empty.notify_all()
+                shard.not_full.notify_all()
+        for shard in self.shards:
+            if shard.thread is not threading.current_thread():
+                shard.thread.join()
+            shard.thread = None
+
+    def submit(self, key, msg, callbacks):
+        """
+        Queues msg to be passed to every callback in callbacks.
+        :param key: the channel number of msg, or None
+        :return: False if a message was dropped to make room (or msg itself)
+        """
+        shard = self.shards[(key or 0) % len(self.shards)]
+        with shard.lock:
+            shard.submitted += 1
+            accepted = True
+            if len(shard.queue) >= self.queue_size:
+                if self.overflow == OVERFLOW_BLOCK:
+                    while len(shard.queue) >= self.queue_size and self.running:
+                        shard.not_full.wait()
+                else:
+                    shard.dropped += 1
+                    accepted = False
+                    if self.overflow == OVERFLOW_DROP_NEWEST:
+                        return False
+                    shard.queue.popleft()
+
+            shard.queue.append((time.monotonic(), msg, callbacks))
+            if len(shard.queue) > shard.max_depth:
+                shard.max_depth = len(shard.queue)
+            shard.not_empty.notify()
+        return accepted
+
+    def stats(self):
+        """
+        Returns the counters of every shard: queue depth (now and at most),
+        messages submitted, processed and dropped, callback errors and the
+        seconds from submission to the end of processing (average and max).
+        """
+        return [shard.stats() for shard in self.shards]
+
+    def _work(self, shard):
+        while True:
+            with shard.lock:
+                while not shard.queue and self.running:
+                    shard.not_empty.wait()
+                if not shard.queue:
+                    return
+                submitted, msg, callbacks = shard.queue.popleft()
+                shard.not_full.notify()
+
+            errors = 0
+            for callback in callbacks:
+                try:
+                    callback.process(msg)
+                except Exception:
+                    errors += 1
+                    logger.exception('Callback {!r} failed on {}.'.format(callback, msg))
+            latency = time.monotonic() - submitted
+
+            with shard.lock:
+                shard.processed += 1
+                shard.errors += errors
+                shard.latency_total += latency
+                if latency > shard.latency_max:
+                    shard.latency_max = latency
+
+
 class EventMachine(object):
-    callbacks_lock = threading.Lock()
-    running_lock = threading.Lock()
-    pump_lock = threading.Lock()
-    ack_lock = threading.Lock()
-    msg_lock = threading.Lock()
+    def __init__(self, driver, executor=None):
+        self.callbacks_lock = threading.Lock()
+        self.running_lock = threading.Lock()
+        self.pump_lock = threading.Lock()
+        self.ack_lock = threading.Lock()
+        self.msg_lock = threading.Lock()
 
-    def __init__(self, driver):
         self.driver = driver
         self.callbacks = []
+        # Channel callbacks keyed by channel number, each one only gets the
+        # ChannelMessages addressed to it
+        self.channels = {}
         self.running = False
         self.pump = False
-        self.ack = []
-        self.msg = []
+        # Responses keyed by the ID of the message they answer, and other
+        # messages keyed by their class, each trimmed to the newest entries
+        self.ack = {}
+        self.msg = {}
+        # Conditions sharing ack_lock/msg_lock, one per awaited msg_id or
+        # class, so the pump only wakes the threads waiting on that message
+        self.ack_waiters = {}
+        self.msg_waiters = {}
         self.registerCallback(AckCallback(self))
         self.registerCallback(MsgCallback(self))
         self.event_thread = None
         self.event_pumper = EventPumper()
+        # Optional CallbackExecutor running the callbacks off the pump thread
+        self.executor = executor
 
     def registerCallback(self, callback):
         self.callbacks_lock.acquire()
@@ -173,31 +528,79 @@ class EventMachine(object):
             self.callbacks.remove(callback)
         self.callbacks_lock.release()
 
-    def waitForAck(self, msg):
-        while True:
-            self.ack_lock.acquire()
-            for emsg in self.ack:
-                # print("Original msg id:{:02X} received msg id:{:02X}".format(msg.msg_id,
-                #                                                              emsg.getMessageID()))
-                if msg.msg_id != emsg.getMessageID():
-                    continue
-                self.ack.remove(emsg)
-                self.ack_lock.release()
-                return emsg.getMessageCode()
-            self.ack_lock.release()
-            time.sleep(0.002)
+    def registerChannel(self, number, callback):
+        """
+        Routes the ChannelMessages for channel number to callback, replacing
+        the callback previously routed there.
+        """
+        self.callbacks_lock.acquire()
+        self.channels[number] = callback
+        self.callbacks_lock.release()
 
-    def waitForMessage(self, class_):
-        while True:
-            self.msg_lock.acquire()
-            for emsg in self.msg:
-                if not isinstance(emsg, class_):
-                    continue
-                self.msg.remove(emsg)
-                self.msg_lock.release()
-                return emsg
-            self.msg_lock.release()
-            time.sleep(0.002)
+    def removeChannel(self, number, callback=None):
+        """
+        Stops routing channel number, only if it is routed to callback when
+        one is given.
+        """
+        self.callbacks_lock.acquire()
+        if callback is None or self.channels.get(number) is callback:
+            self.channels.pop(number, None)
+        self.callbacks_lock.release()
+
+    def waitForAck(self, msg, timeout=RESPONSE_TIMEOUT):
+        """
+        Waits for the channel response to msg and returns its message code.
+        :param timeout: seconds to wait, None to wait forever
+        :raises EventTimeoutError: if no response arrived in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.ack_lock:
+            while True:
+                queue = self.ack.get(msg.msg_id)
+                if queue:
+                    return queue.popleft().getMessageCode()
+
+                waiter = self.ack_waiters.get(msg.msg_id)
+                if waiter is None:
+                    waiter = threading.Condition(self.ack_lock)
+                    self.ack_waiters[msg.msg_id] = waiter
+                if not self._wait(waiter, deadline):
+                    raise EventTimeoutError('Timed out waiting for response '
+                                            'to message {:02X}.'.format(msg.msg_id))
+
+    def waitForMessage(self, class_, timeout=RESPONSE_TIMEOUT):
+        """
+        Waits for a message that is an instance of class_ and returns it.
+        :param timeout: seconds to wait, None to wait forever
+        :raises EventTimeoutError: if no such message arrived in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.msg_lock:
+            while True:
+                queue = self.msg.get(class_)
+                if queue:
+                    return queue.popleft()
+                for key, queue in self.msg.items():
+                    if queue and issubclass(key, class_):
+                        return queue.popleft()
+
+                waiter = self.msg_waiters.get(class_)
+                if waiter is None:
+                    waiter = threading.Condition(self.msg_lock)
+                    self.msg_waiters[class_] = waiter
+                if not self._wait(waiter, deadline):
+                    raise EventTimeoutError('Timed out waiting for '
+                                            '{}.'.format(class_.__name__))
+
+    def _wait(self, waiter, deadline):
+        if deadline is None:
+            waiter.wait()
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        waiter.wait(remaining)
+        return True
 
     def start(self, driver=None):
         self.running_lock.acquire()
@@ -208,6 +611,8 @@ class EventMachine(object):
         self.running = True
         if driver is not None:
             self.driver = driver
+        if self.executor is not None:
+            self.executor.start()
 
         self.event_thread = threading.Thread(target=self.event_pumper.pump, args=(self,))
         self.event_thread.start()
@@ -239,3 +644,5 @@ class EventMachine(object):
             time.sleep(0.001)
 
         self.event_thread.join()
+        if self.executor is not None:
+            self.executor.stop()
@@ -44,3 +44,11 @@ class NodeError(ANTException):
 
 class ChannelError(ANTException):
     pass
+
+
+class EventTimeoutError(ANTException):
+    pass
+
+
+class EventError(ANTException):
+    pass
@@ -23,16 +23,145 @@
 #
 ##############################################################################
 
-import time
-import datetime
+"""
+Binary capture log.
+
+A log starts with a header holding the wall clock time the capture began,
+followed by one record per event: the event code, the nanoseconds elapsed
+since the start of the capture (taken from a monotonic clock) and the
+data. Every INDEX_INTERVAL bytes the writer notes the time and offset of
+the next record, and close() appends that sparse index together with a
+trailer, so a reader can seek to a point in time without scanning the
+whole file. Logs that were never closed are still readable, seeking just
+falls back to a scan.
+"""
 
-import msgpack
+import bisect
+import collections
+import datetime
+import logging
+import os
+import struct
+import threading
+import time
 
 EVENT_OPEN = 0x01
 EVENT_CLOSE = 0x02
 EVENT_READ = 0x03
 EVENT_WRITE = 0x04
 
+MAGIC = b'ANT-LOG\x00'
+INDEX_MAGIC = b'ANT-IDX\x00'
+VERSION = 0x03
+
+# magic, version, reserved, capture start (ns since the epoch)
+HEADER = struct.Struct('<8sHHq')
+# event, ns since capture start, data length
+RECORD = struct.Struct('<BQI')
+# ns since capture start, file offset
+INDEX_ENTRY = struct.Struct('<QQ')
+# index offset, index entries, magic
+TRAILER = struct.Struct('<QQ8s')
+
+INDEX_INTERVAL = 64 * 1024
+WRITE_BUFFER_SIZE = 64 * 1024
+
+# Records queued beyond this are dropped rather than stalling the caller
+MAX_LOG_QUEUE = 16384
+# Queued records that wake the writer thread before its next interval
+LOG_BATCH_SIZE = 256
+# Seconds between flushes of the writer thread
+LOG_FLUSH_INTERVAL = 0.5
+
+logger = logging.getLogger(__name__)
+
+_FLUSH = object()
+_STOP = object()
+
+
+class LogThread(object):
+    """
+    Writes log records on a dedicated thread, so logging never blocks the
+    thread reading from the stick. Records are appended to a bounded deque
+    (append and popleft are atomic, no lock is taken) and written out in
+    batches, every LOG_BATCH_SIZE records or LOG_FLUSH_INTERVAL seconds,
+    whichever comes first. Records that do not fit in the queue are counted
+    in dropped.
+    """
+
+    def __init__(self, write, flush, max_queue=MAX_LOG_QUEUE,
+                 batch_size=LOG_BATCH_SIZE, interval=LOG_FLUSH_INTERVAL):
+        self._write = write
+        self._flush = flush
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = collections.deque()
+        self.dropped = 0
+        self.written = 0
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ant-log')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, record):
+        queue = self.queue
+        if len(queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        queue.append(record)
+        if len(queue) == self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Blocks until every record queued so far is written and flushed.
+        """
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self.queue.append((_FLUSH, done))
+        self._wakeup.set()
+        done.wait()
+
+    def stop(self):
+        if not self._thread.is_alive():
+            return
+        self.queue.append((_STOP, None))
+        self._wakeup.set()
+        self._thread.join()
+
+    def _run(self):
+        queue = self.queue
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+            stop = False
+            done = []
+            while queue:
+                record = queue.popleft()
+                if record[0] is _FLUSH:
+                    done.append(record[1])
+                    continue
+                if record[0] is _STOP:
+                    stop = True
+                    break
+                try:
+                    self._write(*record)
+                    self.written += 1
+                except Exception as e:
+                    logger.exception(e)
+
+            try:
+                self._flush()
+            except Exception as e:
+                logger.exception(e)
+            for event in done:
+                event.set()
+            if stop:
+                return
+
 
 class LogReader(object):
     def __init__(self, filename):
@@ -47,10 +176,29 @@ class LogReader(object):
         if self.is_open == True:
             self.close()
 
-        self.fd = open(filename, 'r')
+        self.fd = open(filename, 'rb')
         self.is_open = True
 
-        header = self.fd.read()
+        header = self.fd.read(HEADER.size)
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise IOError('Could not open log file (unknown format).')
+        magic, version, reserved, self.start = HEADER.unpack(header)
+        if version != VERSION:
+            self.close()
+            raise IOError('Could not open log file (unsupported version).')
+
+        self.index = []
+        self.end = self.fd.seek(0, os.SEEK_END)
+        if self.end >= HEADER.size + TRAILER.size:
+            self.fd.seek(self.end - TRAILER.size)
+            offset, count, magic = TRAILER.unpack(self.fd.read(TRAILER.size))
+            if magic == INDEX_MAGIC:
+                self.fd.seek(offset)
+                data = self.fd.read(count * INDEX_ENTRY.size)
+                self.index = list(INDEX_ENTRY.iter_unpack(data))
+                self.end = offset
+        self.fd.seek(HEADER.size)
 
     def close(self):
         if self.is_open:
@@ -58,21 +206,56 @@ class LogReader(object):
             self.is_open = False
 
     def read(self):
-        try:
-            return self.fd.read()
-        except StopIteration:
+        """
+        Returns the next record as (event, timestamp, data), timestamp being
+        in nanoseconds since the epoch, or None at the end of the log.
+        """
+        if self.fd.tell() + RECORD.size > self.end:
+            return None
+        header = self.fd.read(RECORD.size)
+        if len(header) < RECORD.size:
             return None
+        event, elapsed, length = RECORD.unpack(header)
+        data = self.fd.read(length)
+        if len(data) < length:
+            return None  # Truncated by a crash
+        return (event, self.start + elapsed, data)
+
+    def __iter__(self):
+        while True:
+            record = self.read()
+            if record is None:
+                return
+            yield record
+
+    def seek(self, timestamp):
+        """
+        Positions the reader on the first record at or after timestamp
+        (nanoseconds since the epoch).
+        """
+        elapsed = timestamp - self.start
+        offset = HEADER.size
+        idx = bisect.bisect_right(self.index, (elapsed, self.end)) - 1
+        if idx >= 0:
+            offset = self.index[idx][1]
+        self.fd.seek(offset)
+
+        while True:
+            position = self.fd.tell()
+            record = self.read()
+            if record is None or record[1] >= timestamp:
+                self.fd.seek(position)
+                return
 
 
 class LogWriter(object):
     def __init__(self, filename=''):
-        self.packer = msgpack.Packer()
         self.is_open = False
         self.open(filename)
 
     def __del__(self):
         if self.is_open:
-            self.fd.close()
+            self.close()
 
     def open(self, filename=''):
         if filename == '':
@@ -82,25 +265,47 @@ class LogWriter(object):
         if self.is_open == True:
             self.close()
 
-        self.fd = open(filename, 'w')
+        self.fd = open(filename, 'wb', buffering=WRITE_BUFFER_SIZE)
         self.is_open = True
-        self.packer = msgpack.Packer()
 
-        header = ['ANT-LOG', 0x01]  # [MAGIC, VERSION]
-        self.fd.write("{} {}\n".format(header[0], header[1]))
+        self.start = time.time_ns()
+        self._clock = time.monotonic_ns()
+        self.fd.write(HEADER.pack(MAGIC, VERSION, 0, self.start))
+        self._offset = HEADER.size
+        self._next_index = 0
+        self.index = []
+        self.writer = LogThread(self._writeRecord, self.fd.flush)
+
+    @property
+    def dropped(self):
+        return self.writer.dropped
 
     def close(self):
         if self.is_open:
+            self.writer.stop()
+            offset = self._offset
+            for entry in self.index:
+                self.fd.write(INDEX_ENTRY.pack(*entry))
+            self.fd.write(TRAILER.pack(offset, len(self.index), INDEX_MAGIC))
             self.fd.close()
             self.is_open = False
 
-    def _logEvent(self, event, data=None):
-        if not data or len(data) == 0:
-            return
+    def flush(self):
+        if self.is_open:
+            self.writer.flush()
+
+    def _logEvent(self, event, data=b''):
+        self.writer.put((event, time.monotonic_ns() - self._clock, data))
 
-        packed = "{} {} {}".format(event, int(time.time()), self.encode(data))
-        self.fd.write(packed)
-        self.fd.flush()
+    def _writeRecord(self, event, elapsed, data):
+        if self._offset >= self._next_index:
+            self.index.append((elapsed, self._offset))
+            self._next_index = self._offset + INDEX_INTERVAL
+
+        self.fd.write(RECORD.pack(event, elapsed, len(data)))
+        if data:
+            self.fd.write(data)
+        self._offset += RECORD.size + len(data)
 
     def logOpen(self):
         self._logEvent(EVENT_OPEN)
@@ -109,10 +314,9 @@ class LogWriter(object):
         self._logEvent(EVENT_CLOSE)
 
     def logRead(self, data):
-        self._logEvent(EVENT_READ, data)
+        if data:
+            self._logEvent(EVENT_READ, data)
 
     def logWrite(self, data):
-        self._logEvent(EVENT_WRITE, data)
-
-    def encode(self, data):
-        return "".join(["{:02X}".format(byte) for byte in data])
+        if data:
+            self._logEvent(EVENT_WRITE, data)
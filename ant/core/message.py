@@ -34,6 +34,14 @@ MAX_PAYLOAD_LENGTH = 8
 
 MESSAGE_SIZE = 13
 
+# Payload of a data message: channel number and 8 bytes of data
+DATA_PAYLOAD_LENGTH = 9
+# ...followed by the flag byte and every field it can announce
+MAX_EXTENDED_PAYLOAD = DATA_PAYLOAD_LENGTH + 1 + \
+                       EXTENDED_FORMAT_FLAG_CHANNEL_ID_BYTES + \
+                       EXTENDED_FORMAT_FLAG_RSSI_BYTES + \
+                       EXTENDED_FORMAT_FLAG_TIMESTAMP_BYTES
+
 # def encode(self):
 #     raw = struct.pack('BBB',
 #                       MESSAGE_TX_SYNC,
@@ -45,75 +53,195 @@ MESSAGE_SIZE = 13
 #     return raw
 
 
+ENCODE_CACHE_SIZE = 512
+
+_encode_cache = {}
+
+
 def checksum(data=b''):
-    if not data or len(data) == 0:
-        return 0
     cksum = 0x00
     for byte in data:
-        cksum = (cksum ^ byte) % 0xFF
+        cksum ^= byte
+        if cksum == 0xFF:
+            cksum = 0x00
     return cksum
 
 
-def get_proper_message(raw=b''):
+def checksums(chunks):
+    """
+    Checksums every chunk in one call, e.g. a batch of frames without their
+    trailing checksum byte.
+    :return: a bytes object holding one checksum per chunk
+    """
+    return bytes([checksum(data) for data in chunks])
+
+
+def encode_frame(msg_id, payload, sync=MESSAGE_TX_SYNC):
+    """
+    Builds the wire frame for msg_id/payload. Frames are cached on their
+    contents, so reconfiguring channels with the same parameters does not
+    rebuild or re-checksum them.
+    """
+    key = (sync, msg_id, bytes(payload))
+    raw = _encode_cache.get(key)
+    if raw is None:
+        frame = bytearray((sync, len(payload), msg_id))
+        frame += payload
+        frame.append(checksum(frame))
+        raw = bytes(frame)
+
+        if len(_encode_cache) >= ENCODE_CACHE_SIZE:
+            _encode_cache.clear()
+        _encode_cache[key] = raw
+    return raw
+
+
+_message_classes = {}
+
+
+def register_message(msg_id, class_=None):
+    """
+    Registers the class used to decode inbound messages of type msg_id,
+    replacing any class previously registered for it. Can be used directly
+    or as a class decorator.
+    :param msg_id: the message ID byte
+    :param class_: a Message subclass. Inbound messages are created without
+                   calling __init__, so decode() must set up the instance.
+    """
+    if msg_id < 0x00 or msg_id > 0xFF:
+        raise MessageError('Could not register message (message id is invalid).')
+
+    def register(class_):
+        _message_classes[msg_id] = class_
+        return class_
+
+    if class_ is None:
+        return register
+    return register(class_)
+
+
+def unregister_message(msg_id):
+    _message_classes.pop(msg_id, None)
+
+
+def get_message_class(msg_id):
+    return _message_classes.get(msg_id)
+
+
+def get_proper_message(raw=b'', verify=True):
     if raw is None or not len(raw):
         return None
-    # print("get_proper_message raw: {}".format(encode_bytes(raw, separator=' ')))
-    msg_id = raw[2]
-    # print("get_proper_message msg_id: {:02X}".format(msg_id))
-
-    if msg_id == MESSAGE_CHANNEL_UNASSIGN:
-        msg = ChannelUnassignMessage()
-    elif msg_id == MESSAGE_CHANNEL_ASSIGN:
-        msg = ChannelAssignMessage()
-    elif msg_id == MESSAGE_CHANNEL_ID:
-        msg = ChannelIDMessage()
-    elif msg_id == MESSAGE_CHANNEL_PERIOD:
-        msg = ChannelPeriodMessage()
-    elif msg_id == MESSAGE_CHANNEL_SEARCH_TIMEOUT:
-        msg = ChannelSearchTimeoutMessage()
-    elif msg_id == MESSAGE_CHANNEL_FREQUENCY:
-        msg = ChannelFrequencyMessage()
-    elif msg_id == MESSAGE_CHANNEL_TX_POWER:
-        msg = ChannelTXPowerMessage()
-    elif msg_id == MESSAGE_NETWORK_KEY:
-        msg = NetworkKeyMessage()
-    elif msg_id == MESSAGE_TX_POWER:
-        msg = TXPowerMessage()
-    elif msg_id == MESSAGE_SYSTEM_RESET:
-        msg = SystemResetMessage()
-    elif msg_id == MESSAGE_CHANNEL_OPEN:
-        msg = ChannelOpenMessage()
-    elif msg_id == MESSAGE_CHANNEL_CLOSE:
-        msg = ChannelCloseMessage()
-    elif msg_id == MESSAGE_CHANNEL_REQUEST:
-        msg = ChannelRequestMessage()
-    elif msg_id == MESSAGE_CHANNEL_BROADCAST_DATA:
-        msg = ChannelBroadcastDataMessage()
-    elif msg_id == MESSAGE_CHANNEL_ACKNOWLEDGED_DATA:
-        msg = ChannelAcknowledgedDataMessage()
-    elif msg_id == MESSAGE_CHANNEL_BURST_DATA:
-        msg = ChannelBurstDataMessage()
-    elif msg_id == MESSAGE_CHANNEL_EVENT:
-        msg = ChannelEventMessage()
-    elif msg_id == MESSAGE_CHANNEL_STATUS:
-        msg = ChannelStatusMessage()
-    elif msg_id == MESSAGE_VERSION:
-        msg = VersionMessage()
-    elif msg_id == MESSAGE_CAPABILITIES:
-        msg = CapabilitiesMessage()
-    elif msg_id == MESSAGE_SERIAL_NUMBER:
-        msg = SerialNumberMessage()
-    elif msg_id == MESSAGE_STARTUP:
-        msg = NotificationStartupMessage()
-    else:
+
+    class_ = _message_classes.get(raw[2])
+    if class_ is None:
         raise MessageError('Could not find message handler ' \
                            '(unknown message type).')
 
-    msg.decode(raw)
+    # Skip the constructor, decode() fills in every field
+    msg = class_.__new__(class_)
+    msg.decode(raw, verify)
     return msg
 
 
+# The fields each extended format flag adds, in the order they follow
+# the flag byte
+_EXTENDED_FIELDS = (
+    (EXTENDED_FORMAT_FLAG_CHANNEL_ID, 'HBB',
+     ('device_number', 'device_type', 'transmission_type')),
+    (EXTENDED_FORMAT_FLAG_RSSI, 'Bbb',
+     ('measurement_type', 'rssi', 'threshold')),
+    (EXTENDED_FORMAT_FLAG_TIMESTAMP, 'H',
+     ('rx_timestamp',)),
+)
+
+EXTENDED_FORMAT_FLAGS = (EXTENDED_FORMAT_FLAG_CHANNEL_ID |
+                         EXTENDED_FORMAT_FLAG_RSSI |
+                         EXTENDED_FORMAT_FLAG_TIMESTAMP)
+
+
+def _extended_layout(flags):
+    layout = '<'
+    names = ()
+    for flag, fields, field_names in _EXTENDED_FIELDS:
+        if flags & flag:
+            layout += fields
+            names += field_names
+    return struct.Struct(layout), names
+
+
+# One precompiled layout per combination of flags
+_extended_layouts = dict((flags, _extended_layout(flags))
+                         for flags in range(0x00, 0x100, 0x20)
+                         if not flags & ~EXTENDED_FORMAT_FLAGS)
+
+
+class ExtendedData(object):
+    """
+    The flagged extended data a stick appends to received data messages
+    once enabled with LibConfigMessage. Fields the flags do not announce
+    are None. rx_timestamp counts 1/32768 s ticks, see rx_time.
+    """
+    __slots__ = ('flags', 'device_number', 'device_type', 'transmission_type',
+                 'measurement_type', 'rssi', 'threshold', 'rx_timestamp')
+
+    def __init__(self, flags=0x00, device_number=None, device_type=None,
+                 transmission_type=None, measurement_type=None, rssi=None,
+                 threshold=None, rx_timestamp=None):
+        self.flags = flags
+        self.device_number = device_number
+        self.device_type = device_type
+        self.transmission_type = transmission_type
+        self.measurement_type = measurement_type
+        self.rssi = rssi
+        self.threshold = threshold
+        self.rx_timestamp = rx_timestamp
+
+    @classmethod
+    def unpack(cls, flags, data):
+        layout, names = _extended_layouts[flags & EXTENDED_FORMAT_FLAGS]
+        if len(data) < layout.size:
+            raise MessageError('Could not decode (extended data is incomplete).')
+        record = cls(flags)
+        for name, value in zip(names, layout.unpack_from(data)):
+            setattr(record, name, value)
+        return record
+
+    def pack(self):
+        layout, names = _extended_layouts[self.flags & EXTENDED_FORMAT_FLAGS]
+        return layout.pack(*[getattr(self, name) for name in names])
+
+    @property
+    def rx_time(self):
+        if self.rx_timestamp is None:
+            return None
+        return self.rx_timestamp / float(EXTENDED_TIMESTAMP_RATE)
+
+    def __eq__(self, other):
+        return isinstance(other, ExtendedData) and \
+            all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<ExtendedData {}>'.format(', '.join(
+            '{}={}'.format(name, getattr(self, name)) for name in self.__slots__
+            if getattr(self, name) is not None))
+
+
 class Message(object):
+    """
+    Messages decoded from the stick borrow a read-only view of the received
+    frame and only copy their payload when a setter (or get_payload) needs a
+    mutable one, so frames that are filtered out are never copied.
+    """
+    __slots__ = ('sync', '_msg_id', 'is_extended_message', 'flag_byte',
+                 '_extended_data_bytes', '_data')
+
+    # Longest payload the message may carry, channel number included
+    max_payload = 9
+    # True for data messages, which may be followed by extended data
+    extendable = False
 
     def __init__(self,
                  msg_id=0x00,
@@ -128,8 +256,7 @@ class Message(object):
 
         self.is_extended_message = False
         self.flag_byte = None
-        self._extended_data_bytes = bytearray()
-        self._payload = bytearray()
+        self._extended_data_bytes = b''
         self.set_payload(payload)
 
     @property
@@ -142,9 +269,41 @@ class Message(object):
             raise MessageError('Could not decode (message id is invalid).')
         self._msg_id = value
 
+    @property
+    def payload(self):
+        """
+        The payload, channel number included, read-only. Unlike get_payload()
+        this does not copy the payload of a received message.
+        """
+        data = self._data
+        if data.__class__ is bytearray:
+            return bytes(data)
+        return data
+
+    @property
+    def extended_data_bytes(self):
+        """
+        The extended data following the flag byte, read-only, empty if the
+        message has none. See get_extended_data() for its fields.
+        """
+        return self._extended_data_bytes
+
+    @property
+    def _payload(self):
+        return self._data
+
+    def _edit(self):
+        """
+        Returns the payload as a bytearray that may be modified in place,
+        copying it out of the receive buffer first if necessary.
+        """
+        data = self._data
+        if data.__class__ is not bytearray:
+            data = self._data = bytearray(data)
+        return data
+
     def get_payload(self):
-        # return ''.join([str(int(i)) for i in self._payload])
-        return self._payload
+        return self._edit()
 
     def set_payload(self, payload):
         """
@@ -152,24 +311,18 @@ class Message(object):
         :param payload:
         :return:
         """
-        if len(payload) > 9:
+        if len(payload) > self.max_payload:
             raise MessageError(
                   'Could not set payload (payload too long).')
-        self._payload = bytearray(payload)
+        self._data = bytearray(payload)
 
     def get_channel_num(self):
         if not self._payload or len(self._payload) == 0:
             return 0x00
-        return self.get_payload()[0]
+        return self._payload[0]
 
     def get_checksum(self):
-        data = bytearray()
-        data.append(self.sync)
-        data.append(self.msg_id)
-        data.append(len(self.get_payload()))
-        data.extend(self.get_payload())
-
-        return checksum(data)
+        return self.encode()[-1]
 
     def get_size(self):
         """
@@ -181,27 +334,32 @@ class Message(object):
             +1 for Check sum byte
         :return: the size in bytes of the whole message
         """
-        return len(self.get_payload()) + 4
+        size = len(self._payload) + 4
+        if self.is_extended_message:
+            size += 1 + len(self._extended_data_bytes)
+        return size
 
     def encode(self):
-        raw = bytearray()
-        raw.append(self.sync)
-        raw.append(len(self.get_payload()))
-        raw.append(self.msg_id)
-        raw.extend(self.get_payload())
-        raw.append(self.get_checksum())  # Converts the checksum to a single hex byte
-
-        return bytes(raw)
-
-    def decode(self, raw):
+        if self.is_extended_message:
+            payload = bytearray(self._payload)
+            payload.append(self.flag_byte)
+            payload += self._extended_data_bytes
+            return encode_frame(self._msg_id, payload, self.sync)
+        return encode_frame(self._msg_id, self._payload, self.sync)
+
+    def decode(self, raw, verify=True):
         """
-        :param raw: a bytes object
-        :return:
+        Decodes a single frame. The message keeps a read-only view of raw
+        rather than a copy, so raw must not be modified afterwards.
+        :param raw: a bytes-like object holding exactly one frame
+        :param verify: False skips the checksum test, for frames that were
+                       already checked (e.g. by event.FrameBuffer)
+        :return: the size of the decoded message
         """
         if len(raw) < 5:
             raise MessageError('Could not decode (message is incomplete).')
 
-        if checksum(raw[:len(raw) - 1]) != raw[-1]:
+        if verify and checksum(raw[:len(raw) - 1]) != raw[-1]:
             raise MessageError('Could not decode (bad checksum).',
                                internal='CHECKSUM')
 
@@ -212,24 +370,29 @@ class Message(object):
 
         if sync != MESSAGE_TX_SYNC:
             raise MessageError('Could not decode (expected TX sync).')
-
-        self.sync = sync
-        self.msg_id = msg_id
-        self.set_payload(raw[3:msg_length + 3])
-
-        # 2 Types: Standard and Extended
-        if msg_length > 9 and len(raw) >= 12 and raw[12] == EXTENDED_FORMAT_FLAG_BYTE:
-            # Only valid if the message is in Flagged Extended Data Message Format
-            self.flag_byte = EXTENDED_FORMAT_FLAG_BYTE
-            self.is_extended_message = True
-        elif msg_length > 9:
+        if msg_length > self.max_payload and \
+                not (self.extendable and msg_length <= MAX_EXTENDED_PAYLOAD):
             raise MessageError('Could not decode (payload too long).')
 
         # Checks that the supplied msg_length byte == the length of the actual raw message
         if len(raw) < (msg_length + 4):  # 4 because of sync, len, id, crc
             raise MessageError('Could not decode (message is incomplete).')
 
-        return self.get_size()
+        self.sync = sync
+        self._msg_id = msg_id
+        view = memoryview(raw).toreadonly()
+        if msg_length > DATA_PAYLOAD_LENGTH and self.extendable:
+            self.is_extended_message = True
+            self.flag_byte = raw[3 + DATA_PAYLOAD_LENGTH]
+            self._extended_data_bytes = view[4 + DATA_PAYLOAD_LENGTH:msg_length + 3]
+            self._data = view[3:3 + DATA_PAYLOAD_LENGTH]
+        else:
+            self.is_extended_message = False
+            self.flag_byte = None
+            self._extended_data_bytes = b''
+            self._data = view[3:msg_length + 3]
+
+        return msg_length + 4
 
     def get_message_length(self):
         """
@@ -239,8 +402,27 @@ class Message(object):
         return len(self._payload)
 
     def set_extended(self, flag_byte, data_for_flag):
+        """
+        Appends extended data to the message, as the stick does to received
+        data messages. data_for_flag must hold the fields flag_byte announces.
+        """
+        if not self.extendable:
+            raise MessageError('Could not set extended data (not a data message).')
+        if len(self._payload) != DATA_PAYLOAD_LENGTH:
+            raise MessageError('Could not set extended data (expected 8 data bytes).')
+        ExtendedData.unpack(flag_byte, data_for_flag)
+        self.is_extended_message = True
         self.flag_byte = flag_byte
-        self._extended_data_bytes = data_for_flag
+        self._extended_data_bytes = bytes(data_for_flag)
+
+    def get_extended_data(self):
+        """
+        Decodes the extended data the message was received with.
+        :return: an ExtendedData record
+        """
+        if not self.is_extended_message:
+            raise MessageError('extended data not supported. Not an extended message.')
+        return ExtendedData.unpack(self.flag_byte, self._extended_data_bytes)
 
     # def get_flag_byte(self):
     #     if not self.is_extended_message:
@@ -250,7 +432,9 @@ class Message(object):
     def get_device_number(self):
         if not self.is_extended_message:
             raise MessageError('device number not supported. Not an extended message.')
-        return self._extended_data_bytes[0:2]
+        if not self.flag_byte & EXTENDED_FORMAT_FLAG_CHANNEL_ID:
+            raise MessageError('device number not supported. No channel ID in extended data.')
+        return self._extended_data_bytes[0] | (self._extended_data_bytes[1] << 8)
     # def get_measurement_type(self):
     #     if not self.is_extended_message:
     #         raise MessageError('only extended data format messages support flag bytes.')
@@ -264,11 +448,11 @@ class Message(object):
         return hex_string
 
     def pretty_raw(self):
-        payload = self.get_payload()
+        payload = self._payload
         hex_data = ['%02X' % byte for byte in payload]
         hex_payload = ' '.join(hex_data)
         pretty = '{:02X}|{:02X}|{:02X}|{}|{:02X}'.format(MESSAGE_TX_SYNC,
-                                                                len(self.get_payload()),
+                                                                len(payload),
                                                                 self.msg_id,
                                                                 hex_payload,
                                                                 self.get_checksum())
@@ -441,6 +625,8 @@ class Message(object):
 
 
 class ChannelMessage(Message):
+    __slots__ = ()
+
     def __init__(self, msg_id, payload=b'', number=0x00):
         Message.__init__(self, msg_id, b'\x00' + payload)
         self.setChannelNumber(number)
@@ -453,17 +639,23 @@ class ChannelMessage(Message):
             raise MessageError('Could not set channel number ' \
                                    '(out of range).')
 
-        self._payload[0] = number
+        self._edit()[0] = number
 
 
 # Config messages
+@register_message(MESSAGE_CHANNEL_UNASSIGN)
 class ChannelUnassignMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_UNASSIGN,
                                 number=number)
 
 
+@register_message(MESSAGE_CHANNEL_ASSIGN)
 class ChannelAssignMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00, msg_id=0x00, network=0x00):
         payload = struct.pack('BB', msg_id, network)
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_ASSIGN,
@@ -473,16 +665,19 @@ class ChannelAssignMessage(ChannelMessage):
         return self._payload[1]
 
     def setChannelType(self, type_):
-        self._payload[1] = type_
+        self._edit()[1] = type_
 
     def getNetworkNumber(self):
         return self._payload[2]
 
     def setNetworkNumber(self, number):
-        self._payload[2] = number
+        self._edit()[2] = number
 
 
+@register_message(MESSAGE_CHANNEL_ID)
 class ChannelIDMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00, device_number=0x0000, device_type=0x00,
                  trans_type=0x00):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_ID,
@@ -492,38 +687,44 @@ class ChannelIDMessage(ChannelMessage):
         self.setTransmissionType(trans_type)
 
     def getDeviceNumber(self):
-        return struct.unpack('<H', self.get_payload()[1:3])[0]
+        return struct.unpack('<H', self._payload[1:3])[0]
 
     def setDeviceNumber(self, device_number):
-        self._payload[1:3] = struct.pack('<H', device_number)
+        self._edit()[1:3] = struct.pack('<H', device_number)
 
     def getDeviceType(self):
         return self._payload[3]
 
     def setDeviceType(self, device_type):
-        self._payload[3] = device_type
+        self._edit()[3] = device_type
 
     def getTransmissionType(self):
         return self._payload[4]
 
     def setTransmissionType(self, trans_type):
-        self._payload[4] = trans_type
+        self._edit()[4] = trans_type
 
 
+@register_message(MESSAGE_CHANNEL_PERIOD)
 class ChannelPeriodMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00, period=8192):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_PERIOD,
                                 payload=b'\x00' * 2, number=number)
         self.setChannelPeriod(period)
 
     def getChannelPeriod(self):
-        return struct.unpack('<H', self.get_payload()[1:3])[0]
+        return struct.unpack('<H', self._payload[1:3])[0]
 
     def setChannelPeriod(self, period):
-        self._payload[1:3] = struct.pack('<H', period)
+        self._edit()[1:3] = struct.pack('<H', period)
 
 
+@register_message(MESSAGE_CHANNEL_SEARCH_TIMEOUT)
 class ChannelSearchTimeoutMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00, timeout=0xFF):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_SEARCH_TIMEOUT,
                                 payload=b'\x00', number=number)
@@ -533,10 +734,13 @@ class ChannelSearchTimeoutMessage(ChannelMessage):
         return self._payload[1]
 
     def setTimeout(self, timeout):
-        self._payload[1] = timeout
+        self._edit()[1] = timeout
 
 
+@register_message(MESSAGE_CHANNEL_FREQUENCY)
 class ChannelFrequencyMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00, frequency=66):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_FREQUENCY,
                                 payload=b'\x00', number=number)
@@ -546,10 +750,13 @@ class ChannelFrequencyMessage(ChannelMessage):
         return self._payload[1]
 
     def setFrequency(self, frequency):
-        self._payload[1] = frequency
+        self._edit()[1] = frequency
 
 
+@register_message(MESSAGE_CHANNEL_TX_POWER)
 class ChannelTXPowerMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00, power=0x00):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_TX_POWER,
                                 payload=b'\x00', number=number)
@@ -558,10 +765,13 @@ class ChannelTXPowerMessage(ChannelMessage):
         return self._payload[1]
 
     def setPower(self, power):
-        self._payload[1] = power
+        self._edit()[1] = power
 
 
+@register_message(MESSAGE_NETWORK_KEY)
 class NetworkKeyMessage(Message):
+    __slots__ = ()
+
     def __init__(self, number=0x00, key=b'\x00' * 8):
         Message.__init__(self, msg_id=MESSAGE_NETWORK_KEY, payload=b'\x00' * 9)
         self.setNumber(number)
@@ -571,20 +781,24 @@ class NetworkKeyMessage(Message):
         return self._payload[0]
 
     def setNumber(self, number):
-        self._payload[0] = number
+        self._edit()[0] = number
 
     def getKey(self):
         return self.get_payload()[1:]
 
     def setKey(self, key):
         assert isinstance(key, (bytes, bytearray))
+        payload = self._edit()
         for idx, byte in enumerate(key):
             # print("idx: {:02X}".format(idx))
             # One offset for the number portion
-            self._payload[idx + 1] = byte
+            payload[idx + 1] = byte
 
 
+@register_message(MESSAGE_TX_POWER)
 class TXPowerMessage(Message):
+    __slots__ = ()
+
     def __init__(self, power=0x00):
         Message.__init__(self, msg_id=MESSAGE_TX_POWER, payload=b'\x00\x00')
         self.setPower(power)
@@ -593,28 +807,127 @@ class TXPowerMessage(Message):
         return self._payload[1]
 
     def setPower(self, power):
-        self._payload[1] = power
+        self._edit()[1] = power
+
+
+@register_message(MESSAGE_CONFIGURE_ADVANCED_BURST)
+class ConfigureAdvancedBurstMessage(Message):
+    __slots__ = ()
+
+    def __init__(self, enable=True, max_packet_length=ADVANCED_BURST_MAX_PACKET_24_BYTES,
+                 required_features=0x000000, optional_features=0x000000):
+        Message.__init__(self, msg_id=MESSAGE_CONFIGURE_ADVANCED_BURST,
+                         payload=b'\x00' * 9)
+        self.setEnabled(enable)
+        self.setMaxPacketLength(max_packet_length)
+        self.setRequiredFeatures(required_features)
+        self.setOptionalFeatures(optional_features)
+
+    def isEnabled(self):
+        return bool(self._payload[1])
+
+    def setEnabled(self, enable):
+        self._edit()[1] = 0x01 if enable else 0x00
+
+    def getMaxPacketLength(self):
+        return self._payload[2]
+
+    def setMaxPacketLength(self, length):
+        if length not in (ADVANCED_BURST_MAX_PACKET_8_BYTES,
+                          ADVANCED_BURST_MAX_PACKET_16_BYTES,
+                          ADVANCED_BURST_MAX_PACKET_24_BYTES):
+            raise MessageError('Could not set max packet length ' \
+                                   '(out of range).')
+
+        self._edit()[2] = length
+
+    def getRequiredFeatures(self):
+        return int.from_bytes(self._payload[3:6], 'little')
+
+    def setRequiredFeatures(self, features):
+        if (features > 0xFFFFFF) or (features < 0x00):
+            raise MessageError('Could not set required features ' \
+                                   '(out of range).')
+
+        self._edit()[3:6] = features.to_bytes(3, 'little')
+
+    def getOptionalFeatures(self):
+        return int.from_bytes(self._payload[6:9], 'little')
+
+    def setOptionalFeatures(self, features):
+        if (features > 0xFFFFFF) or (features < 0x00):
+            raise MessageError('Could not set optional features ' \
+                                   '(out of range).')
+
+        self._edit()[6:9] = features.to_bytes(3, 'little')
+
+
+@register_message(MESSAGE_LIB_CONFIG)
+class LibConfigMessage(Message):
+    """
+    Selects the extended data (EXTENDED_FORMAT_FLAG_*) the stick appends
+    to received data messages, 0 turns it off.
+    """
+    __slots__ = ()
+
+    def __init__(self, flags=0x00):
+        Message.__init__(self, msg_id=MESSAGE_LIB_CONFIG, payload=b'\x00\x00')
+        self.setFlags(flags)
+
+    def getFlags(self):
+        return self._payload[1]
+
+    def setFlags(self, flags):
+        if (flags < 0x00) or (flags & ~EXTENDED_FORMAT_FLAGS):
+            raise MessageError('Could not set extended format flags ' \
+                                   '(out of range).')
+
+        self._edit()[1] = flags
 
 
 # Control messages
+@register_message(MESSAGE_SYSTEM_RESET)
 class SystemResetMessage(Message):
+    __slots__ = ()
+
     def __init__(self):
         Message.__init__(self, msg_id=MESSAGE_SYSTEM_RESET, payload=b'\x00')
 
 
+@register_message(MESSAGE_CHANNEL_OPEN)
 class ChannelOpenMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_OPEN,
                                 number=number)
 
 
+@register_message(MESSAGE_CHANNEL_CLOSE)
 class ChannelCloseMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_CLOSE,
                                 number=number)
 
 
+@register_message(MESSAGE_OPEN_RX_SCAN_MODE)
+class OpenRxScanModeMessage(Message):
+    """
+    Opens channel 0 in continuous scan mode, receiving from every device
+    that matches its channel ID (a wildcard ID matches all of them).
+    """
+    __slots__ = ()
+
+    def __init__(self):
+        Message.__init__(self, msg_id=MESSAGE_OPEN_RX_SCAN_MODE, payload=b'\x00')
+
+
+@register_message(MESSAGE_CHANNEL_REQUEST)
 class ChannelRequestMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00, message_id=0x01):
         """
 
@@ -633,34 +946,103 @@ class ChannelRequestMessage(ChannelMessage):
             raise MessageError('Could not set message ID ' \
                                    '(out of range).')
 
-        self._payload[1] = message_id
+        self._edit()[1] = message_id
 
 
 class RequestMessage(ChannelRequestMessage):
-    pass
+    __slots__ = ()
 
 
 # Data messages
+@register_message(MESSAGE_CHANNEL_BROADCAST_DATA)
 class ChannelBroadcastDataMessage(ChannelMessage):
+    __slots__ = ()
+
+    extendable = True
+
     def __init__(self, number=0x00, data=b'\x00' * 7):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_BROADCAST_DATA,
                                 payload=data, number=number)
 
 
+@register_message(MESSAGE_CHANNEL_ACKNOWLEDGED_DATA)
 class ChannelAcknowledgedDataMessage(ChannelMessage):
+    __slots__ = ()
+
+    extendable = True
+
     def __init__(self, number=0x00, data=b'\x00' * 7):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_ACKNOWLEDGED_DATA,
                                 payload=data, number=number)
 
 
+@register_message(MESSAGE_CHANNEL_BURST_DATA)
 class ChannelBurstDataMessage(ChannelMessage):
-    def __init__(self, number=0x00, data=b'\x00' * 7):
+    """
+    The upper three bits of the channel byte hold the sequence number of the
+    packet within the transfer: 0 for the first packet, then 1, 2, 3, 1...
+    with bit 7 set on the last packet.
+    """
+    __slots__ = ()
+
+    extendable = True
+
+    def __init__(self, number=0x00, data=b'\x00' * 7, sequence=0, last=False):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_BURST_DATA,
                                 payload=data, number=number)
+        self.setSequenceNumber(sequence, last)
+
+    def get_channel_number(self):
+        return self._payload[0] & 0x1F
+
+    def setChannelNumber(self, number):
+        if (number > 0x1F) or (number < 0x00):
+            raise MessageError('Could not set channel number ' \
+                                   '(out of range).')
+
+        data = self._edit()
+        data[0] = (data[0] & 0xE0) | number
+
+    def getSequenceNumber(self):
+        return (self._payload[0] >> 5) & 0x03
+
+    def isLastPacket(self):
+        return bool(self._payload[0] & 0x80)
+
+    def setSequenceNumber(self, sequence, last=False):
+        if (sequence > 0x03) or (sequence < 0x00):
+            raise MessageError('Could not set sequence number ' \
+                                   '(out of range).')
+
+        data = self._edit()
+        data[0] = (data[0] & 0x1F) | (sequence << 5) | (0x80 if last else 0x00)
+
+    def getData(self):
+        return self._payload[1:]
+
+
+@register_message(MESSAGE_ADVANCED_BURST_DATA)
+class AdvancedBurstDataMessage(ChannelBurstDataMessage):
+    """
+    Burst packets of 8, 16 or 24 bytes, sent once advanced burst has been
+    configured with ConfigureAdvancedBurstMessage.
+    """
+    __slots__ = ()
+
+    max_payload = 25
+    extendable = False
+
+    def __init__(self, number=0x00, data=b'\x00' * 24, sequence=0, last=False):
+        ChannelMessage.__init__(self, msg_id=MESSAGE_ADVANCED_BURST_DATA,
+                                payload=data, number=number)
+        self.setSequenceNumber(sequence, last)
 
 
 # Channel event messages
+@register_message(MESSAGE_CHANNEL_EVENT)
 class ChannelEventMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00, message_id=0x00, message_code=0x00):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_EVENT,
                                 number=number, payload=b'\x00\x00')
@@ -681,7 +1063,7 @@ class ChannelEventMessage(ChannelMessage):
             raise MessageError('Could not set message ID ' \
                                    '(out of range).')
 
-        self._payload[1] = message_id
+        self._edit()[1] = message_id
 
     def getMessageCode(self):
         """
@@ -695,11 +1077,14 @@ class ChannelEventMessage(ChannelMessage):
             raise MessageError('Could not set message code ' \
                                    '(out of range).')
 
-        self._payload[2] = message_code
+        self._edit()[2] = message_code
 
 
 # Requested response messages
+@register_message(MESSAGE_CHANNEL_STATUS)
 class ChannelStatusMessage(ChannelMessage):
+    __slots__ = ()
+
     def __init__(self, number=0x00, status=0x00):
         ChannelMessage.__init__(self, msg_id=MESSAGE_CHANNEL_STATUS,
                                 payload=b'\x00', number=number)
@@ -713,12 +1098,15 @@ class ChannelStatusMessage(ChannelMessage):
             raise MessageError('Could not set channel status ' \
                                    '(out of range).')
 
-        self._payload[1] = status
+        self._edit()[1] = status
 
 #class ChannelIDMessage(ChannelMessage):
 
 
+@register_message(MESSAGE_VERSION)
 class VersionMessage(Message):
+    __slots__ = ()
+
     def __init__(self, version=b'\x00' * 9):
         Message.__init__(self, msg_id=MESSAGE_VERSION, payload=b'\x00' * 9)
         self.setVersion(version)
@@ -734,7 +1122,10 @@ class VersionMessage(Message):
         self.set_payload(version)
 
 
+@register_message(MESSAGE_CAPABILITIES)
 class CapabilitiesMessage(Message):
+    __slots__ = ()
+
     def __init__(self, max_channels=0x00, max_nets=0x00, std_opts=0x00,
                  adv_opts=0x00,
                  adv_opts2=0x00,
@@ -776,45 +1167,48 @@ class CapabilitiesMessage(Message):
             raise MessageError('Could not set max channels ' \
                                    '(out of range).')
 
-        self._payload[0] = num
+        self._edit()[0] = num
 
     def setMaxNetworks(self, num):
         if (num > 0xFF) or (num < 0x00):
             raise MessageError('Could not set max networks ' \
                                    '(out of range).')
 
-        self._payload[1] = num
+        self._edit()[1] = num
 
     def setStdOptions(self, num):
         if (num > 0xFF) or (num < 0x00):
             raise MessageError('Could not set std options ' \
                                    '(out of range).')
         if num is None or 0x00:
-            del self._payload[2]
-        self._payload[2] = num
+            del self._edit()[2]
+        self._edit()[2] = num
 
     def setAdvOptions(self, num):
         if (num > 0xFF) or (num < 0x00):
             raise MessageError('Could not set adv options ' \
                                    '(out of range).')
 
-        self._payload[3] = num
+        self._edit()[3] = num
 
     def setAdvOptions2(self, num):
         if (num > 0xFF) or (num < 0x00):
             raise MessageError('Could not set adv options 2 ' \
                                    '(out of range).')
 
-        self._payload[4] = num
+        self._edit()[4] = num
 
     def setAdvOptions3(self, num):
         if (num > 0xFF) or (num < 0x00):
             raise MessageError('Could not set adv options 3 ' \
                                    '(out of range).')
-        self._payload[6] = num
+        self._edit()[6] = num
 
 
+@register_message(MESSAGE_SERIAL_NUMBER)
 class SerialNumberMessage(Message):
+    __slots__ = ()
+
     def __init__(self, serial=b'\x00' * 4):
         Message.__init__(self, msg_id=MESSAGE_SERIAL_NUMBER)
         self.setSerialNumber(serial)
@@ -830,7 +1224,10 @@ class SerialNumberMessage(Message):
         self.set_payload(serial)
 
 
+@register_message(MESSAGE_STARTUP)
 class NotificationStartupMessage(Message):
+    __slots__ = ()
+
     def __init__(self, startup_message=b'\x00'):
         Message.__init__(self, msg_id=MESSAGE_STARTUP)
         self.setStartupMessage(startup_message)
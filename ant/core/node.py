@@ -31,6 +31,8 @@ from ant.core.constants import *
 from ant.core.exceptions import *
 from ant.core import message
 from ant.core import event
+from ant.core import burst
+from ant.core import scan
 
 import logging
 
@@ -48,18 +50,30 @@ class NetworkKey(object):
 
 
 class Channel(event.EventCallback):
-    cb_lock = threading.Lock()
-
-    def __init__(self, node):
+    def __init__(self, node, number=0):
+        self.cb_lock = threading.Lock()
         self.node = node
         self.is_free = True
         self.name = str(uuid.uuid4())
-        self.number = 0
         self.cb = []
-        self.node.evm.registerCallback(self)
+        self.burst = None
+        self.change_filter = None
+        # The event machine hands each channel its own messages only
+        self._number = number
+        self.node.evm.registerChannel(number, self)
 
     def __del__(self):
-        self.node.evm.removeCallback(self)
+        self.node.evm.removeChannel(self._number, self)
+
+    @property
+    def number(self):
+        return self._number
+
+    @number.setter
+    def number(self, number):
+        self.node.evm.removeChannel(self._number, self)
+        self._number = number
+        self.node.evm.registerChannel(number, self)
 
     def assign(self, net_key, ch_type):
         msg = message.ChannelAssignMessage(number=self.number)
@@ -79,6 +93,30 @@ class Channel(event.EventCallback):
         if self.node.evm.waitForAck(msg) != RESPONSE_NO_ERROR:
             raise ChannelError('Could not set channel ID.')
 
+    def requestID(self):
+        """
+        Asks the stick which device the channel is paired with, e.g. after
+        setID() with a wildcard device number.
+        :return: (device_number, device_type, transmission_type)
+        """
+        msg = message.ChannelRequestMessage(number=self.number, message_id=MESSAGE_CHANNEL_ID)
+        self.write(msg)
+        while True:
+            response = self.node.evm.waitForMessage(message.ChannelIDMessage)
+            if response.get_channel_number() == self.number:
+                return (response.getDeviceNumber(),
+                        response.getDeviceType(),
+                        response.getTransmissionType())
+
+    def getDevice(self):
+        """
+        :return: the scan.Device the channel is paired with, if the node
+                 has a registry and the pairing is known, else None
+        """
+        if self.node.registry is None:
+            return None
+        return self.node.registry.getChannelDevice(self.number)
+
     def setSearchTimeout(self, timeout):
         msg = message.ChannelSearchTimeoutMessage(number=self.number)
         msg.setTimeout(timeout)
@@ -131,39 +169,133 @@ class Channel(event.EventCallback):
             self.cb.append(callback)
         self.cb_lock.release()
 
+    def removeCallback(self, callback):
+        self.cb_lock.acquire()
+        if callback in self.cb:
+            self.cb.remove(callback)
+        self.cb_lock.release()
+
+    def registerBurstCallback(self, callback):
+        """
+        Registers a callback for the completed burst transfers received on
+        this channel, see burst.BurstReassembler.
+        """
+        self.cb_lock.acquire()
+        if self.burst is None:
+            self.burst = burst.BurstReassembler()
+            self.cb.append(self.burst)
+        self.cb_lock.release()
+        self.burst.registerCallback(callback)
+
+    def setChangeFilter(self, change_filter):
+        """
+        Filters the messages handed to the callbacks through change_filter,
+        see dedup.ChangeFilter, or stops filtering when None.
+        """
+        self.cb_lock.acquire()
+        self.change_filter = change_filter
+        self.cb_lock.release()
+
     def process(self, msg):
         self.cb_lock.acquire()
         if isinstance(msg, message.ChannelMessage) and \
-        msg.get_channel_number() == self.number:
+        msg.get_channel_number() == self.number and \
+        (self.change_filter is None or self.change_filter.accept(msg)):
             for callback in self.cb:
                 try:
                     callback.process(msg)
-                except:
-                    pass  # Who cares?
+                except Exception:
+                    logger.exception('Channel {} callback failed on {}.'.format(self.number, msg))
         self.cb_lock.release()
 
     def write(self, msg):
         logger.debug("Channel writing message:{}".format(msg))
         self.node.driver.write(msg.encode())
 
-    def configure_for_profile(self, profile):
-        self.node.setNetworkKey(profile.network_key)
+    def send_burst(self, data, retries=burst.BURST_RETRIES, timeout=burst.BURST_TIMEOUT):
+        """
+        Sends data as a burst transfer, padded with zeros to a whole number
+        of packets, and waits for it to complete. Packets are 8 bytes, or
+        larger once Node.configureAdvancedBurst() has enabled advanced
+        burst. Failed transfers are sent again, up to retries times.
+        :param timeout: seconds to wait for each attempt to complete
+        :return: a burst.BurstReport with the achieved throughput
+        :raises ChannelError: if the transfer timed out or kept failing
+        """
+        frames, packets = burst.encode_burst(self.number, data,
+                                             self.node.burst_packet_size)
+        tracker = burst.BurstTracker()
+        self.registerCallback(tracker)
+        try:
+            for attempt in range(1, retries + 2):
+                tracker.reset()
+                started = time.monotonic()
+                self._stream(frames)
+                result = tracker.wait(timeout)
+                if result == EVENT_TRANSFER_TX_COMPLETED:
+                    return burst.BurstReport(self.number, len(data), packets, attempt,
+                                             tracker.started or started, time.monotonic())
+                if result is None:
+                    raise ChannelError('Could not send burst (timed out).')
+                logger.debug('Burst transfer on channel {} failed (attempt {}).'.format(
+                    self.number, attempt))
+        finally:
+            self.removeCallback(tracker)
+        raise ChannelError('Could not send burst (failed {} times).'.format(retries + 1))
+
+    def _stream(self, frames):
+        # Hand the driver everything that is left, it takes as much as it can
+        offset = 0
+        while offset < len(frames):
+            written = self.node.driver.write(frames[offset:] if offset else frames)
+            if written <= 0:
+                raise ChannelError('Could not send burst (write failed).')
+            offset += written
+
+    def configure_for_profile(self, profile, network=0):
+        """
+        Assigns the channel to the network holding the profile's network
+        key, installing the key as network number network first if no
+        network holds it, then applies the profile's channel ID, RF
+        frequency, period and search timeout. A channel that is already
+        assigned is left on its network.
+        """
+        for net_key in self.node.networks:
+            if net_key.key == profile.network_key:
+                break
+        else:
+            net_key = NetworkKey(key=profile.network_key)
+            self.node.setNetworkKey(network, net_key)
+        if self.is_free:
+            self.assign(net_key.name, profile.channel_type)
         self.setID(profile.device_type, profile.device_number, profile.transmission_type)
+        self.setFrequency(profile.rf_channel_frequency)
         self.setPeriod(profile.channel_period)
         self.setSearchTimeout(profile.search_timeout)
 
 
 class Node(event.EventCallback):
-    node_lock = threading.Lock()
-
-    def __init__(self, driver):
+    def __init__(self, driver, executor=None, registry=None):
+        """
+        :param executor: an event.CallbackExecutor to run the channel and
+                         listener callbacks on, instead of the pump thread
+        :param registry: a registry.DeviceRegistry to remember the devices
+                         the node sees
+        """
+        self.node_lock = threading.Lock()
         self.driver = driver
-        self.evm = event.EventMachine(self.driver)
+        self.evm = event.EventMachine(self.driver, executor)
         self.evm.registerCallback(self)
+        self.registry = registry
+        if registry is not None:
+            self.evm.registerCallback(registry)
         self.networks = []
         self.channels = []
         self.running = False
-        self.options = [0x00, 0x00, 0x00]
+        self.options = [0x00, 0x00, 0x00, 0x00]
+        self.scan_table = None
+        # Bytes per burst packet, more than 8 once advanced burst is on
+        self.burst_packet_size = burst.BURST_PACKET_SIZE
 
     def start(self):
         if self.running:
@@ -201,7 +333,10 @@ class Node(event.EventCallback):
         msg.setMessageID(MESSAGE_CAPABILITIES)
         self.write(msg)
 
-        caps = self.evm.waitForMessage(message.CapabilitiesMessage)
+        try:
+            caps = self.evm.waitForMessage(message.CapabilitiesMessage)
+        except EventTimeoutError:
+            raise NodeError('Could not initialize ANT node (no capabilities received).')
 
         self.networks = []
         # print("max networks: {}".format(caps.getMaxNetworks()))
@@ -210,17 +345,138 @@ class Node(event.EventCallback):
             self.setNetworkKey(int(i))
         self.channels = []
         for i in range(0, caps.getMaxChannels()):
-            self.channels.append(Channel(self))
-            self.channels[i].number = i
+            self.channels.append(Channel(self, i))
         self.options = (caps.getStdOptions(),
                         caps.getAdvOptions(),
-                        caps.getAdvOptions2(),)
+                        caps.getAdvOptions2(),
+                        caps.getAdvOptions3(),)
+        # A reset stick is back to standard burst
+        self.burst_packet_size = burst.BURST_PACKET_SIZE
 
     def getCapabilities(self):
         return (len(self.channels),
                 len(self.networks),
                 self.options,)
 
+    def enableExtendedMessages(self, channel_id=True, rssi=False, timestamp=False):
+        """
+        Has the stick append the sender's channel ID, the RSSI and/or the
+        RX timestamp to every data message it receives, see
+        message.Message.get_extended_data(). Disables extended messages
+        if every flag is False.
+        :raises NodeError: if the stick lacks extended messages or refused
+        """
+        if not self.options[2] & CAPABILITIES_EXT_MESSAGE_ENABLED:
+            raise NodeError('Could not enable extended messages (not supported).')
+
+        flags = 0x00
+        if channel_id:
+            flags |= EXTENDED_FORMAT_FLAG_CHANNEL_ID
+        if rssi:
+            flags |= EXTENDED_FORMAT_FLAG_RSSI
+        if timestamp:
+            flags |= EXTENDED_FORMAT_FLAG_TIMESTAMP
+
+        msg = message.LibConfigMessage(flags)
+        self.write(msg)
+        if self.evm.waitForAck(msg) != RESPONSE_NO_ERROR:
+            raise NodeError('Could not enable extended messages.')
+
+    def startScan(self, net_key=None, frequency=None, rssi=True, timestamp=False,
+                  table=None):
+        """
+        Opens channel 0 in continuous scan mode, with a wildcard channel ID
+        and extended messages on, so the stick receives from every device in
+        range. Every other channel is unusable until stopScan().
+        :param net_key: name of the network key to scan, the first by default
+        :param frequency: RF channel to scan, the stick's default if None
+        :param table: a scan.DeviceTable to fill, a new one by default
+        :return: the scan.DeviceTable the received devices are kept in
+        """
+        if not self.options[2] & CAPABILITIES_SCAN_MODE_ENABLED:
+            raise NodeError('Could not start scan mode (not supported).')
+        if self.scan_table is not None:
+            raise NodeError('Could not start scan mode (already scanning).')
+        if not self.channels or not self.channels[0].is_free:
+            raise NodeError('Could not start scan mode (channel 0 in use).')
+
+        channel = self.channels[0]
+        if net_key is None:
+            net_key = self.networks[0].name
+        if table is None:
+            table = scan.DeviceTable()
+        channel.assign(net_key, CHANNEL_TYPE_TWOWAY_RECEIVE)
+        try:
+            channel.setID(0, 0, 0)
+            if frequency is not None:
+                channel.setFrequency(frequency)
+            self.enableExtendedMessages(channel_id=True, rssi=rssi, timestamp=timestamp)
+
+            channel.registerCallback(table)
+            msg = message.OpenRxScanModeMessage()
+            self.write(msg)
+            if self.evm.waitForAck(msg) != RESPONSE_NO_ERROR:
+                raise NodeError('Could not start scan mode.')
+        except ANTException:
+            channel.removeCallback(table)
+            self._abortScan(channel)
+            raise
+        self.scan_table = table
+        return table
+
+    def _abortScan(self, channel):
+        # Free channel 0 and turn extended messages back off, so a failed
+        # startScan() can be retried
+        for undo in (channel.unassign,
+                     lambda: self.enableExtendedMessages(channel_id=False)):
+            try:
+                undo()
+            except ANTException as e:
+                logger.warning('Could not undo scan mode setup ({}).'.format(e))
+
+    def stopScan(self):
+        if self.scan_table is None:
+            raise NodeError('Could not stop scan mode (not scanning).')
+
+        channel = self.channels[0]
+        channel.removeCallback(self.scan_table)
+        self.scan_table = None
+        channel.close()
+        channel.unassign()
+
+    def hasAdvancedBurst(self):
+        return bool(self.options[3] & CAPABILITIES_ADVANCED_BURST_ENABLED)
+
+    def configureAdvancedBurst(self, packet_size=24, required_features=0x000000,
+                               optional_features=0x000000):
+        """
+        Switches burst transfers to packet_size byte packets. Sticks without
+        advanced burst, or that refuse the configuration, stay on standard
+        8 byte packets.
+        :param packet_size: 8, 16 or 24
+        :return: the packet size burst transfers now use
+        """
+        if packet_size not in burst.ADVANCED_BURST_PACKET_SIZES:
+            raise NodeError('Could not configure advanced burst (invalid packet size).')
+
+        if not self.hasAdvancedBurst():
+            logger.debug('Advanced burst not supported, using standard burst.')
+            self.burst_packet_size = burst.BURST_PACKET_SIZE
+            return self.burst_packet_size
+
+        msg = message.ConfigureAdvancedBurstMessage(
+            enable=packet_size != burst.BURST_PACKET_SIZE,
+            max_packet_length=burst.ADVANCED_BURST_PACKET_SIZES[packet_size],
+            required_features=required_features,
+            optional_features=optional_features)
+        self.write(msg)
+        if self.evm.waitForAck(msg) != RESPONSE_NO_ERROR:
+            logger.warning('Advanced burst configuration refused, using standard burst.')
+            self.burst_packet_size = burst.BURST_PACKET_SIZE
+        else:
+            self.burst_packet_size = packet_size
+        return self.burst_packet_size
+
     def setNetworkKey(self, number, key=None):
         if not key:
             return
@@ -257,4 +513,87 @@ class Node(event.EventCallback):
         self.driver.write(msg.encode())
 
     def respond_with(self, msg: message.Message):
-        self.evm.event_pumper.force_buffer(msg.encode())
\ No newline at end of file
+        self.evm.event_pumper.force_buffer(msg.encode())
+
+class NodePool(object):
+    """
+    Drives several sticks as one node. Channels are handed out from the
+    least loaded stick and listeners see the messages of every stick.
+    """
+
+    def __init__(self, drivers=()):
+        self.pool_lock = threading.Lock()
+        self.nodes = []
+        self.listeners = []
+        for driver in drivers:
+            self.addNode(Node(driver))
+
+    def addNode(self, node):
+        with self.pool_lock:
+            self.nodes.append(node)
+            for callback in self.listeners:
+                node.registerEventListener(callback)
+        return node
+
+    def start(self):
+        # Every Node.start() waits out a reset, so do them side by side
+        errors = []
+
+        def start(node):
+            try:
+                node.start()
+            except ANTException as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=start, args=(node,))
+                   for node in self.nodes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            # Leave no node running, so the pool can be started again
+            for node in self.nodes:
+                if node.running:
+                    try:
+                        node.stop(reset=False)
+                    except ANTException as e:
+                        logger.warning('Could not stop node ({}).'.format(e))
+            raise NodeError('Could not start node pool ({}).'.format(errors[0]))
+
+    def stop(self, reset=True):
+        for node in self.nodes:
+            if node.running:
+                node.stop(reset)
+
+    def getCapabilities(self):
+        return (len(self.channels),
+                min(len(node.networks) for node in self.nodes) if self.nodes else 0,
+                [node.options for node in self.nodes],)
+
+    @property
+    def channels(self):
+        return [channel for node in self.nodes for channel in node.channels]
+
+    def setNetworkKey(self, number, key=None):
+        for node in self.nodes:
+            node.setNetworkKey(number, key)
+
+    def getFreeChannel(self):
+        best = None
+        best_free = 0
+        for node in self.nodes:
+            free = sum(1 for channel in node.channels if channel.is_free)
+            if free > best_free:
+                best = node
+                best_free = free
+        if best is None:
+            raise NodeError('Could not find free channel.')
+        return best.getFreeChannel()
+
+    def registerEventListener(self, callback):
+        with self.pool_lock:
+            if callback not in self.listeners:
+                self.listeners.append(callback)
+            for node in self.nodes:
+                node.registerEventListener(callback)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import time
+
+from ant.core.constants import *
+from ant.core import message
+from ant.core.scan import Device, DeviceTable
+
+
+# Defaults sized for a gateway seeing thousands of passing devices a day
+REGISTRY_MAX_DEVICES = 4096
+REGISTRY_TTL = 600.0
+
+
+class DeviceRegistry(DeviceTable):
+    """
+    Remembers the devices a node has seen, whatever channel they were seen
+    on. Besides the extended data of received messages (see
+    Node.enableExtendedMessages), it learns from the ChannelIDMessage a
+    channel paired with a wildcard ID answers with, so getChannelDevice()
+    tells which device a channel is tracking. Register it with
+    Node.registerEventListener().
+
+    The registry is bounded: it holds at most max_devices devices,
+    evicting the least recently seen, and forgets devices not seen for
+    ttl seconds.
+    """
+
+    def __init__(self, max_devices=REGISTRY_MAX_DEVICES, ttl=REGISTRY_TTL,
+                 clock=time.monotonic):
+        DeviceTable.__init__(self, max_devices, ttl, clock)
+        self._channels = {}
+
+    def process(self, msg):
+        if isinstance(msg, message.ChannelIDMessage):
+            self._paired(msg)
+        elif msg.is_extended_message:
+            DeviceTable.process(self, msg)
+
+    def _paired(self, msg):
+        device_number = msg.getDeviceNumber()
+        device_type = msg.getDeviceType()
+        # Zeros are wildcards, not an identity
+        if not device_number or not device_type:
+            return
+        wire_key = (device_number, device_type, msg.getTransmissionType())
+        number = msg.get_channel_number()
+        now = self.clock()
+        with self.lock:
+            device = self._devices.get(wire_key)
+            if device is None:
+                device = self._devices[wire_key] = Device(wire_key, now)
+            else:
+                self._devices.move_to_end(wire_key)
+                device.last_seen = now
+            self._evict(now)
+            device.channel = number
+            self._channels[number] = wire_key
+
+    def getChannelDevice(self, number):
+        """
+        :return: the Device channel number was last paired with, or None
+        """
+        with self.lock:
+            wire_key = self._channels.get(number)
+        if wire_key is None:
+            return None
+        device_number, device_type, transmission_type = wire_key
+        return self.get(device_type, device_number, transmission_type)
+
+    def clear(self):
+        with self.lock:
+            self._devices.clear()
+            self._channels.clear()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import threading
+import time
+
+from ant.core import log
+from ant.core import better_log
+from ant.core.driver import Driver, READ_TIMEOUT
+from ant.core.exceptions import DriverError
+
+
+def open_capture(filename):
+    """
+    Opens a capture written by either log.LogWriter (binary) or
+    better_log.LogWriter (text) and returns the matching LogReader.
+    """
+    with open(filename, 'rb') as fd:
+        magic = fd.read(len(log.MAGIC))
+    if magic == log.MAGIC:
+        return log.LogReader(filename)
+    return better_log.LogReader(filename)
+
+
+class ReplayDriver(Driver):
+    """
+    Plays the READ events of a capture back as if they came from a stick.
+    Anything written to the driver is discarded.
+
+    speed scales the recorded time between reads: 1 replays in real time,
+    10 ten times faster, and None as fast as the reader consumes data.
+    finished is set once the whole capture has been read.
+    """
+    blocking = True
+
+    def __init__(self, device, speed=1.0, log=None, debug=False,
+                 timeout=READ_TIMEOUT):
+        Driver.__init__(self, device, log, debug, timeout)
+        self.speed = speed
+        self.finished = threading.Event()
+        self._reader = None
+
+    def _open(self):
+        try:
+            self._reader = open_capture(self.device)
+        except IOError as e:
+            raise DriverError(str(e))
+        self._records = iter(self._reader)
+        self._pending = None
+        self._base = None
+        self._clock = None
+        self.finished.clear()
+
+    def _close(self):
+        self._reader.close()
+
+    def _next(self):
+        if self._pending is not None:
+            record = self._pending
+            self._pending = None
+            return record
+        for event, timestamp, data in self._records:
+            if event == log.EVENT_READ and data:
+                return (timestamp, data)
+        return None
+
+    def _due(self, timestamp):
+        if not self.speed:
+            return 0
+        if self._base is None:
+            self._base = timestamp
+            self._clock = time.monotonic()
+        elapsed = (timestamp - self._base) / 1e9 / self.speed
+        return self._clock + elapsed - time.monotonic()
+
+    def _read(self, count):
+        record = self._next()
+        if record is None:
+            self.finished.set()
+            if self.timeout:
+                time.sleep(self.timeout)
+            return b''
+
+        delay = self._due(record[0])
+        if delay > 0:
+            if self.timeout is not None and delay > self.timeout:
+                self._pending = record
+                time.sleep(self.timeout)
+                return b''
+            time.sleep(delay)
+
+        # Hand over everything that is already due, up to count bytes
+        data = record[1]
+        while len(data) < count:
+            record = self._next()
+            if record is None:
+                break
+            if self._due(record[0]) > 0:
+                self._pending = record
+                break
+            data += record[1]
+
+        if len(data) > count:
+            self._pending = (record[0], data[count:])
+            data = data[:count]
+        return data
+
+    def _write(self, data):
+        return len(data)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import collections
+import threading
+import time
+
+from ant.core.constants import *
+from ant.core.exceptions import MessageError
+from ant.core import event
+
+
+# Weight of the newest interval in a device's smoothed message rate
+RATE_SMOOTHING = 0.2
+
+
+class Device(object):
+    """
+    What has been seen of one device. rate is the smoothed number of
+    messages per second, payload the data of the latest message and
+    channel the number of the channel it was last received on.
+    """
+    __slots__ = ('device_type', 'device_number', 'transmission_type',
+                 'first_seen', 'last_seen', 'count', 'interval', 'rssi',
+                 'payload', 'channel')
+
+    def __init__(self, key, now):
+        self.device_number, self.device_type, self.transmission_type = key
+        self.first_seen = now
+        self.last_seen = now
+        self.count = 0
+        self.interval = None
+        self.rssi = None
+        self.payload = None
+        self.channel = None
+
+    @property
+    def key(self):
+        return (self.device_type, self.device_number, self.transmission_type)
+
+    @property
+    def rate(self):
+        if not self.interval:
+            return 0.0
+        return 1.0 / self.interval
+
+    def __repr__(self):
+        return '<Device type={:02X} number={} transmission={:02X} count={} rate={:.1f}/s>'.format(
+            self.device_type, self.device_number, self.transmission_type,
+            self.count, self.rate)
+
+
+class DeviceTable(event.EventCallback):
+    """
+    Keeps a Device for every sender of the extended data messages it is
+    given, keyed by (device_type, device_number, transmission_type).
+    Messages without a channel ID in their extended data, or with
+    truncated extended data, are ignored.
+
+    The table is unbounded unless max_devices and/or ttl (seconds) are
+    given, then the least recently seen devices are evicted to stay
+    within max_devices, and devices not seen for ttl seconds are expired.
+    """
+
+    def __init__(self, max_devices=None, ttl=None, clock=time.monotonic):
+        self.lock = threading.Lock()
+        self.clock = clock
+        self.max_devices = max_devices
+        self.ttl = ttl
+        # Keyed by the channel ID as it is laid out on the wire (number,
+        # type, transmission), so updates need not reorder it. Least
+        # recently seen first.
+        self._devices = collections.OrderedDict()
+        self.ignored = 0
+        self.evicted = 0
+
+    def process(self, msg):
+        if not msg.is_extended_message or \
+                not msg.flag_byte & EXTENDED_FORMAT_FLAG_CHANNEL_ID:
+            self.ignored += 1
+            return
+
+        try:
+            extended = msg.get_extended_data()
+        except MessageError:
+            # The flags announce more than the frame carries. Registries run
+            # on the pump thread, so this must not raise.
+            self.ignored += 1
+            return
+        wire_key = (extended.device_number, extended.device_type,
+                    extended.transmission_type)
+        self._update(wire_key, msg.get_channel_number(), bytes(msg.payload[1:]),
+                     extended.rssi)
+
+    def _update(self, wire_key, channel, payload, rssi):
+        now = self.clock()
+        with self.lock:
+            devices = self._devices
+            device = devices.get(wire_key)
+            if device is None:
+                device = devices[wire_key] = Device(wire_key, now)
+            else:
+                devices.move_to_end(wire_key)
+                if device.interval is None:
+                    device.interval = now - device.last_seen
+                else:
+                    device.interval += RATE_SMOOTHING * (now - device.last_seen - device.interval)
+            device.last_seen = now
+            self._evict(now)
+            device.count += 1
+            device.channel = channel
+            device.payload = payload
+            if rssi is not None:
+                device.rssi = rssi
+        return device
+
+    def _evict(self, now):
+        # Only the oldest entries can be due, so this stays O(1) per update
+        devices = self._devices
+        while self.max_devices is not None and len(devices) > self.max_devices:
+            devices.popitem(last=False)
+            self.evicted += 1
+        if self.ttl is not None:
+            deadline = now - self.ttl
+            while devices:
+                device = next(iter(devices.values()))
+                if device.last_seen >= deadline:
+                    break
+                devices.popitem(last=False)
+                self.evicted += 1
+
+    def expire(self):
+        """
+        Drops the devices not seen for ttl seconds. Every update does so
+        too, this is for tables that stop receiving.
+        """
+        with self.lock:
+            self._evict(self.clock())
+
+    def get(self, device_type, device_number, transmission_type):
+        """
+        :return: the Device with that channel ID, or None if not seen
+        """
+        with self.lock:
+            device = self._devices.get((device_number, device_type, transmission_type))
+        if device is not None and self.ttl is not None and \
+                device.last_seen < self.clock() - self.ttl:
+            return None
+        return device
+
+    def devices(self):
+        with self.lock:
+            return list(self._devices.values())
+
+    def clear(self):
+        with self.lock:
+            self._devices.clear()
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __contains__(self, key):
+        device_type, device_number, transmission_type = key
+        return (device_number, device_type, transmission_type) in self._devices
+
+    def __iter__(self):
+        return iter(self.devices())
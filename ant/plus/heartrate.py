@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import struct
+
+from ant.core import event
+from ant.core import message
+from ant.plus import pages
+
+
+# Heart beat event times count 1/1024 s
+BEAT_TIME_RATE = 1024.0
+# Cumulative operating time counts 2 s
+OPERATING_TIME_UNIT = 2
+
+HEART_RATE_DEVICE_TYPE = 0x78
+
+
+class HeartRatePage(pages.DataPage):
+    """
+    Page 0, the fields every heart rate page ends with. beat_time counts
+    1/1024 s.
+    """
+    __slots__ = fields = ('beat_time', 'beat_count', 'heart_rate')
+    number = 0
+    layout = struct.Struct('<xxxxHBB')
+
+
+class OperatingTimePage(HeartRatePage):
+    """
+    Page 1, operating_time is in seconds.
+    """
+    __slots__ = ('operating_time',)
+    number = 1
+    layout = struct.Struct('<xHBHBB')
+
+    @classmethod
+    def unpack(cls, data):
+        low, high, beat_time, beat_count, heart_rate = cls.layout.unpack_from(data)
+        record = cls.__new__(cls)
+        record.operating_time = (low | (high << 16)) * OPERATING_TIME_UNIT
+        record.beat_time = beat_time
+        record.beat_count = beat_count
+        record.heart_rate = heart_rate
+        return record
+
+
+class HeartRateManufacturerPage(HeartRatePage):
+    __slots__ = ('manufacturer_id', 'serial_number')
+    fields = __slots__ + HeartRatePage.fields
+    number = 2
+    layout = struct.Struct('<xBHHBB')
+
+
+class HeartRateProductPage(HeartRatePage):
+    __slots__ = ('hardware_version', 'software_version', 'model_number')
+    fields = __slots__ + HeartRatePage.fields
+    number = 3
+    layout = struct.Struct('<xBBBHBB')
+
+
+class PreviousBeatPage(HeartRatePage):
+    __slots__ = ('previous_beat_time',)
+    fields = __slots__ + HeartRatePage.fields
+    number = 4
+    layout = struct.Struct('<xxHHBB')
+
+
+class HeartRateSample(object):
+    """
+    One heart beat. rr_interval is the time since the previous beat in
+    seconds, None when it cannot be known (first beat, or beats were
+    missed on a monitor that does not send page 4).
+    """
+    __slots__ = ('heart_rate', 'beat_count', 'beat_time', 'rr_interval', 'page')
+
+    def __init__(self, heart_rate, beat_count, beat_time, rr_interval, page):
+        self.heart_rate = heart_rate
+        self.beat_count = beat_count
+        self.beat_time = beat_time
+        self.rr_interval = rr_interval
+        self.page = page
+
+    def __repr__(self):
+        return '<HeartRateSample heart_rate={} beat_count={} rr_interval={}>'.format(
+            self.heart_rate, self.beat_count, self.rr_interval)
+
+
+class HeartRateDecoder(event.EventCallback, event.CallbackDispatcher):
+    """
+    Decodes the broadcast data pages 0 to 4 of an ANT+ heart rate monitor.
+    Monitors repeat each beat at 4 Hz until the next one, the decoder only
+    hands a HeartRateSample to its callbacks when the beat count moves on.
+    Pages 1 to 3 fill in operating_time, manufacturer_id, serial_number,
+    hardware_version, software_version and model_number. RR intervals come
+    from the previous beat time of page 4 when sent, else from consecutive
+    beats.
+    """
+
+    def __init__(self):
+        event.CallbackDispatcher.__init__(self)
+        self.beat_count = None
+        self.beat_time = None
+        self.operating_time = None
+        self.manufacturer_id = None
+        self.serial_number = None
+        self.hardware_version = None
+        self.software_version = None
+        self.model_number = None
+        self.samples = 0
+        self.missed_beats = 0
+        self.paged = False
+        self._toggle = None
+
+    def process(self, msg):
+        if not isinstance(msg, message.ChannelBroadcastDataMessage):
+            return
+        payload = msg.payload
+        if len(payload) < 9:
+            return
+
+        data = payload[1:9]
+        # Legacy monitors fill byte 0 with junk rather than a page number,
+        # only trust it once the toggle bit has been seen to flip
+        toggle = data[0] & 0x80
+        if not self.paged:
+            if self._toggle is not None and toggle != self._toggle:
+                self.paged = True
+            self._toggle = toggle
+        record = pages.decode(HEART_RATE_DEVICE_TYPE, data) if self.paged else None
+        if not isinstance(record, HeartRatePage):
+            # Every page ends with the beat fields, whatever comes before
+            record = HeartRatePage.unpack(data)
+        page = data[0] & 0x7F if self.paged else 0
+
+        previous_time = None
+        if isinstance(record, OperatingTimePage):
+            self.operating_time = record.operating_time
+        elif isinstance(record, HeartRateManufacturerPage):
+            self.manufacturer_id = record.manufacturer_id
+            self.serial_number = record.serial_number
+        elif isinstance(record, HeartRateProductPage):
+            self.hardware_version = record.hardware_version
+            self.software_version = record.software_version
+            self.model_number = record.model_number
+        elif isinstance(record, PreviousBeatPage):
+            previous_time = record.previous_beat_time
+
+        beat_time = record.beat_time
+        beat_count = record.beat_count
+        if beat_count == self.beat_count:
+            return
+
+        rr_interval = None
+        if self.beat_count is not None:
+            beats = (beat_count - self.beat_count) & 0xFF
+            if beats == 1:
+                rr_interval = ((beat_time - self.beat_time) & 0xFFFF) / BEAT_TIME_RATE
+            else:
+                self.missed_beats += beats - 1
+        if previous_time is not None:
+            # Page 4 carries the previous beat itself, good despite gaps
+            rr_interval = ((beat_time - previous_time) & 0xFFFF) / BEAT_TIME_RATE
+        self.beat_count = beat_count
+        self.beat_time = beat_time
+
+        sample = HeartRateSample(record.heart_rate, beat_count, beat_time / BEAT_TIME_RATE,
+                                 rr_interval, page)
+        self.samples += 1
+        self._deliver(sample)
+
+
+pages.register_page(HEART_RATE_DEVICE_TYPE, HeartRatePage)
+pages.register_page(HEART_RATE_DEVICE_TYPE, OperatingTimePage)
+pages.register_page(HEART_RATE_DEVICE_TYPE, HeartRateManufacturerPage)
+pages.register_page(HEART_RATE_DEVICE_TYPE, HeartRateProductPage)
+pages.register_page(HEART_RATE_DEVICE_TYPE, PreviousBeatPage)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import importlib
+import struct
+import threading
+
+from ant.core import event
+from ant.core import message
+
+
+MANUFACTURER_INFO_PAGE = 80
+PRODUCT_INFO_PAGE = 81
+BATTERY_STATUS_PAGE = 82
+
+# (device type, page number) -> DataPage subclass
+_pages = {}
+# Device type -> (module defining its pages, toggle bit in the page number)
+_profiles = {}
+_loaded = set()
+_load_lock = threading.Lock()
+
+
+class DataPage(object):
+    """
+    Base of the records data pages decode to. Subclasses list their field
+    names in __slots__ and fields, and the layout of the 8 byte page the
+    fields unpack from, page number included.
+    """
+    __slots__ = ()
+    number = None
+    layout = None
+    fields = ()
+
+    @classmethod
+    def unpack(cls, data):
+        record = cls.__new__(cls)
+        for name, value in zip(cls.fields, cls.layout.unpack_from(data)):
+            setattr(record, name, value)
+        return record
+
+    def __repr__(self):
+        names = [name for cls in reversed(type(self).__mro__)
+                 for name in getattr(cls, '__slots__', ())]
+        return '<{} {}>'.format(type(self).__name__, ' '.join(
+            '{}={}'.format(name, getattr(self, name)) for name in names))
+
+
+class ManufacturerInfoPage(DataPage):
+    __slots__ = fields = ('hardware_revision', 'manufacturer_id', 'model_number')
+    number = MANUFACTURER_INFO_PAGE
+    layout = struct.Struct('<xxxBHH')
+
+
+class ProductInfoPage(DataPage):
+    __slots__ = fields = ('software_revision_supplemental', 'software_revision',
+                          'serial_number')
+    number = PRODUCT_INFO_PAGE
+    layout = struct.Struct('<xxBBI')
+
+
+class BatteryStatusPage(DataPage):
+    """
+    operating_time is in seconds, battery_voltage in volts, None when the
+    sensor does not report it.
+    """
+    __slots__ = ('battery_identifier', 'operating_time', 'battery_voltage',
+                 'battery_status')
+    number = BATTERY_STATUS_PAGE
+    layout = struct.Struct('<xxBHBBB')
+
+    @classmethod
+    def unpack(cls, data):
+        identifier, low, high, fraction, descriptive = cls.layout.unpack_from(data)
+        record = cls.__new__(cls)
+        record.battery_identifier = identifier
+        # Operating time counts 2 s or 16 s units
+        unit = 2 if descriptive & 0x80 else 16
+        record.operating_time = (low | (high << 16)) * unit
+        coarse = descriptive & 0x0F
+        record.battery_voltage = None if coarse == 0x0F else coarse + fraction / 256.0
+        record.battery_status = (descriptive >> 4) & 0x07
+        return record
+
+
+COMMON_PAGES = (ManufacturerInfoPage, ProductInfoPage, BatteryStatusPage)
+
+
+def register_profile(device_type, module, toggle=False):
+    """
+    Declares the module registering the pages of a device type, imported
+    the first time a page of that type is looked up.
+    :param toggle: whether the profile flips bit 7 of the page number
+    """
+    _profiles[device_type] = (module, toggle)
+
+
+def register_page(device_type, page_class):
+    """
+    Registers page_class to decode page page_class.number of device_type.
+    """
+    number = page_class.number
+    _pages[(device_type, number)] = page_class
+    if _profiles.get(device_type, (None, False))[1]:
+        _pages[(device_type, number | 0x80)] = page_class
+
+
+def _load(device_type):
+    with _load_lock:
+        if device_type in _loaded:
+            return
+        module, toggle = _profiles.get(device_type, (None, False))
+        if module is not None:
+            importlib.import_module(module)
+        for page_class in COMMON_PAGES:
+            _pages.setdefault((device_type, page_class.number), page_class)
+            if toggle:
+                _pages.setdefault((device_type, page_class.number | 0x80), page_class)
+        _loaded.add(device_type)
+
+
+def lookup(device_type, number):
+    """
+    :return: the DataPage subclass decoding page number of device_type,
+    or None
+    """
+    page_class = _pages.get((device_type, number))
+    if page_class is None and device_type not in _loaded:
+        _load(device_type)
+        page_class = _pages.get((device_type, number))
+    return page_class
+
+
+def decode(device_type, data):
+    """
+    Decodes an 8 byte data page.
+    :return: a DataPage record, or None for pages nothing decodes
+    """
+    page_class = lookup(device_type, data[0])
+    if page_class is None:
+        return None
+    return page_class.unpack(data)
+
+
+class PageDecoder(event.EventCallback, event.CallbackDispatcher):
+    """
+    Decodes the data pages of received broadcast and acknowledged data
+    messages and hands the records to its callbacks as process(msg, page).
+    The device type is taken from device_type when given, else from the
+    extended data of the message, else from the device registry has
+    paired the channel with. Messages of unknown device type or page are
+    counted in ignored.
+    """
+
+    def __init__(self, device_type=None, registry=None):
+        event.CallbackDispatcher.__init__(self)
+        self.device_type = device_type
+        self.registry = registry
+        self.decoded = 0
+        self.ignored = 0
+
+    def process(self, msg):
+        if not isinstance(msg, (message.ChannelBroadcastDataMessage,
+                                message.ChannelAcknowledgedDataMessage)):
+            return
+        device_type = self._device_type(msg)
+        payload = msg.payload
+        page = None
+        if device_type is not None and len(payload) >= 9:
+            page = decode(device_type, payload[1:9])
+        if page is None:
+            self.ignored += 1
+            return
+        self.decoded += 1
+        self._deliver(msg, page)
+
+    def _device_type(self, msg):
+        if self.device_type is not None:
+            return self.device_type
+        if msg.is_extended_message:
+            device_type = msg.get_extended_data().device_type
+            if device_type is not None:
+                # Bit 7 is the pairing bit
+                return device_type & 0x7F
+        if self.registry is not None:
+            device = self.registry.getChannelDevice(msg.get_channel_number())
+            if device is not None:
+                return device.device_type & 0x7F
+        return None
+
+
+register_profile(0x78, 'ant.plus.heartrate', toggle=True)
+register_profile(0x0B, 'ant.plus.power')
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import math
+import struct
+
+from ant.core import event
+from ant.core import message
+from ant.plus import pages
+
+
+BICYCLE_POWER_DEVICE_TYPE = 0x0B
+
+POWER_ONLY_PAGE = 0x10
+WHEEL_TORQUE_PAGE = 0x11
+CRANK_TORQUE_PAGE = 0x12
+
+# Accumulated periods count 1/2048 s, accumulated torque 1/32 Nm
+PERIOD_RATE = 2048.0
+TORQUE_RATE = 32.0
+
+# Wheel circumference in meters used for speed, unless given
+WHEEL_CIRCUMFERENCE = 2.096
+
+
+class PowerOnlyPage(pages.DataPage):
+    __slots__ = fields = ('event_count', 'pedal_power', 'instantaneous_cadence',
+                          'accumulated_power', 'instantaneous_power')
+    number = POWER_ONLY_PAGE
+    layout = struct.Struct('<xBBBHH')
+
+
+class WheelTorquePage(pages.DataPage):
+    """
+    wheel_period counts 1/2048 s, accumulated_torque 1/32 Nm.
+    """
+    __slots__ = fields = ('event_count', 'wheel_ticks', 'instantaneous_cadence',
+                          'wheel_period', 'accumulated_torque')
+    number = WHEEL_TORQUE_PAGE
+    layout = struct.Struct('<xBBBHH')
+
+
+class CrankTorquePage(pages.DataPage):
+    """
+    crank_period counts 1/2048 s, accumulated_torque 1/32 Nm.
+    """
+    __slots__ = fields = ('event_count', 'crank_ticks', 'instantaneous_cadence',
+                          'crank_period', 'accumulated_torque')
+    number = CRANK_TORQUE_PAGE
+    layout = struct.Struct('<xBBBHH')
+
+
+class PowerSample(object):
+    """
+    Averages over the events since the previous sample of the same page.
+    power is in watts, cadence in rpm, torque in Nm and speed in m/s.
+    Fields a page does not carry are None.
+    """
+    __slots__ = ('page', 'event_count', 'events', 'power', 'cadence', 'torque',
+                 'speed', 'instantaneous_power', 'instantaneous_cadence',
+                 'pedal_balance')
+
+    def __init__(self, page, event_count, events):
+        self.page = page
+        self.event_count = event_count
+        self.events = events
+        self.power = None
+        self.cadence = None
+        self.torque = None
+        self.speed = None
+        self.instantaneous_power = None
+        self.instantaneous_cadence = None
+        self.pedal_balance = None
+
+    def __repr__(self):
+        return '<PowerSample page={:02X} power={} cadence={}>'.format(
+            self.page, self.power, self.cadence)
+
+
+class BicyclePowerDecoder(event.EventCallback, event.CallbackDispatcher):
+    """
+    Decodes the standard power-only (0x10), wheel torque (0x11) and crank
+    torque (0x12) pages of an ANT+ bicycle power sensor. Sensors repeat a
+    page until its event count moves on, repeats are skipped, and every
+    new event yields one PowerSample computed from the differences to the
+    previous one, with the 8 and 16 bit counters allowed to roll over.
+    """
+
+    def __init__(self, wheel_circumference=WHEEL_CIRCUMFERENCE):
+        event.CallbackDispatcher.__init__(self)
+        self.wheel_circumference = wheel_circumference
+        # Last page record received per page number
+        self._last = {}
+        self.samples = 0
+
+    def process(self, msg):
+        if not isinstance(msg, message.ChannelBroadcastDataMessage):
+            return
+        payload = msg.payload
+        if len(payload) < 9:
+            return
+
+        page = pages.decode(BICYCLE_POWER_DEVICE_TYPE, payload[1:9])
+        if not isinstance(page, (PowerOnlyPage, WheelTorquePage, CrankTorquePage)):
+            return
+
+        last = self._last.get(page.number)
+        if last is not None and last.event_count == page.event_count:
+            return
+        self._last[page.number] = page
+        if last is None:
+            return
+
+        events = (page.event_count - last.event_count) & 0xFF
+        sample = PowerSample(page.number, page.event_count, events)
+        if page.instantaneous_cadence != 0xFF:
+            sample.instantaneous_cadence = page.instantaneous_cadence
+
+        if isinstance(page, PowerOnlyPage):
+            sample.power = ((page.accumulated_power - last.accumulated_power) & 0xFFFF) / float(events)
+            sample.instantaneous_power = page.instantaneous_power
+            if page.pedal_power != 0xFF:
+                sample.pedal_balance = page.pedal_power & 0x7F
+            sample.cadence = sample.instantaneous_cadence
+        else:
+            if isinstance(page, CrankTorquePage):
+                period = (page.crank_period - last.crank_period) & 0xFFFF
+            else:
+                period = (page.wheel_period - last.wheel_period) & 0xFFFF
+            torque = (page.accumulated_torque - last.accumulated_torque) & 0xFFFF
+            sample.torque = torque / (TORQUE_RATE * events)
+            if period:
+                # Torque times angular velocity, 2 pi per event
+                sample.power = 128 * math.pi * torque / period
+                rate = events * PERIOD_RATE / period
+            else:
+                # Coasting, the period does not move
+                sample.power = 0.0
+                rate = 0.0
+            if isinstance(page, CrankTorquePage):
+                sample.cadence = 60 * rate
+            else:
+                sample.speed = self.wheel_circumference * rate
+                sample.cadence = sample.instantaneous_cadence
+
+        self.samples += 1
+        self._deliver(sample)
+
+
+pages.register_page(BICYCLE_POWER_DEVICE_TYPE, PowerOnlyPage)
+pages.register_page(BICYCLE_POWER_DEVICE_TYPE, WheelTorquePage)
+pages.register_page(BICYCLE_POWER_DEVICE_TYPE, CrankTorquePage)
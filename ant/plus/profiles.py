@@ -21,12 +21,34 @@ class Profile(object):
         self.search_timeout = search_timeout
 
 class BicyclePower(Profile):
-    def __init__(self):
-        super(BicyclePower).__init__(channel_type=0x00,
-                 network_key=NETWORK_KEY,
-                 rf_channel_frequency=57,
-                 transmission_type=0x00,
-                 device_type=0x0B,
-                 device_number=0,
-                 channel_period=8182,
-                 search_timeout=30)
\ No newline at end of file
+    """
+    ANT+ bicycle power sensor, decode its messages with
+    ant.plus.power.BicyclePowerDecoder.
+    """
+    def __init__(self, device_number=0, transmission_type=0x00):
+        Profile.__init__(self,
+                         channel_type=0x00,
+                         network_key=NETWORK_KEY,
+                         rf_channel_frequency=57,
+                         transmission_type=transmission_type,
+                         device_type=0x0B,
+                         device_number=device_number,
+                         channel_period=8182,
+                         search_timeout=30)
+
+
+class HeartRate(Profile):
+    """
+    ANT+ heart rate monitor, decode its messages with
+    ant.plus.heartrate.HeartRateDecoder.
+    """
+    def __init__(self, device_number=0, transmission_type=0x00):
+        Profile.__init__(self,
+                         channel_type=0x00,
+                         network_key=NETWORK_KEY,
+                         rf_channel_frequency=57,
+                         transmission_type=transmission_type,
+                         device_type=0x78,
+                         device_number=device_number,
+                         channel_period=8070,
+                         search_timeout=30)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+"""
+Microbenchmarks for the framing, decode, encode and dispatch hot paths.
+
+Run them with ``python -m bench``; ``--json FILE`` saves the results so two
+releases can be compared with ``--compare OLD.json``.
+"""
+
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+
+# Seconds each case is timed for per repeat
+DEFAULT_DURATION = 0.2
+DEFAULT_REPEAT = 5
+
+FORMAT_VERSION = 1
+
+_cases = []
+
+
+def case(name):
+    """
+    Registers a benchmark case. The decorated function is called once to
+    set up, and returns (run, ops) where run() is the timed callable and
+    ops the number of operations (frames, round trips...) one run performs.
+    It may also return (run, ops, teardown).
+    """
+    def register(setup):
+        _cases.append((name, setup))
+        return setup
+    return register
+
+
+def select(pattern=None):
+    # Importing the module registers its cases
+    import bench.cases
+    return [(name, setup) for name, setup in _cases
+            if pattern is None or pattern in name]
+
+
+def _calibrate(run, duration):
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(number):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration / 10 or number >= 1 << 20:
+            return max(1, int(number * duration / max(elapsed, 1e-9)))
+        number *= 10
+
+
+def _allocations(run, ops):
+    # Peak is what a single run allocates at most at any point, retained
+    # what it leaves behind (caches, queues...)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        blocks = sys.getallocatedblocks()
+        run()
+        blocks = sys.getallocatedblocks() - blocks
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'peak_bytes_per_op': (peak - before) / ops,
+        'retained_bytes_per_op': (current - before) / ops,
+        'retained_blocks_per_op': blocks / ops,
+    }
+
+
+def measure(run, ops, duration=DEFAULT_DURATION, repeat=DEFAULT_REPEAT):
+    """
+    Times run() and returns its statistics, using the best of repeat
+    timings of about duration seconds each.
+    """
+    run()  # warm up caches and lazily created state
+    number = _calibrate(run, duration)
+    timings = []
+    for i in range(repeat):
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for j in range(number):
+                run()
+            timings.append(time.perf_counter() - start)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    total = number * ops
+    best = min(timings)
+    result = {
+        'ops': total,
+        'repeat': repeat,
+        'best_s': best,
+        'median_s': sorted(timings)[len(timings) // 2],
+        'ns_per_op': best * 1e9 / total,
+        'ops_per_s': total / best if best else float('inf'),
+    }
+    result.update(_allocations(run, ops))
+    return result
+
+
+def run(pattern=None, duration=DEFAULT_DURATION, repeat=DEFAULT_REPEAT,
+        out=None):
+    """
+    Runs every case whose name contains pattern and returns the results
+    document.
+    :param out: a file to print progress to, or None for silence
+    """
+    results = {}
+    for name, setup in select(pattern):
+        fixture = setup()
+        try:
+            results[name] = measure(fixture[0], fixture[1], duration, repeat)
+        finally:
+            if len(fixture) > 2:
+                fixture[2]()
+        if out is not None:
+            print(format_result(name, results[name]), file=out)
+
+    return {
+        'version': FORMAT_VERSION,
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def format_result(name, result):
+    return '{:<32} {:>12.0f} ops/s {:>10.1f} ns/op {:>10.1f} B/op peak'.format(
+        name, result['ops_per_s'], result['ns_per_op'],
+        result['peak_bytes_per_op'])
+
+
+def compare(old, new):
+    """
+    Returns (name, old ns/op, new ns/op, ratio) for the cases in both
+    results documents, ratio > 1 meaning new is slower.
+    """
+    rows = []
+    for name, result in sorted(new['results'].items()):
+        previous = old['results'].get(name)
+        if previous is None:
+            continue
+        ratio = result['ns_per_op'] / previous['ns_per_op']
+        rows.append((name, previous['ns_per_op'], result['ns_per_op'], ratio))
+    return rows
+
+
+def save(document, filename):
+    with open(filename, 'w') as fd:
+        json.dump(document, fd, indent=2, sort_keys=True)
+
+
+def load(filename):
+    with open(filename) as fd:
+        return json.load(fd)
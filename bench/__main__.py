@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import argparse
+import sys
+
+import bench
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench',
+                                     description='Benchmarks the python-ant hot paths.')
+    parser.add_argument('-k', dest='pattern', default=None,
+                        help='only run cases whose name contains PATTERN')
+    parser.add_argument('--duration', type=float, default=bench.DEFAULT_DURATION,
+                        help='seconds to time each repeat for')
+    parser.add_argument('--repeat', type=int, default=bench.DEFAULT_REPEAT)
+    parser.add_argument('--json', dest='output', default=None,
+                        help='write the results to OUTPUT as JSON')
+    parser.add_argument('--compare', default=None,
+                        help='compare against results saved with --json')
+    args = parser.parse_args(argv)
+
+    document = bench.run(args.pattern, args.duration, args.repeat, out=sys.stdout)
+    if args.output:
+        bench.save(document, args.output)
+
+    if args.compare:
+        print()
+        for name, old, new, ratio in bench.compare(bench.load(args.compare), document):
+            print('{:<32} {:>10.1f} -> {:>10.1f} ns/op {:>7.2f}x'.format(
+                name, old, new, ratio))
+
+
+if __name__ == '__main__':
+    main()
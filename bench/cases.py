@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import random
+
+from ant.core import burst
+from ant.core import event
+from ant.core import message
+from ant.core import scan
+from ant.core.canned import CannedDriver
+from ant.core.constants import *
+from ant.core.driver import Driver
+from ant.core.message import *
+from ant.plus import pages
+
+from bench import case
+
+
+# Frames in each synthetic stream
+STREAM_FRAMES = 256
+# Bytes per driver read when simulating a fragmented stream
+FRAGMENT_SIZE = 7
+
+FANOUT_CHANNELS = 8
+FANOUT_LISTENERS = 4
+
+ROUND_TRIPS = 32
+
+
+def broadcast_frames(count, channels=1):
+    return [ChannelBroadcastDataMessage(number=i % channels,
+                                        data=bytes([i & 0xFF]) * 8).encode()
+            for i in range(count)]
+
+
+def corrupted_stream(frames, seed=0):
+    """
+    Interleaves frames with line noise, frames with a bad checksum and
+    truncated frames, the way a flaky serial link delivers them.
+    """
+    rng = random.Random(seed)
+    stream = bytearray()
+    for frame in frames:
+        kind = rng.randrange(4)
+        if kind == 1:
+            stream += bytes(rng.randrange(256) for i in range(rng.randrange(1, 6)))
+        elif kind == 2:
+            stream += frame[:-1] + bytes([frame[-1] ^ 0x55])
+        elif kind == 3:
+            stream += frame[:rng.randrange(1, len(frame))]
+        stream += frame
+    return bytes(stream)
+
+
+def fragments(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class StreamDriver(Driver):
+    """
+    Hands out a fixed list of chunks, then stops the event machine so that
+    EventPumper.pump returns.
+    """
+    blocking = True
+
+    def __init__(self, chunks):
+        Driver.__init__(self, 'stream')
+        self.chunks = chunks
+        self.evm = None
+        self._index = 0
+
+    def rewind(self):
+        self._index = 0
+
+    def _open(self):
+        pass
+
+    def _close(self):
+        pass
+
+    def _read(self, count):
+        if self._index == len(self.chunks):
+            self.evm.running = False
+            return b''
+        self._index += 1
+        return self.chunks[self._index - 1]
+
+    def _write(self, data):
+        return len(data)
+
+
+@case('checksum')
+def checksum_case():
+    frame = broadcast_frames(1)[0][:-1]
+    return (lambda: message.checksum(frame)), 1
+
+
+@case('encode.cached')
+def encode_cached_case():
+    msg = ChannelBroadcastDataMessage(number=1, data=b'\x01' * 8)
+    return msg.encode, 1
+
+
+@case('encode.uncached')
+def encode_uncached_case():
+    msgs = [ChannelBroadcastDataMessage(number=1, data=bytes([i]) * 8)
+            for i in range(STREAM_FRAMES)]
+
+    def run():
+        message._encode_cache.clear()
+        for msg in msgs:
+            msg.encode()
+    return run, len(msgs)
+
+
+@case('get_proper_message.verify')
+def decode_case():
+    frames = broadcast_frames(STREAM_FRAMES)
+
+    def run():
+        for frame in frames:
+            get_proper_message(frame)
+    return run, len(frames)
+
+
+@case('get_proper_message.noverify')
+def decode_noverify_case():
+    frames = broadcast_frames(STREAM_FRAMES)
+
+    def run():
+        for frame in frames:
+            get_proper_message(frame, verify=False)
+    return run, len(frames)
+
+
+@case('get_proper_message.extended')
+def decode_extended_case():
+    record = ExtendedData(EXTENDED_FORMAT_FLAGS, device_number=0x1234, device_type=0x78,
+                          transmission_type=0x01, measurement_type=0x20, rssi=-60,
+                          threshold=-90, rx_timestamp=16384)
+    frames = []
+    for msg in (ChannelBroadcastDataMessage(number=0, data=bytes([i]) * 8)
+                for i in range(STREAM_FRAMES)):
+        msg.set_extended(record.flags, record.pack())
+        frames.append(msg.encode())
+
+    def run():
+        for frame in frames:
+            get_proper_message(frame, verify=False).get_extended_data()
+    return run, len(frames)
+
+
+def _process_chunks(chunks):
+    def run():
+        pending = b''
+        for chunk in chunks:
+            pending, messages = event.ProcessBuffer(pending + chunk)
+    return run
+
+
+@case('ProcessBuffer.fragmented')
+def process_fragmented_case():
+    stream = b''.join(broadcast_frames(STREAM_FRAMES))
+    return _process_chunks(fragments(stream, FRAGMENT_SIZE)), STREAM_FRAMES
+
+
+@case('ProcessBuffer.corrupted')
+def process_corrupted_case():
+    stream = corrupted_stream(broadcast_frames(STREAM_FRAMES))
+    return _process_chunks(fragments(stream, event.READ_SIZE)), STREAM_FRAMES
+
+
+@case('EventMachine.fanout')
+def fanout_case(channels=FANOUT_CHANNELS, listeners=FANOUT_LISTENERS):
+    stream = b''.join(broadcast_frames(STREAM_FRAMES, channels))
+    driver = StreamDriver(fragments(stream, event.READ_SIZE))
+    driver.open()
+    evm = event.EventMachine(driver)
+    driver.evm = evm
+
+    class Listener(event.EventCallback):
+        count = 0
+
+        def process(self, msg):
+            self.count += 1
+
+    for i in range(listeners):
+        evm.registerCallback(Listener())
+    for i in range(channels):
+        evm.registerChannel(i, Listener())
+
+    def run():
+        driver.rewind()
+        evm.running = True
+        evm.event_pumper.pump(evm)
+    return run, STREAM_FRAMES, driver.close
+
+
+@case('BurstReassembler')
+def burst_case(size=4096):
+    count = size // 8
+    msgs = [get_proper_message(ChannelBurstDataMessage(
+        number=0, data=bytes([i & 0xFF]) * 8,
+        sequence=(i - 1) % 3 + 1 if i else 0, last=i == count - 1).encode())
+        for i in range(count)]
+    reassembler = burst.BurstReassembler()
+
+    def run():
+        for msg in msgs:
+            reassembler.process(msg)
+    return run, count
+
+
+@case('DeviceTable')
+def device_table_case(devices=128):
+    record = ExtendedData(EXTENDED_FORMAT_FLAG_CHANNEL_ID | EXTENDED_FORMAT_FLAG_RSSI,
+                          device_type=0x78, transmission_type=0x01,
+                          measurement_type=0x20, rssi=-60, threshold=-90)
+    msgs = []
+    for i in range(STREAM_FRAMES):
+        record.device_number = i % devices
+        msg = ChannelBroadcastDataMessage(number=0, data=bytes([i & 0xFF]) * 8)
+        msg.set_extended(record.flags, record.pack())
+        msgs.append(get_proper_message(msg.encode()))
+    table = scan.DeviceTable()
+
+    def run():
+        for msg in msgs:
+            table.process(msg)
+    return run, len(msgs)
+
+
+@case('PageDecoder')
+def page_decoder_case(devices=100):
+    # A scan of heart rate monitors and power meters, a quarter of the
+    # pages common ones
+    msgs = []
+    for i in range(STREAM_FRAMES):
+        number = i % devices
+        device_type = 0x78 if number % 2 else 0x0B
+        if i % 4 == 0:
+            page = pages.BATTERY_STATUS_PAGE
+        else:
+            page = (i & 0x83) if device_type == 0x78 else 0x10
+        record = ExtendedData(EXTENDED_FORMAT_FLAG_CHANNEL_ID, device_number=number,
+                              device_type=device_type, transmission_type=0x01)
+        msg = ChannelBroadcastDataMessage(number=0, data=bytes([page]) + bytes(range(7)))
+        msg.set_extended(record.flags, record.pack())
+        msgs.append(get_proper_message(msg.encode()))
+    decoder = pages.PageDecoder()
+
+    def run():
+        for msg in msgs:
+            decoder.process(msg)
+    return run, len(msgs)
+
+
+@case('encode_burst')
+def encode_burst_case(size=4096):
+    data = bytes(range(256)) * (size // 256)
+    return (lambda: burst.encode_burst(0, data)), size // burst.BURST_PACKET_SIZE
+
+
+@case('EventMachine.waitForAck')
+def wait_for_ack_case():
+    driver = CannedDriver('canned')
+    driver.open()
+    evm = event.EventMachine(driver)
+    evm.start()
+
+    request = ChannelOpenMessage(number=0)
+    response = ChannelEventMessage(number=0, message_id=MESSAGE_CHANNEL_OPEN)
+    driver.responses[request.encode()] = response.encode
+    frame = request.encode()
+
+    def run():
+        for i in range(ROUND_TRIPS):
+            driver.write(frame)
+            evm.waitForAck(request)
+
+    def teardown():
+        evm.stop()
+        driver.close()
+    return run, ROUND_TRIPS, teardown
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+from ant.core.event import EventCallback
+from ant.core.message import *
+
+
+class Recorder(EventCallback):
+    """
+    Keeps what its process() is given, the last argument when several,
+    in received. If release is given, waits for it first.
+    """
+
+    def __init__(self, received=None, release=None):
+        self.received = [] if received is None else received
+        self.release = release
+
+    def process(self, *args):
+        if self.release is not None:
+            self.release.wait(5)
+        self.received.append(args[-1])
+
+
+def extended(device_number, device_type=0x78, transmission_type=0x01,
+             rssi=None, data=b'\x00' * 8, number=0):
+    """
+    A received broadcast data message with the channel ID, and the RSSI
+    if given, in its extended data.
+    """
+    record = ExtendedData(EXTENDED_FORMAT_FLAG_CHANNEL_ID, device_number=device_number,
+                          device_type=device_type, transmission_type=transmission_type)
+    if rssi is not None:
+        record.flags |= EXTENDED_FORMAT_FLAG_RSSI
+        record.measurement_type = EXTENDED_MEASUREMENT_TYPE_RSSI
+        record.rssi = rssi
+        record.threshold = -100
+    msg = ChannelBroadcastDataMessage(number=number, data=data)
+    msg.set_extended(record.flags, record.pack())
+    return get_proper_message(msg.encode())
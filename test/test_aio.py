@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import asyncio
+import os
+import unittest
+
+from ant.core.aio import *
+from ant.core.canned import CannedDriver
+from ant.core.message import *
+
+
+def respond(driver, request, response):
+    driver.responses[request.encode()] = response.encode
+
+
+class AsyncNodeTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.driver = CannedDriver('canned')
+        respond(self.driver, SystemResetMessage(), NotificationStartupMessage())
+        respond(self.driver, ChannelRequestMessage(message_id=MESSAGE_CAPABILITIES),
+                CapabilitiesMessage(max_channels=4, max_nets=2))
+        self.node = AsyncNode(self.driver)
+        await self.node.start()
+
+    async def asyncTearDown(self):
+        await self.node.stop(reset=False)
+
+    async def test_start(self):
+        self.assertEqual(self.node.getCapabilities()[:2], (4, 2))
+
+    async def test_channel(self):
+        channel = self.node.getFreeChannel()
+        channel.number = 2
+        respond(self.driver, ChannelPeriodMessage(number=2, period=8070),
+                ChannelEventMessage(number=2, message_id=MESSAGE_CHANNEL_PERIOD))
+        await channel.setPeriod(8070)
+
+        respond(self.driver, ChannelOpenMessage(number=2),
+                ChannelEventMessage(number=2, message_id=MESSAGE_CHANNEL_OPEN,
+                                    message_code=CHANNEL_IN_WRONG_STATE))
+        with self.assertRaises(ChannelError):
+            await channel.open()
+
+        # Data for the new number reaches the renumbered channel
+        data = ChannelBroadcastDataMessage(number=2, data=b'\x02' * 8)
+        self.node.evm.feed(ChannelBroadcastDataMessage(number=0).encode() + data.encode())
+        messages = channel.__aiter__()
+        msg = await asyncio.wait_for(messages.__anext__(), 1)
+        while isinstance(msg, ChannelEventMessage):
+            msg = await asyncio.wait_for(messages.__anext__(), 1)
+        self.assertEqual(msg.encode(), data.encode())
+        self.assertTrue(self.node.channels[2]._queue.empty())
+
+    async def test_messages(self):
+        channel = self.node.channels[1]
+        data = ChannelBroadcastDataMessage(number=1, data=b'\x01' * 8)
+        self.node.evm.feed(ChannelBroadcastDataMessage(number=0).encode() + data.encode())
+        msg = await asyncio.wait_for(channel.__aiter__().__anext__(), 1)
+        self.assertEqual(msg.encode(), data.encode())
+
+    async def test_timeout(self):
+        with self.assertRaises(EventTimeoutError):
+            await self.node.evm.waitForAck(ChannelCloseMessage(), timeout=0.01)
+
+
+class PipeDriver(CannedDriver):
+    """Serves reads from a pipe so the event loop can watch its fd."""
+
+    def _open(self):
+        self._rfd, self._wfd = os.pipe()
+        os.set_blocking(self._rfd, False)
+
+    def _close(self):
+        os.close(self._rfd)
+        os.close(self._wfd)
+
+    def fileno(self):
+        return self._rfd
+
+    def _read(self, count):
+        try:
+            return os.read(self._rfd, count)
+        except BlockingIOError:
+            return b''
+
+
+class AsyncEventMachineTest(unittest.IsolatedAsyncioTestCase):
+    async def test_add_reader(self):
+        driver = PipeDriver('pipe')
+        driver.open()
+        evm = AsyncEventMachine(driver)
+        await evm.start()
+        self.assertTrue(evm._thread is None)
+
+        response = ChannelEventMessage(message_id=MESSAGE_CHANNEL_OPEN)
+        os.write(driver._wfd, response.encode())
+        code = await evm.waitForAck(ChannelOpenMessage(), timeout=1)
+        self.assertEqual(code, RESPONSE_NO_ERROR)
+
+        await evm.stop()
+        driver.close()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import json
+import os
+import tempfile
+import unittest
+
+import bench
+
+
+class BenchTest(unittest.TestCase):
+    def test_run(self):
+        document = bench.run(duration=0.001, repeat=1)
+        names = [name for name, setup in bench.select()]
+        self.assertEqual(sorted(document['results']), sorted(names))
+        for result in document['results'].values():
+            self.assertTrue(result['ops_per_s'] > 0)
+            self.assertIn('peak_bytes_per_op', result)
+
+        handle, filename = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            bench.save(document, filename)
+            self.assertEqual(bench.load(filename), json.loads(json.dumps(document)))
+        finally:
+            os.remove(filename)
+
+        rows = bench.compare(document, document)
+        self.assertEqual(len(rows), len(names))
+        self.assertTrue(all(ratio == 1.0 for name, old, new, ratio in rows))
+
+    def test_pattern(self):
+        document = bench.run('checksum', duration=0.001, repeat=1)
+        self.assertEqual(list(document['results']), ['checksum'])
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import unittest
+
+from ant.core.burst import *
+from ant.core.message import *
+from test.helpers import Recorder
+
+
+def packets(number, data, size=8):
+    class_ = ChannelBurstDataMessage if size == 8 else AdvancedBurstDataMessage
+    chunks = [data[i:i + size] for i in range(0, len(data), size)]
+    return [class_(number=number, data=chunk, sequence=(i - 1) % 3 + 1 if i else 0,
+                   last=i == len(chunks) - 1)
+            for i, chunk in enumerate(chunks)]
+
+
+class BurstReassemblerTest(unittest.TestCase):
+    def setUp(self):
+        self.reassembler = BurstReassembler(size=16)
+        self.recorder = Recorder()
+        self.reassembler.registerCallback(self.recorder)
+
+    def feed(self, msgs):
+        for msg in msgs:
+            # Decoded like the pump does, so data is a view of the frame
+            self.reassembler.process(get_proper_message(msg.encode()))
+
+    def test_transfer(self):
+        data = bytes(range(200))
+        self.feed(packets(2, data))
+        self.assertEqual(len(self.recorder.received), 1)
+        transfer = self.recorder.received[0]
+        self.assertEqual(transfer.data, data)
+        self.assertEqual(transfer.get_channel_number(), 2)
+        self.assertEqual(transfer.packets, 25)
+        self.assertEqual(self.reassembler.completed, 1)
+
+        # The grown buffer is reused
+        self.feed(packets(2, b'\x07' * 16))
+        self.assertEqual(self.recorder.received[1].data, b'\x07' * 16)
+
+    def test_advanced(self):
+        data = bytes(range(240))
+        self.feed(packets(1, data, 24))
+        self.assertEqual(self.recorder.received[0].data, data)
+        self.assertEqual(self.recorder.received[0].packets, 10)
+
+    def test_interleaved_channels(self):
+        first = packets(0, b'\x01' * 32)
+        second = packets(1, b'\x02' * 24)
+        msgs = []
+        for i in range(4):
+            msgs.extend(first[i:i + 1] + second[i:i + 1])
+        self.feed(msgs)
+        self.assertEqual(sorted((t.number, t.data) for t in self.recorder.received),
+                         [(0, b'\x01' * 32), (1, b'\x02' * 24)])
+
+    def test_sequence_error(self):
+        msgs = packets(0, b'\x01' * 32)
+        del msgs[2]
+        self.feed(msgs)
+        self.assertEqual(self.recorder.received, [])
+        self.assertEqual(self.reassembler.failed, 1)
+
+        self.feed(packets(0, b'\x03' * 8))
+        self.assertEqual(self.recorder.received[0].data, b'\x03' * 8)
+
+    def test_rx_failed(self):
+        msgs = packets(4, b'\x01' * 32)
+        self.feed(msgs[:2])
+        self.reassembler.process(ChannelEventMessage(
+            number=4, message_id=MESSAGE_CHANNEL_EVENT_RF, message_code=EVENT_TRANSFER_RX_FAILED))
+        self.feed(msgs[2:])
+        self.assertEqual(self.recorder.received, [])
+        self.assertEqual(self.reassembler.failed, 1)
+
+
+class EncodeBurstTest(unittest.TestCase):
+    def test_encode(self):
+        for size in (8, 16, 24):
+            data = bytes(range(100))
+            frames, count = encode_burst(3, data, size)
+            self.assertEqual(count, (100 + size - 1) // size)
+            self.assertEqual(len(frames), count * (size + 5))
+
+            msgs = [get_proper_message(frames[i:i + size + 5])
+                    for i in range(0, len(frames), size + 5)]
+            self.assertEqual([msg.getSequenceNumber() for msg in msgs][:5], [0, 1, 2, 3, 1])
+            self.assertEqual([msg.isLastPacket() for msg in msgs],
+                             [False] * (count - 1) + [True])
+            self.assertTrue(all(msg.get_channel_number() == 3 for msg in msgs))
+            received = b''.join(bytes(msg.getData()) for msg in msgs)
+            self.assertEqual(received, data + b'\x00' * (count * size - 100))
+
+        self.assertRaises(ChannelError, encode_burst, 0, data, 12)
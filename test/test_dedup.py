@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import unittest
+
+from ant.core.dedup import *
+from ant.core.message import *
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def data_message(data):
+    return get_proper_message(ChannelBroadcastDataMessage(number=0, data=data).encode())
+
+
+class ChangeFilterTest(unittest.TestCase):
+    def test_changes(self):
+        change_filter = ChangeFilter()
+        payloads = [b'\x01' * 8] * 4 + [b'\x02' * 8] * 4 + [b'\x01' * 8]
+        accepted = [change_filter.accept(data_message(data)) for data in payloads]
+        self.assertEqual(accepted, [True, False, False, False,
+                                    True, False, False, False, True])
+        self.assertEqual((change_filter.passed, change_filter.suppressed), (3, 6))
+        self.assertAlmostEqual(change_filter.ratio, 6 / 9.0)
+
+        # Only broadcast data is filtered
+        msg = get_proper_message(ChannelAcknowledgedDataMessage(number=0).encode())
+        self.assertTrue(change_filter.accept(msg))
+        self.assertTrue(change_filter.accept(msg))
+
+        change_filter.reset()
+        self.assertTrue(change_filter.accept(data_message(b'\x01' * 8)))
+
+    def test_heartbeat(self):
+        clock = Clock()
+        change_filter = ChangeFilter(heartbeat=1.0, clock=clock)
+        accepted = []
+        for i in range(10):
+            clock.now = i * 0.25
+            accepted.append(change_filter.accept(data_message(b'\x01' * 8)))
+        self.assertEqual(accepted, [True, False, False, False, True,
+                                    False, False, False, True, False])
+
+    def test_pages(self):
+        # A rotating profile, pages 1 and 2 alternating with the toggle bit
+        msgs = [data_message(bytes([page | toggle]) + b'\x05' * 7)
+                for toggle in (0x00, 0x80) for i in range(2) for page in (1, 2)]
+        change_filter = ChangeFilter(page_mask=0x7F)
+        self.assertEqual([change_filter.accept(msg) for msg in msgs],
+                         [True, True] + [False] * 6)
+
+        change_filter = ChangeFilter()
+        self.assertEqual(sum(change_filter.accept(msg) for msg in msgs), 8)
@@ -26,5 +26,249 @@
 import unittest
 
 from ant.core.event import *
+from test.helpers import Recorder
 
 #TODO: How exactly do you properly test threaded code?
+
+
+class FrameBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.framer = FrameBuffer(size=16)
+        self.reset = b'\xA4\x01\x4A\x00\xEF'
+        self.caps = b'\xA4\x06\x54\x08\x03\x00\xBA\x36\x00\x71'
+
+    def test_frames(self):
+        self.framer.feed(self.reset + self.caps)
+        frames = [bytes(frame) for frame in self.framer.frames()]
+        self.assertEqual(frames, [self.reset, self.caps])
+        self.assertEqual(len(self.framer), 0)
+
+    def test_fragmented(self):
+        data = self.caps + self.reset
+        frames = []
+        for i in range(len(data)):
+            self.framer.feed(data[i:i + 1])
+            frames.extend(bytes(frame) for frame in self.framer.frames())
+        self.assertEqual(frames, [self.caps, self.reset])
+
+    def test_resync(self):
+        corrupted = self.caps[:-1] + b'\x00'
+        self.framer.feed(b'\x00\x01' + corrupted + self.reset)
+        frames = [bytes(frame) for frame in self.framer.frames()]
+        self.assertEqual(frames, [self.reset])
+        self.assertEqual(self.framer.discarded, 2 + len(corrupted))
+
+    def test_views_survive_renew(self):
+        self.framer.feed(self.caps)
+        frame = next(self.framer.frames())
+        for i in range(10):
+            self.framer.feed(self.reset)
+        self.assertEqual(bytes(frame), self.caps)
+
+
+class ProcessBufferTest(unittest.TestCase):
+    def test_process_buffer(self):
+        data = b'\xA4\x01\x4A\x00\xEF' + b'\xA4\x03\x40'
+        buffer_, messages = ProcessBuffer(data)
+        self.assertEqual(buffer_, b'\xA4\x03\x40')
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(isinstance(messages[0], ant.core.message.SystemResetMessage))
+
+        self.assertEqual(ProcessBuffer(b''), (b'', []))
+        self.assertEqual(ProcessBuffer(b'\xA4\x03'), (b'\xA4\x03', []))
+
+
+class WaitTest(unittest.TestCase):
+    def setUp(self):
+        self.evm = EventMachine(None)
+
+    def _deliver(self, msg, delay=0.05):
+        def deliver():
+            for callback in self.evm.callbacks:
+                callback.process(msg)
+        timer = threading.Timer(delay, deliver)
+        timer.start()
+        return timer
+
+    def test_waitForAck(self):
+        request = ant.core.message.ChannelOpenMessage()
+        response = ant.core.message.ChannelEventMessage(
+            message_id=MESSAGE_CHANNEL_OPEN, message_code=CHANNEL_IN_WRONG_STATE)
+        timer = self._deliver(response)
+        self.assertEqual(self.evm.waitForAck(request, timeout=5),
+                         CHANNEL_IN_WRONG_STATE)
+        timer.join()
+
+    def test_waitForMessage(self):
+        caps = ant.core.message.CapabilitiesMessage(max_channels=8)
+        timer = self._deliver(caps)
+        msg = self.evm.waitForMessage(ant.core.message.Message, timeout=5)
+        self.assertTrue(msg is caps)
+        timer.join()
+
+    def test_timeout(self):
+        self.assertRaises(EventTimeoutError, self.evm.waitForAck,
+                          ant.core.message.ChannelOpenMessage(), timeout=0.01)
+        self.assertRaises(EventTimeoutError, self.evm.waitForMessage,
+                          ant.core.message.CapabilitiesMessage, timeout=0.01)
+
+    def test_queues(self):
+        for i in range(MAX_ACK_QUEUE + 5):
+            for callback in self.evm.callbacks:
+                callback.process(ant.core.message.ChannelEventMessage(
+                    message_id=MESSAGE_CHANNEL_PERIOD, message_code=i))
+        self.assertEqual(len(self.evm.ack[MESSAGE_CHANNEL_PERIOD]), MAX_ACK_QUEUE)
+        self.assertEqual(self.evm.waitForAck(ant.core.message.ChannelPeriodMessage()), 5)
+        msg = self.evm.waitForMessage(ant.core.message.ChannelMessage)
+        self.assertEqual(msg.getMessageCode(), 5)
+
+    def test_per_instance_locks(self):
+        other = EventMachine(None)
+        self.assertFalse(self.evm.ack_lock is other.ack_lock)
+        self.assertFalse(self.evm.callbacks_lock is other.callbacks_lock)
+
+
+class EventPumperTest(unittest.TestCase):
+    def setUp(self):
+        from ant.core.canned import CannedDriver
+        self.driver = CannedDriver('canned')
+        self.driver.open()
+        self.evm = EventMachine(self.driver)
+        self.evm.start()
+
+    def tearDown(self):
+        self.evm.stop()
+        self.driver.close()
+
+    def test_round_trip(self):
+        request = ant.core.message.ChannelOpenMessage(number=1)
+        response = ant.core.message.ChannelEventMessage(
+            number=1, message_id=MESSAGE_CHANNEL_OPEN)
+        self.driver.responses[request.encode()] = response.encode
+
+        start = time.monotonic()
+        self.driver.write(request.encode())
+        self.assertEqual(self.evm.waitForAck(request, timeout=5), RESPONSE_NO_ERROR)
+        # The pump is blocked in read() rather than sleeping, so the
+        # response is picked up long before the read timeout expires
+        self.assertTrue(time.monotonic() - start < 0.5)
+        self.assertEqual(self.evm.event_pumper.bytes_read, len(response.encode()))
+
+
+class CallbackDispatcherTest(unittest.TestCase):
+    def test_deliver(self):
+        class Failing(EventCallback):
+            def process(self, msg):
+                raise ValueError(msg)
+
+        dispatcher = CallbackDispatcher()
+        recorder = Recorder()
+        for callback in (Failing(), recorder, recorder):
+            dispatcher.registerCallback(callback)
+        dispatcher._deliver('first')
+        dispatcher.removeCallback(recorder)
+        dispatcher._deliver('second')
+        self.assertEqual(recorder.received, ['first'])
+
+
+class CallbackExecutorTest(unittest.TestCase):
+    def test_order(self):
+        executor = CallbackExecutor(shards=3)
+        recorders = [Recorder() for i in range(3)]
+        executor.start()
+        for i in range(300):
+            executor.submit(i % 3, (i % 3, i), (recorders[i % 3],))
+        executor.stop()
+
+        for key, recorder in enumerate(recorders):
+            self.assertEqual(recorder.received, [(key, i) for i in range(key, 300, 3)])
+        stats = executor.stats()
+        self.assertEqual([shard['processed'] for shard in stats], [100] * 3)
+        self.assertTrue(all(shard['depth'] == 0 for shard in stats))
+
+    def test_drop(self):
+        for overflow, expected in ((OVERFLOW_DROP_OLDEST, [1, 2]),
+                                   (OVERFLOW_DROP_NEWEST, [0, 1])):
+            executor = CallbackExecutor(shards=1, queue_size=2, overflow=overflow)
+            recorder = Recorder()
+            results = [executor.submit(None, i, (recorder,)) for i in range(3)]
+            self.assertEqual(results, [True, True, False])
+
+            executor.start()
+            executor.stop()
+            self.assertEqual(recorder.received, expected)
+            stats = executor.stats()[0]
+            self.assertEqual((stats['submitted'], stats['dropped'], stats['max_depth']),
+                             (3, 1, 2))
+
+    def test_block(self):
+        executor = CallbackExecutor(shards=1, queue_size=1)
+        release = threading.Event()
+        recorder = Recorder(release=release)
+        executor.start()
+        executor.submit(None, 0, (recorder,))  # picked up, then blocks
+        for i in range(100):
+            if not executor.stats()[0]['depth']:
+                break
+            time.sleep(0.01)
+        executor.submit(None, 1, (recorder,))  # fills the queue
+
+        submitter = threading.Thread(target=executor.submit, args=(None, 2, (recorder,)))
+        submitter.start()
+        submitter.join(0.1)
+        self.assertTrue(submitter.is_alive())
+
+        release.set()
+        submitter.join(5)
+        self.assertFalse(submitter.is_alive())
+        executor.stop()
+        self.assertEqual(recorder.received, [0, 1, 2])
+        self.assertEqual(executor.stats()[0]['dropped'], 0)
+
+    def test_errors(self):
+        class Failing(EventCallback):
+            def process(self, msg):
+                raise ValueError(msg)
+
+        executor = CallbackExecutor(shards=1)
+        recorder = Recorder()
+        executor.start()
+        logging.disable(logging.CRITICAL)
+        try:
+            executor.submit(None, 0, (Failing(), recorder))
+            executor.stop()
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertEqual(recorder.received, [0])
+        self.assertEqual(executor.stats()[0]['errors'], 1)
+
+    def test_invalid(self):
+        self.assertRaises(EventError, CallbackExecutor, overflow='ignore')
+        self.assertRaises(EventError, CallbackExecutor, shards=0)
+
+    def test_slow_listener(self):
+        from ant.core.canned import CannedDriver
+        driver = CannedDriver('canned')
+        driver.open()
+        executor = CallbackExecutor(overflow=OVERFLOW_DROP_OLDEST)
+        evm = EventMachine(driver, executor)
+        release = threading.Event()
+        listener = Recorder(release=release)
+        evm.registerCallback(listener)
+        evm.start()
+
+        request = ant.core.message.ChannelOpenMessage(number=1)
+        response = ant.core.message.ChannelEventMessage(
+            number=1, message_id=MESSAGE_CHANNEL_OPEN)
+        driver.responses[request.encode()] = response.encode
+        try:
+            for i in range(3):
+                driver.write(request.encode())
+                # Answered while the listener is still stuck on the first one
+                self.assertEqual(evm.waitForAck(request, timeout=1), RESPONSE_NO_ERROR)
+            self.assertEqual(listener.received, [])
+        finally:
+            release.set()
+            evm.stop()
+            driver.close()
+        self.assertEqual(len(listener.received), 3)
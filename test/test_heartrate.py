@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import unittest
+
+from ant.core.message import *
+from ant.plus.heartrate import *
+from test.helpers import Recorder
+
+
+def hrm_message(page, toggle, beat_time, beat_count, heart_rate, extra=b'\xFF\xFF\xFF'):
+    data = bytes([page | (0x80 if toggle else 0x00)]) + extra + \
+        struct.pack('<HBB', beat_time & 0xFFFF, beat_count & 0xFF, heart_rate)
+    return get_proper_message(ChannelBroadcastDataMessage(number=0, data=data).encode())
+
+
+def monitor(beats, interval=0.8, start_time=0xFF00, start_count=250, paged=True, every=1):
+    """
+    Messages from a monitor repeating each beat three times, only every
+    every-th beat reaching the receiver.
+    """
+    msgs = []
+    ticks = int(interval * 1024)
+    index = 0
+    for beat in range(1, beats + 1):
+        beat_time = start_time + beat * ticks
+        if beat % every == 0:
+            for repeat in range(3):
+                extra = b'\xFF' + struct.pack('<H', (beat_time - ticks) & 0xFFFF)
+                if paged:
+                    msgs.append(hrm_message(4, (index // 4) % 2, beat_time,
+                                            start_count + beat, 75, extra))
+                else:
+                    msgs.append(hrm_message(0x55, 0, beat_time, start_count + beat, 75))
+                index += 1
+    return msgs
+
+
+class HeartRateDecoderTest(unittest.TestCase):
+    def setUp(self):
+        self.decoder = HeartRateDecoder()
+        self.recorder = Recorder()
+        self.decoder.registerCallback(self.recorder)
+
+    def feed(self, msgs):
+        for msg in msgs:
+            self.decoder.process(msg)
+        return self.recorder.received
+
+    def test_one_sample_per_beat(self):
+        samples = self.feed(monitor(20))
+        self.assertEqual(len(samples), 20)
+        self.assertEqual([sample.beat_count for sample in samples][4:7], [255, 0, 1])
+        # Page 4 is trusted once the toggle bit flipped
+        self.assertTrue(self.decoder.paged)
+        for sample in samples[2:]:
+            self.assertAlmostEqual(sample.rr_interval, 0.8, places=2)
+        self.assertEqual(samples[-1].heart_rate, 75)
+
+    def test_gaps(self):
+        samples = self.feed(monitor(20, every=2))
+        self.assertEqual(len(samples), 10)
+        # The previous beat time of page 4 still gives the right interval
+        for sample in samples[2:]:
+            self.assertAlmostEqual(sample.rr_interval, 0.8, places=2)
+        self.assertEqual(self.decoder.missed_beats, 9)
+
+    def test_legacy(self):
+        samples = self.feed(monitor(10, paged=False))
+        self.assertFalse(self.decoder.paged)
+        self.assertEqual(len(samples), 10)
+        self.assertEqual(samples[0].rr_interval, None)
+        for sample in samples[1:]:
+            self.assertAlmostEqual(sample.rr_interval, 0.8, places=2)
+
+        decoder = HeartRateDecoder()
+        for msg in monitor(10, paged=False, every=2):
+            decoder.process(msg)
+        self.assertEqual(decoder.missed_beats, 4)
+
+    def test_background_pages(self):
+        self.feed([hrm_message(0, False, 0, 0, 60), hrm_message(0, True, 0, 0, 60),
+                   hrm_message(1, False, 0, 0, 60, b'\x10\x00\x01'),
+                   hrm_message(2, True, 0, 0, 60, b'\x07\x39\x30'),
+                   hrm_message(3, False, 0, 0, 60, b'\x01\x02\x03')])
+        self.assertEqual(self.decoder.operating_time, 0x010010 * 2)
+        self.assertEqual((self.decoder.manufacturer_id, self.decoder.serial_number),
+                         (7, 12345))
+        self.assertEqual((self.decoder.hardware_version, self.decoder.software_version,
+                          self.decoder.model_number), (1, 2, 3))
+        self.assertEqual(len(self.recorder.received), 1)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import os
+import tempfile
+import threading
+import unittest
+
+from ant.core import log
+from ant.core.log import *
+
+
+class LogTestCase(unittest.TestCase):
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.ant')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+
+class LogReaderTest(LogTestCase):
+    def setUp(self):
+        LogTestCase.setUp(self)
+        lw = LogWriter(self.filename)
+        lw.logOpen()
+        lw.logRead(b'\x01')
+        lw.logRead(b'')
+        lw.logWrite(b'\x00')
+        lw.logRead(b'TEST')
+        lw.logClose()
+        lw.close()
+
+        self.log = LogReader(self.filename)
+
+    def tearDown(self):
+        self.log.close()
+        LogTestCase.tearDown(self)
+
+    def test_open_close(self):
+        self.assertTrue(self.log.is_open)
+        self.log.close()
+        self.assertFalse(self.log.is_open)
+        self.log.open(self.filename)
+        self.assertTrue(self.log.is_open)
+
+    def test_read(self):
+        records = list(self.log)
+        self.assertEqual([(event, data) for event, timestamp, data in records],
+                         [(EVENT_OPEN, b''), (EVENT_READ, b'\x01'),
+                          (EVENT_WRITE, b'\x00'), (EVENT_READ, b'TEST'),
+                          (EVENT_CLOSE, b'')])
+        timestamps = [timestamp for event, timestamp, data in records]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertTrue(timestamps[0] >= self.log.start)
+        self.assertEqual(self.log.read(), None)
+
+    def test_large_record(self):
+        # Longer than a 16 bit length could hold, e.g. a whole burst transfer
+        data = bytes(range(256)) * 300
+        lw = LogWriter(self.filename)
+        lw.logWrite(data)
+        lw.close()
+        self.log.open(self.filename)
+        self.assertEqual([(event, payload) for event, timestamp, payload in self.log],
+                         [(EVENT_WRITE, data)])
+
+    def test_unknown_format(self):
+        with open(self.filename, 'wb') as fd:
+            fd.write(b'ANT-LOG\n')
+        self.assertRaises(IOError, LogReader, self.filename)
+
+
+class LogSeekTest(LogTestCase):
+    def setUp(self):
+        LogTestCase.setUp(self)
+        self.interval = log.INDEX_INTERVAL
+        log.INDEX_INTERVAL = 64
+
+    def tearDown(self):
+        log.INDEX_INTERVAL = self.interval
+        LogTestCase.tearDown(self)
+
+    def _write(self, close=True):
+        lw = LogWriter(self.filename)
+        for i in range(200):
+            lw.logRead(bytes([i]) * 8)
+        if close:
+            lw.close()
+        else:
+            # Simulate a crash, the trailer never gets written
+            lw.writer.stop()
+            lw.fd.close()
+            lw.is_open = False
+        return lw
+
+    def _check_seek(self):
+        reader = LogReader(self.filename)
+        records = list(reader)
+        self.assertEqual(len(records), 200)
+        for i in (0, 57, 199):
+            reader.seek(records[i][1])
+            self.assertEqual(reader.read()[1], records[i][1])
+        reader.seek(records[-1][1] + 1)
+        self.assertEqual(reader.read(), None)
+        return reader
+
+    def test_seek_indexed(self):
+        self._write()
+        reader = self._check_seek()
+        self.assertTrue(len(reader.index) > 1)
+        reader.close()
+
+    def test_seek_unindexed(self):
+        self._write(close=False)
+        reader = self._check_seek()
+        self.assertEqual(reader.index, [])
+        reader.close()
+
+
+class LogThreadTest(unittest.TestCase):
+    def test_batches_and_drops(self):
+        written = []
+        flushes = []
+        blocker = threading.Event()
+
+        def write(*record):
+            blocker.wait()
+            written.append(record)
+
+        writer = LogThread(write, lambda: flushes.append(len(written)),
+                           max_queue=4, batch_size=2, interval=10)
+        for i in range(6):
+            writer.put((EVENT_READ, i, b'\x00'))
+        blocker.set()
+        writer.flush()
+        self.assertTrue(writer.dropped >= 1)
+        self.assertEqual(len(written) + writer.dropped, 6)
+        self.assertEqual(flushes[-1], len(written))
+        writer.stop()
+
+
+class DriverLogTest(LogTestCase):
+    def test_close_drains(self):
+        from ant.core.driver import Driver
+
+        class DummyDriver(Driver):
+            def _open(self):
+                pass
+
+            def _close(self):
+                pass
+
+            def _read(self, count):
+                return b'\xA4' * count
+
+        lw = LogWriter(self.filename)
+        driver = DummyDriver('dummy', log=lw)
+        driver.open()
+        driver.read(3)
+        driver.close()
+
+        reader = LogReader(self.filename)
+        events = [(event, data) for event, timestamp, data in reader]
+        self.assertEqual(events, [(EVENT_OPEN, b''), (EVENT_READ, b'\xA4' * 3),
+                                  (EVENT_CLOSE, b'')])
+        reader.close()
+        lw.close()
@@ -36,6 +36,20 @@ def test_checksum():
     # data = [0xFF, 0x]. .
 
 
+def test_checksums():
+    frames = [b'\xA4\x01\x4A\x00', b'\xA4\x03\x42\x00\x00\x00', b'']
+    assert checksums(frames) == b'\xEF\xE5\x00'
+
+
+def test_encode_cache():
+    msg = ChannelPeriodMessage(number=1, period=8070)
+    raw = msg.encode()
+    assert msg.encode() is raw
+    assert ChannelPeriodMessage(number=1, period=8070).encode() is raw
+    msg.setChannelPeriod(4096)
+    assert msg.encode() == b'\xA4\x03\x43\x01\x00\x10\xF5'
+
+
 
 class MessageTest(unittest.TestCase):
     def setUp(self):
@@ -94,6 +108,55 @@ class MessageTest(unittest.TestCase):
                           b'\xA4\x05\x42\x00\x00\x00\x00')
 
 
+class LazyMessageTest(unittest.TestCase):
+    def setUp(self):
+        self.raw = bytearray(ChannelIDMessage(number=2, device_number=0x1234,
+                                              device_type=0x78).encode())
+        self.message = get_proper_message(memoryview(self.raw))
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.message, '__dict__'))
+
+    def test_getters(self):
+        self.assertEqual(self.message.get_channel_number(), 2)
+        self.assertEqual(self.message.getDeviceNumber(), 0x1234)
+        self.assertEqual(self.message.getDeviceType(), 0x78)
+
+    def test_setters_copy(self):
+        self.message.setDeviceType(0x0B)
+        self.assertEqual(self.message.getDeviceType(), 0x0B)
+        self.assertEqual(self.raw[6], 0x78)
+        self.assertEqual(self.message.encode(),
+                         ChannelIDMessage(number=2, device_number=0x1234,
+                                          device_type=0x0B).encode())
+
+
+class MessageRegistryTest(unittest.TestCase):
+    def tearDown(self):
+        unregister_message(MESSAGE_SERIAL_ERROR)
+
+    def test_builtin_messages(self):
+        self.assertTrue(get_message_class(MESSAGE_CHANNEL_EVENT) is ChannelEventMessage)
+        self.assertTrue(get_message_class(MESSAGE_CHANNEL_BROADCAST_DATA) is
+                        ChannelBroadcastDataMessage)
+        self.assertTrue(get_message_class(MESSAGE_SERIAL_ERROR) is None)
+
+    def test_register_message(self):
+        @register_message(MESSAGE_SERIAL_ERROR)
+        class SerialErrorMessage(Message):
+            def __init__(self):
+                Message.__init__(self, msg_id=MESSAGE_SERIAL_ERROR)
+
+        raw = Message(msg_id=MESSAGE_SERIAL_ERROR, payload=b'\x02').encode()
+        msg = get_proper_message(raw)
+        self.assertTrue(isinstance(msg, SerialErrorMessage))
+        self.assertEqual(msg.get_payload(), b'\x02')
+
+        unregister_message(MESSAGE_SERIAL_ERROR)
+        self.assertRaises(MessageError, get_proper_message, raw)
+        self.assertRaises(MessageError, register_message, 0x100, Message)
+
+
 class ChannelMessageTest(unittest.TestCase):
     def setUp(self):
         self.message = ChannelMessage(msg_id=MESSAGE_SYSTEM_RESET)
@@ -285,8 +348,124 @@ class ChannelAcknowledgedDataMessageTest(unittest.TestCase):
 
 
 class ChannelBurstDataMessageTest(unittest.TestCase):
-    # No currently defined methods need testing
-    pass
+    def setUp(self):
+        self.message = ChannelBurstDataMessage(number=3, data=b'\x01' * 8)
+
+    def test_get_setSequenceNumber(self):
+        self.assertEqual(self.message.getSequenceNumber(), 0)
+        self.assertFalse(self.message.isLastPacket())
+        self.message.setSequenceNumber(2, last=True)
+        self.assertEqual(self.message.getSequenceNumber(), 2)
+        self.assertTrue(self.message.isLastPacket())
+        self.assertEqual(self.message.get_channel_number(), 3)
+        self.assertEqual(self.message.encode()[3], 0xC3)
+        self.assertRaises(MessageError, self.message.setSequenceNumber, 4)
+
+    def test_decode(self):
+        msg = get_proper_message(ChannelBurstDataMessage(
+            number=5, data=b'\x02' * 8, sequence=1).encode())
+        self.assertEqual(msg.get_channel_number(), 5)
+        self.assertEqual(msg.getSequenceNumber(), 1)
+        self.assertEqual(bytes(msg.getData()), b'\x02' * 8)
+        self.assertRaises(MessageError, msg.setChannelNumber, 0x20)
+
+
+class AdvancedBurstDataMessageTest(unittest.TestCase):
+    def test_decode(self):
+        raw = AdvancedBurstDataMessage(number=2, data=bytes(range(24)), sequence=3,
+                                       last=True).encode()
+        self.assertEqual(raw[1], 25)
+        msg = get_proper_message(raw)
+        self.assertIsInstance(msg, AdvancedBurstDataMessage)
+        self.assertEqual(msg.get_channel_number(), 2)
+        self.assertEqual(msg.getSequenceNumber(), 3)
+        self.assertTrue(msg.isLastPacket())
+        self.assertEqual(bytes(msg.getData()), bytes(range(24)))
+
+        self.assertRaises(MessageError, AdvancedBurstDataMessage, data=b'\x00' * 25)
+        self.assertRaises(MessageError, ChannelBurstDataMessage, data=b'\x00' * 9)
+
+
+class ExtendedDataTest(unittest.TestCase):
+    def setUp(self):
+        self.record = ExtendedData(EXTENDED_FORMAT_FLAGS, device_number=0x1234,
+                                   device_type=0x78, transmission_type=0x01,
+                                   measurement_type=EXTENDED_MEASUREMENT_TYPE_RSSI,
+                                   rssi=-60, threshold=-90, rx_timestamp=16384)
+
+    def test_decode(self):
+        msg = ChannelBroadcastDataMessage(number=1, data=b'\x01' * 8)
+        msg.set_extended(EXTENDED_FORMAT_FLAGS, self.record.pack())
+        raw = msg.encode()
+        self.assertEqual(raw[1], MAX_EXTENDED_PAYLOAD)
+        self.assertEqual(raw[12:17], b'\xE0\x34\x12\x78\x01')
+
+        msg = get_proper_message(raw)
+        self.assertTrue(msg.is_extended_message)
+        self.assertEqual(msg.get_channel_number(), 1)
+        self.assertEqual(bytes(msg.get_payload()), b'\x01' * 9)
+        self.assertEqual(msg.get_extended_data(), self.record)
+        self.assertEqual(msg.get_extended_data().rx_time, 0.5)
+        self.assertEqual(msg.get_device_number(), 0x1234)
+        self.assertEqual(msg.get_size(), len(raw))
+        self.assertEqual(msg.encode(), raw)
+
+        self.assertEqual(bytes(msg.payload), b'\x01' * 9)
+        self.assertEqual(bytes(msg.extended_data_bytes), self.record.pack())
+        self.assertTrue(get_proper_message(raw).payload.readonly)
+
+    def test_partial(self):
+        record = ExtendedData(EXTENDED_FORMAT_FLAG_TIMESTAMP, rx_timestamp=0xBEEF)
+        msg = ChannelAcknowledgedDataMessage(number=2, data=b'\x02' * 8)
+        msg.set_extended(record.flags, record.pack())
+        msg = get_proper_message(msg.encode())
+        self.assertEqual(msg.get_extended_data(), record)
+        self.assertEqual(msg.get_extended_data().device_number, None)
+        self.assertRaises(MessageError, msg.get_device_number)
+
+        # Flags announcing more than the stick sent
+        raw = bytearray(msg.encode()[:-1])
+        raw[12] = EXTENDED_FORMAT_FLAG_CHANNEL_ID
+        raw.append(checksum(raw))
+        self.assertRaises(MessageError, get_proper_message(raw).get_extended_data)
+
+    def test_not_extended(self):
+        msg = get_proper_message(ChannelBroadcastDataMessage().encode())
+        self.assertFalse(msg.is_extended_message)
+        self.assertEqual(msg.extended_data_bytes, b'')
+        self.assertRaises(MessageError, msg.get_extended_data)
+        self.assertRaises(MessageError, ChannelEventMessage().set_extended,
+                          EXTENDED_FORMAT_FLAG_TIMESTAMP, b'\x00\x00')
+        self.assertRaises(MessageError, ChannelBroadcastDataMessage(data=b'\x00' * 8).set_extended,
+                          EXTENDED_FORMAT_FLAG_CHANNEL_ID, b'\x00\x00')
+        # Short payloads would put the flag byte in the wrong place
+        self.assertRaises(MessageError, ChannelBroadcastDataMessage(data=b'\x00' * 7).set_extended,
+                          EXTENDED_FORMAT_FLAG_TIMESTAMP, b'\x00\x00')
+
+        raw = bytearray(b'\xA4\x0C\x40' + b'\x00' * 12)
+        raw.append(checksum(raw))
+        self.assertRaises(MessageError, get_proper_message, raw)
+
+    def test_lib_config(self):
+        msg = LibConfigMessage(EXTENDED_FORMAT_FLAG_CHANNEL_ID | EXTENDED_FORMAT_FLAG_RSSI)
+        self.assertEqual(msg.encode()[3:5], b'\x00\xC0')
+        self.assertRaises(MessageError, msg.setFlags, 0x01)
+
+
+class ConfigureAdvancedBurstMessageTest(unittest.TestCase):
+    def test_fields(self):
+        msg = ConfigureAdvancedBurstMessage(
+            max_packet_length=ADVANCED_BURST_MAX_PACKET_16_BYTES,
+            optional_features=0x010203)
+        self.assertEqual(msg.encode()[3:12],
+                         b'\x00\x01\x02\x00\x00\x00\x03\x02\x01')
+        msg = get_proper_message(msg.encode())
+        self.assertTrue(msg.isEnabled())
+        self.assertEqual(msg.getMaxPacketLength(), ADVANCED_BURST_MAX_PACKET_16_BYTES)
+        self.assertEqual(msg.getRequiredFeatures(), 0)
+        self.assertEqual(msg.getOptionalFeatures(), 0x010203)
+        self.assertRaises(MessageError, msg.setMaxPacketLength, 0x04)
+        self.assertRaises(MessageError, msg.setRequiredFeatures, 0x1000000)
 
 
 class ChannelEventMessageTest(unittest.TestCase):
@@ -28,7 +28,299 @@ import unittest
 from ant.core.node import *
 from ant.core.message import *
 
+from ant.core.canned import CannedDriver
+from ant.core import dedup
 from ant.plus import NETWORK_KEY
+from test.helpers import Recorder
+
+
+def canned_stick(max_channels, max_nets=1):
+    driver = CannedDriver('canned')
+    caps_request = ChannelRequestMessage(message_id=MESSAGE_CAPABILITIES)
+    caps = CapabilitiesMessage(max_channels=max_channels, max_nets=max_nets)
+    driver.responses[caps_request.encode()] = caps.encode
+    return driver
+
+
+class NodePoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = NodePool([canned_stick(2), canned_stick(3)])
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.stop(reset=False)
+
+    def test_pool(self):
+        self.assertEqual(self.pool.getCapabilities()[0], 5)
+        self.assertEqual(len(self.pool.channels), 5)
+
+        nodes = []
+        for i in range(5):
+            channel = self.pool.getFreeChannel()
+            channel.is_free = False
+            nodes.append(self.pool.nodes.index(channel.node))
+        self.assertEqual(sorted(nodes), [0, 0, 1, 1, 1])
+        self.assertEqual(nodes[0], 1)
+        self.assertRaises(NodeError, self.pool.getFreeChannel)
+
+        received = []
+
+        class Listener(event.EventCallback):
+            def process(self, msg):
+                received.append(msg)
+
+        self.pool.registerEventListener(Listener())
+        for node in self.pool.nodes:
+            node.respond_with(ChannelBroadcastDataMessage())
+        for i in range(100):
+            if len(received) == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(received), 2)
+
+    def test_failed_start(self):
+        class UnpluggedDriver(CannedDriver):
+            def _open(self):
+                raise DriverError('Could not open device (unplugged).')
+
+        pool = NodePool([canned_stick(2), UnpluggedDriver('unplugged')])
+        self.assertRaises(NodeError, pool.start)
+        self.assertEqual([node.running for node in pool.nodes], [False, False])
+        self.assertFalse(pool.nodes[0].driver.isOpen())
+
+
+class ChannelRoutingTest(unittest.TestCase):
+    def setUp(self):
+        self.driver = CannedDriver('canned')
+        self.driver.open()
+        self.node = Node(self.driver)
+        self.channels = [Channel(self.node, i) for i in range(3)]
+        self.received = dict((i, []) for i in range(3))
+        self.seen = []
+
+        for channel in self.channels:
+            channel.registerCallback(Recorder(self.received[channel.number]))
+        self.node.registerEventListener(Recorder(self.seen))
+        self.node.evm.start()
+
+    def tearDown(self):
+        self.node.evm.stop()
+        self.driver.close()
+
+    def _deliver(self, *numbers):
+        expected = len(self.seen) + len(numbers)
+        for number in numbers:
+            self.node.respond_with(ChannelBroadcastDataMessage(number=number))
+        for i in range(100):
+            if len(self.seen) == expected:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(self.seen), expected)
+
+    def test_routing(self):
+        self.assertEqual(self.node.evm.channels,
+                         dict((i, self.channels[i]) for i in range(3)))
+        self._deliver(1, 2, 2)
+        self.assertEqual([len(self.received[i]) for i in range(3)], [0, 1, 2])
+        self.assertTrue(all(msg.get_channel_number() == 2
+                            for msg in self.received[2]))
+
+    def test_change_filter(self):
+        change_filter = dedup.ChangeFilter()
+        self.channels[2].setChangeFilter(change_filter)
+        self._deliver(2, 2, 1, 2)
+        self.assertEqual([len(self.received[i]) for i in range(3)], [0, 1, 1])
+        self.assertEqual((change_filter.passed, change_filter.suppressed), (1, 2))
+
+        self.channels[2].setChangeFilter(None)
+        self._deliver(2)
+        self.assertEqual(len(self.received[2]), 2)
+
+    def test_renumber(self):
+        self.channels[0].number = 5
+        self.assertNotIn(0, self.node.evm.channels)
+        self.assertIs(self.node.evm.channels[5], self.channels[0])
+        self._deliver(0, 5)
+        self.assertEqual(len(self.received[0]), 1)
+        self.assertEqual(self.received[0][0].get_channel_number(), 5)
+
+        # A replaced channel does not unroute its successor
+        replacement = Channel(self.node, 1)
+        del self.channels[1]
+        self.assertIs(self.node.evm.channels[1], replacement)
+
+    def test_burst(self):
+        transfers = []
+        self.channels[2].registerBurstCallback(Recorder(transfers))
+        for sequence, last in ((0, False), (1, False), (2, True)):
+            self.node.respond_with(ChannelBurstDataMessage(
+                number=2, data=bytes([sequence]) * 8, sequence=sequence, last=last))
+        for i in range(100):
+            if transfers:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(transfers), 1)
+        self.assertEqual(transfers[0].data, b'\x00' * 8 + b'\x01' * 8 + b'\x02' * 8)
+        self.assertEqual(len(self.received[2]), 3)
+
+class ChunkedDriver(CannedDriver):
+    """
+    Takes at most max_write bytes per write and answers each complete
+    transfer with the next of outcomes.
+    """
+    max_write = 20
+
+    def __init__(self, transfer_size, outcomes):
+        CannedDriver.__init__(self, 'chunked')
+        self.transfer_size = transfer_size
+        self.outcomes = outcomes
+        self.written = b''
+        self.writes = 0
+
+    def _write(self, data):
+        data = bytes(data[:self.max_write])
+        self.writes += 1
+        self.written += data
+        if len(self.written) % self.transfer_size == 0:
+            self._next_read_buffer = b''.join(
+                ChannelEventMessage(number=1, message_id=MESSAGE_CHANNEL_EVENT_RF,
+                                    message_code=code).encode()
+                for code in self.outcomes.pop(0))
+            self._readable.set()
+        return len(data)
+
+
+class SendBurstTest(unittest.TestCase):
+    def start(self, data, outcomes):
+        frames, packets = burst.encode_burst(1, data)
+        self.frames = frames
+        self.driver = ChunkedDriver(len(frames), outcomes)
+        self.driver.open()
+        self.node = Node(self.driver)
+        self.channel = Channel(self.node, 1)
+        self.node.evm.start()
+
+    def tearDown(self):
+        self.node.evm.stop()
+        self.driver.close()
+
+    def test_send(self):
+        data = bytes(range(100))
+        self.start(data, [(EVENT_TRANSFER_TX_START, EVENT_TRANSFER_TX_COMPLETED)])
+        report = self.channel.send_burst(data, timeout=5)
+        self.assertEqual(self.driver.written, self.frames)
+        self.assertEqual(self.driver.writes, (len(self.frames) + 19) // 20)
+        self.assertEqual((report.size, report.packets, report.attempts), (100, 13, 1))
+        self.assertTrue(report.throughput > 0)
+        self.assertEqual(self.channel.cb, [])
+
+    def test_retry(self):
+        self.start(b'\x01' * 16, [(EVENT_TRANSFER_TX_START, EVENT_TRANSFER_TX_FAILED),
+                                  (EVENT_TRANSFER_TX_START, EVENT_TRANSFER_TX_COMPLETED)])
+        report = self.channel.send_burst(b'\x01' * 16, timeout=5)
+        self.assertEqual(report.attempts, 2)
+        self.assertEqual(self.driver.written, self.frames * 2)
+
+    def test_failed(self):
+        self.start(b'\x01' * 16, [(EVENT_TRANSFER_TX_FAILED,)] * 2)
+        self.assertRaises(ChannelError, self.channel.send_burst, b'\x01' * 16,
+                          retries=1, timeout=5)
+        self.assertEqual(self.driver.written, self.frames * 2)
+
+
+class NodeFeaturesTest(unittest.TestCase):
+    def setUp(self):
+        self.driver = CannedDriver('canned')
+        self.driver.open()
+        self.node = Node(self.driver)
+        self.node.evm.start()
+
+    def tearDown(self):
+        self.node.evm.stop()
+        self.driver.close()
+
+    def respond(self, code):
+        request = ConfigureAdvancedBurstMessage(
+            max_packet_length=ADVANCED_BURST_MAX_PACKET_24_BYTES)
+        response = ChannelEventMessage(message_id=MESSAGE_CONFIGURE_ADVANCED_BURST,
+                                       message_code=code)
+        self.driver.responses[request.encode()] = response.encode
+
+    def test_capable(self):
+        self.node.options = (0x00, 0x00, 0x00, CAPABILITIES_ADVANCED_BURST_ENABLED)
+        self.respond(RESPONSE_NO_ERROR)
+        self.assertTrue(self.node.hasAdvancedBurst())
+        self.assertEqual(self.node.configureAdvancedBurst(24), 24)
+        self.assertEqual(self.node.burst_packet_size, 24)
+
+    def test_refused(self):
+        self.node.options = (0x00, 0x00, 0x00, CAPABILITIES_ADVANCED_BURST_ENABLED)
+        self.respond(INVALID_MESSAGE)
+        self.assertEqual(self.node.configureAdvancedBurst(24), 8)
+
+    def test_not_capable(self):
+        self.assertFalse(self.node.hasAdvancedBurst())
+        self.assertEqual(self.node.configureAdvancedBurst(24), 8)
+        self.assertRaises(NodeError, self.node.configureAdvancedBurst, 12)
+
+    def test_configure_for_profile(self):
+        from ant.plus.profiles import HeartRate
+        profile = HeartRate(device_number=99)
+        self.node.networks = [NetworkKey()]
+        channel = Channel(self.node, 0)
+        for request in (NetworkKeyMessage(key=profile.network_key), ChannelAssignMessage(),
+                        ChannelIDMessage(device_number=99, device_type=0x78),
+                        ChannelFrequencyMessage(frequency=57),
+                        ChannelPeriodMessage(period=8070),
+                        ChannelSearchTimeoutMessage(timeout=30)):
+            self.driver.responses[request.encode()] = ChannelEventMessage(
+                message_id=request.msg_id).encode
+        channel.configure_for_profile(profile)
+        self.assertFalse(channel.is_free)
+        self.assertEqual(self.node.networks[0].key, profile.network_key)
+
+    def test_configure_for_profile_reuses(self):
+        from ant.plus.profiles import HeartRate
+        profile = HeartRate(device_number=99)
+        self.node.networks = [NetworkKey(), NetworkKey('ANT+', profile.network_key)]
+        channel = Channel(self.node, 0)
+        channel.is_free = False
+        sent = []
+        # Only the channel settings are answered, a key or assign would time out
+        for request in (NetworkKeyMessage(key=profile.network_key), ChannelAssignMessage()):
+            self.driver.responses[request.encode()] = \
+                lambda request=request: sent.append(request) or b''
+        for request in (ChannelIDMessage(device_number=99, device_type=0x78),
+                        ChannelFrequencyMessage(frequency=57),
+                        ChannelPeriodMessage(period=8070),
+                        ChannelSearchTimeoutMessage(timeout=30)):
+            self.driver.responses[request.encode()] = ChannelEventMessage(
+                message_id=request.msg_id).encode
+        channel.configure_for_profile(profile)
+        self.assertEqual(sent, [])
+        self.assertEqual([key.name for key in self.node.networks][1], 'ANT+')
+        self.assertEqual(self.node.networks[0].key, b'\x00' * 8)
+        self.assertEqual(self.node.getNetworkKey('ANT+').key, profile.network_key)
+
+    def test_extended_messages(self):
+        self.assertRaises(NodeError, self.node.enableExtendedMessages)
+
+        self.node.options = (0x00, 0x00, CAPABILITIES_EXT_MESSAGE_ENABLED, 0x00)
+        request = LibConfigMessage(EXTENDED_FORMAT_FLAG_CHANNEL_ID | EXTENDED_FORMAT_FLAG_TIMESTAMP)
+        response = ChannelEventMessage(message_id=MESSAGE_LIB_CONFIG)
+        self.driver.responses[request.encode()] = response.encode
+        self.node.enableExtendedMessages(timestamp=True)
+
+    def test_send(self):
+        self.node.burst_packet_size = 24
+        channel = Channel(self.node, 1)
+        frames, packets = burst.encode_burst(1, b'\x05' * 48, 24)
+        self.assertEqual(frames[2], MESSAGE_ADVANCED_BURST_DATA)
+        self.driver.responses[frames] = ChannelEventMessage(
+            number=1, message_id=MESSAGE_CHANNEL_EVENT_RF,
+            message_code=EVENT_TRANSFER_TX_COMPLETED).encode
+        report = channel.send_burst(b'\x05' * 48, timeout=5)
+        self.assertEqual(report.packets, 2)
 
 # TODO
 
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import sys
+import unittest
+
+from ant.core.message import *
+from ant.core.registry import DeviceRegistry
+from ant.plus.pages import *
+from test.helpers import Recorder
+
+
+def data_message(data, device_type=None, device_number=1):
+    msg = ChannelBroadcastDataMessage(number=0, data=data)
+    if device_type is not None:
+        record = ExtendedData(EXTENDED_FORMAT_FLAG_CHANNEL_ID, device_number=device_number,
+                              device_type=device_type, transmission_type=0x01)
+        msg.set_extended(record.flags, record.pack())
+    return get_proper_message(msg.encode())
+
+
+class PagesTest(unittest.TestCase):
+    def test_common_pages(self):
+        page = decode(0x11, b'\x50\xFF\xFF\x03\x01\x00\x02\x00')
+        self.assertIsInstance(page, ManufacturerInfoPage)
+        self.assertEqual((page.hardware_revision, page.manufacturer_id, page.model_number),
+                         (3, 1, 2))
+        page = decode(0x11, b'\x51\xFF\x04\x05\x39\x30\x00\x00')
+        self.assertEqual((page.software_revision_supplemental, page.software_revision,
+                          page.serial_number), (4, 5, 12345))
+        page = decode(0x11, b'\x52\xFF\x01\x0A\x00\x00\x80\x83')
+        self.assertEqual(page.operating_time, 20)
+        self.assertAlmostEqual(page.battery_voltage, 3.5)
+        self.assertEqual(page.battery_status, 0)
+        self.assertEqual(decode(0x11, b'\x52\xFF\x01\x0A\x00\x00\x80\x0F').battery_voltage,
+                         None)
+
+    def test_unknown(self):
+        self.assertEqual(decode(0x11, b'\x10\xFF\xFF\x03\x01\x00\x02\x00'), None)
+        self.assertEqual(lookup(0x0B, 0x7E), None)
+
+    def test_profiles(self):
+        page = decode(0x0B, b'\x10\x01\xB2\x5A\x64\x00\xC8\x00')
+        self.assertEqual(type(page).__name__, 'PowerOnlyPage')
+        self.assertEqual((page.event_count, page.instantaneous_cadence,
+                          page.accumulated_power, page.instantaneous_power), (1, 90, 100, 200))
+        self.assertIn('ant.plus.power', sys.modules)
+
+        # Heart rate monitors flip bit 7 of the page number
+        for number in (0x04, 0x84):
+            page = decode(0x78, bytes([number]) + b'\xFF\x10\x00\x20\x00\x05\x46')
+            self.assertEqual(type(page).__name__, 'PreviousBeatPage')
+            self.assertEqual((page.previous_beat_time, page.beat_time, page.beat_count,
+                              page.heart_rate), (16, 32, 5, 70))
+        page = decode(0x78, b'\x81\x10\x00\x01\x20\x00\x05\x46')
+        self.assertEqual(page.operating_time, 0x010010 * 2)
+        self.assertIsInstance(decode(0x78, b'\xD2\xFF\x01\x0A\x00\x00\x80\x83'),
+                              BatteryStatusPage)
+
+
+class PageDecoderTest(unittest.TestCase):
+    def test_device_type(self):
+        decoder = PageDecoder()
+        recorder = Recorder()
+        decoder.registerCallback(recorder)
+        decoder.process(data_message(b'\x50\xFF\xFF\x03\x01\x00\x02\x00', 0x0B))
+        # Pairing bit set
+        decoder.process(data_message(b'\x00\xFF\xFF\xFF\x20\x00\x05\x46', 0xF8))
+        # No device type to go by
+        decoder.process(data_message(b'\x50\xFF\xFF\x03\x01\x00\x02\x00'))
+        decoder.process(data_message(b'\x7E\xFF\xFF\x03\x01\x00\x02\x00', 0x0B))
+        self.assertEqual([type(page).__name__ for page in recorder.received],
+                         ['ManufacturerInfoPage', 'HeartRatePage'])
+        self.assertEqual((decoder.decoded, decoder.ignored), (2, 2))
+
+        decoder = PageDecoder(device_type=0x0B)
+        decoder.registerCallback(recorder)
+        decoder.process(data_message(b'\x50\xFF\xFF\x03\x01\x00\x02\x00'))
+        self.assertEqual(len(recorder.received), 3)
+
+    def test_registry(self):
+        registry = DeviceRegistry()
+        registry.process(get_proper_message(ChannelIDMessage(number=2, device_number=7,
+                                                             device_type=0x78).encode()))
+        decoder = PageDecoder(registry=registry)
+        recorder = Recorder()
+        decoder.registerCallback(recorder)
+        msg = ChannelBroadcastDataMessage(number=2, data=b'\x00\xFF\xFF\xFF\x20\x00\x05\x46')
+        decoder.process(get_proper_message(msg.encode()))
+        self.assertEqual(recorder.received[0].heart_rate, 70)
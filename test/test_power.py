@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import math
+import unittest
+
+from ant.core.message import *
+from ant.plus.power import *
+from test.helpers import Recorder
+
+
+def power_message(page, event_count, byte2, byte3, field1, field2):
+    data = struct.pack('<BBBBHH', page, event_count & 0xFF, byte2, byte3,
+                       field1 & 0xFFFF, field2 & 0xFFFF)
+    return get_proper_message(ChannelBroadcastDataMessage(number=0, data=data).encode())
+
+
+class BicyclePowerDecoderTest(unittest.TestCase):
+    def setUp(self):
+        self.decoder = BicyclePowerDecoder()
+        self.recorder = Recorder()
+        self.decoder.registerCallback(self.recorder)
+
+    def feed(self, msgs):
+        for msg in msgs:
+            self.decoder.process(msg)
+        return self.recorder.received
+
+    def test_power_only(self):
+        msgs = []
+        for event_count in range(250, 270):
+            # Each event adds 200 W, repeated twice
+            for repeat in range(2):
+                msgs.append(power_message(POWER_ONLY_PAGE, event_count, 0x80 | 50, 90,
+                                          0xFF00 + 200 * event_count, 210))
+        samples = self.feed(msgs)
+        self.assertEqual(len(samples), 19)
+        for sample in samples:
+            self.assertEqual(sample.events, 1)
+            self.assertAlmostEqual(sample.power, 200)
+            self.assertEqual(sample.instantaneous_power, 210)
+            self.assertEqual(sample.cadence, 90)
+            self.assertEqual(sample.pedal_balance, 50)
+
+    def test_missed_events(self):
+        samples = self.feed([power_message(POWER_ONLY_PAGE, 254, 0xFF, 0xFF, 0xFFF0, 0),
+                             power_message(POWER_ONLY_PAGE, 2, 0xFF, 0xFF, 0xFFF0 + 600, 0)])
+        self.assertEqual(samples[0].events, 4)
+        self.assertAlmostEqual(samples[0].power, 150)
+        self.assertEqual(samples[0].cadence, None)
+        self.assertEqual(samples[0].pedal_balance, None)
+
+    def test_crank_torque(self):
+        # 90 rpm: one crank revolution every 2/3 s, 40 Nm average
+        period = int(PERIOD_RATE * 2 / 3)
+        msgs = [power_message(CRANK_TORQUE_PAGE, event_count, event_count & 0xFF, 90,
+                              0xF000 + period * event_count, 0xF000 + 40 * 32 * event_count)
+                for event_count in range(250, 260)]
+        samples = self.feed(msgs)
+        self.assertEqual(len(samples), 9)
+        for sample in samples:
+            self.assertAlmostEqual(sample.cadence, 90, places=1)
+            self.assertAlmostEqual(sample.torque, 40)
+            self.assertAlmostEqual(sample.power, 40 * 2 * math.pi * 1.5, delta=0.5)
+
+    def test_wheel_torque(self):
+        period = int(PERIOD_RATE / 4)
+        msgs = [power_message(WHEEL_TORQUE_PAGE, event_count, event_count, 0xFF,
+                              period * event_count, 10 * 32 * event_count)
+                for event_count in range(5)]
+        samples = self.feed(msgs)
+        self.assertEqual(len(samples), 4)
+        self.assertAlmostEqual(samples[0].speed, 4 * WHEEL_CIRCUMFERENCE)
+        self.assertAlmostEqual(samples[0].power, 10 * 2 * math.pi * 4)
+        self.assertEqual(samples[0].cadence, None)
+
+    def test_coasting(self):
+        samples = self.feed([power_message(CRANK_TORQUE_PAGE, 1, 1, 0, 100, 50),
+                             power_message(CRANK_TORQUE_PAGE, 2, 1, 0, 100, 50)])
+        self.assertEqual((samples[0].power, samples[0].cadence), (0.0, 0.0))
+
+    def test_pages_kept_apart(self):
+        samples = self.feed([power_message(POWER_ONLY_PAGE, 1, 0xFF, 0xFF, 100, 0),
+                             power_message(CRANK_TORQUE_PAGE, 7, 0, 0, 0, 0),
+                             power_message(POWER_ONLY_PAGE, 2, 0xFF, 0xFF, 300, 0),
+                             power_message(0x50, 3, 0, 0, 0, 0)])
+        self.assertEqual(len(samples), 1)
+        self.assertAlmostEqual(samples[0].power, 200)
+        self.assertEqual(self.decoder.samples, 1)
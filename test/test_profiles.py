@@ -15,5 +15,10 @@ class ProfileTest(unittest.TestCase):
         self.assertEqual(8182, self.profile.channel_period)
         self.assertEqual(30, self.profile.search_timeout)
 
-
-
+    def test_subclasses(self):
+        power = BicyclePower(device_number=12)
+        self.assertEqual((power.device_type, power.device_number, power.channel_period),
+                         (0x0B, 12, 8182))
+        hrm = HeartRate()
+        self.assertEqual((hrm.device_type, hrm.channel_period, hrm.network_key),
+                         (0x78, 8070, NETWORK_KEY))
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import threading
+import unittest
+
+from ant.core.registry import *
+from ant.core.message import *
+from ant.core.node import Node, Channel
+from ant.core.canned import CannedDriver
+from test.helpers import extended
+
+
+class DeviceRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.registry = DeviceRegistry(max_devices=3, ttl=10.0, clock=lambda: self.now)
+
+    def test_lru(self):
+        for i in range(1, 4):
+            self.registry.process(extended(i))
+        self.registry.process(extended(1))  # 2 is now the least recent
+        self.registry.process(extended(4))
+        self.assertEqual(len(self.registry), 3)
+        self.assertEqual(self.registry.evicted, 1)
+        self.assertEqual(self.registry.get(0x78, 2, 0x01), None)
+        self.assertEqual(self.registry.get(0x78, 1, 0x01).count, 2)
+
+    def test_ttl(self):
+        self.registry.process(extended(1))
+        self.now = 6.0
+        self.registry.process(extended(2))
+        self.now = 12.0
+        self.assertEqual(self.registry.get(0x78, 1, 0x01), None)
+        self.assertEqual(self.registry.get(0x78, 2, 0x01).last_seen, 6.0)
+
+        self.registry.process(extended(3))
+        self.assertEqual(len(self.registry), 2)
+        self.now = 20.0
+        self.registry.expire()
+        self.assertEqual([device.device_number for device in self.registry], [3])
+
+    def test_truncated(self):
+        # The flag byte announces an RSSI the frame does not carry
+        raw = bytearray(extended(1).encode()[:-1])
+        raw[12] |= EXTENDED_FORMAT_FLAG_RSSI
+        raw.append(checksum(raw))
+        self.registry.process(get_proper_message(raw))
+        self.assertEqual(len(self.registry), 0)
+        self.assertEqual(self.registry.ignored, 1)
+
+    def test_pairing(self):
+        self.registry.process(ChannelIDMessage(number=2, device_number=0, device_type=0x78))
+        self.assertEqual(len(self.registry), 0)
+
+        self.registry.process(ChannelIDMessage(number=2, device_number=1234,
+                                               device_type=0x78, trans_type=0x01))
+        device = self.registry.getChannelDevice(2)
+        self.assertEqual(device.key, (0x78, 1234, 0x01))
+        self.assertEqual(device.channel, 2)
+        self.assertEqual(self.registry.getChannelDevice(3), None)
+
+        self.registry.process(extended(1234, number=2, rssi=-70))
+        self.assertEqual(self.registry.getChannelDevice(2).rssi, -70)
+
+        # Confirming the pairing counts as seeing the device
+        self.now = 8.0
+        self.registry.process(ChannelIDMessage(number=2, device_number=1234,
+                                               device_type=0x78, trans_type=0x01))
+        self.now = 15.0
+        self.assertEqual(self.registry.getChannelDevice(2).last_seen, 8.0)
+
+        self.now = 30.0
+        self.registry.expire()
+        self.assertEqual(self.registry.getChannelDevice(2), None)
+
+    def test_threads(self):
+        registry = DeviceRegistry(max_devices=None)
+
+        def feed(offset):
+            for i in range(500):
+                registry.process(extended(offset + i % 50))
+
+        threads = [threading.Thread(target=feed, args=(i * 50 + 1,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(registry), 200)
+        self.assertEqual(sum(device.count for device in registry), 2000)
+
+
+class ChannelDeviceTest(unittest.TestCase):
+    def test_request_id(self):
+        driver = CannedDriver('canned')
+        driver.open()
+        node = Node(driver, registry=DeviceRegistry())
+        channel = Channel(node, 1)
+        self.assertEqual(channel.getDevice(), None)
+
+        request = ChannelRequestMessage(number=1, message_id=MESSAGE_CHANNEL_ID)
+        driver.responses[request.encode()] = ChannelIDMessage(
+            number=1, device_number=4321, device_type=0x0B, trans_type=0x05).encode
+        node.evm.start()
+        try:
+            self.assertEqual(channel.requestID(), (4321, 0x0B, 0x05))
+        finally:
+            node.evm.stop()
+            driver.close()
+        self.assertEqual(channel.getDevice().key, (0x0B, 4321, 0x05))
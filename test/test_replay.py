@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import os
+import tempfile
+import time
+import unittest
+
+from ant.core import better_log
+from ant.core import event
+from ant.core import log
+from ant.core.message import *
+from ant.core.replay import *
+
+
+class ReplayDriverTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.ant')
+        os.close(handle)
+        self.frames = [ChannelBroadcastDataMessage(number=0, data=bytes([i]) * 8).encode()
+                       for i in range(3)]
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def _capture(self, writer_class, delay=0.0):
+        lw = writer_class(self.filename)
+        lw.logOpen()
+        for frame in self.frames:
+            lw.logWrite(b'\xA4\x01\x4A\x00\xEF')
+            lw.logRead(frame)
+            time.sleep(delay)
+        lw.logClose()
+        lw.close()
+
+    def _replay(self, speed):
+        driver = ReplayDriver(self.filename, speed=speed)
+        driver.open()
+        data = b''
+        while not driver.finished.is_set():
+            data += driver.read(event.READ_SIZE)
+        driver.close()
+        return data
+
+    def test_binary(self):
+        self._capture(log.LogWriter)
+        self.assertEqual(self._replay(None), b''.join(self.frames))
+
+    def test_text(self):
+        self._capture(better_log.LogWriter)
+        self.assertEqual(self._replay(None), b''.join(self.frames))
+
+    def test_speed(self):
+        self._capture(log.LogWriter, delay=0.1)
+        start = time.monotonic()
+        self.assertEqual(self._replay(1.0), b''.join(self.frames))
+        self.assertTrue(time.monotonic() - start >= 0.2)
+
+        start = time.monotonic()
+        self._replay(10.0)
+        self.assertTrue(time.monotonic() - start < 0.2)
+
+    def test_event_machine(self):
+        self._capture(log.LogWriter)
+        driver = ReplayDriver(self.filename, speed=None)
+        driver.open()
+        evm = event.EventMachine(driver)
+        evm.start()
+        msg = evm.waitForMessage(ChannelBroadcastDataMessage, timeout=5)
+        self.assertEqual(msg.encode(), self.frames[0])
+        evm.stop()
+        driver.close()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011, Martín Raúl Villalba
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+#
+##############################################################################
+
+import unittest
+
+from ant.core.scan import *
+from ant.core.message import *
+from ant.core.node import Node, Channel, NetworkKey, NodeError
+from ant.core.canned import CannedDriver
+from test.helpers import extended
+
+
+class DeviceTableTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        self.table = DeviceTable(clock=lambda: self.now)
+
+    def test_update(self):
+        for i in range(5):
+            self.table.process(extended(1, rssi=-50 - i, data=bytes([i]) * 8))
+            self.table.process(extended(2, device_type=0x0B))
+            self.now += 0.25
+        self.table.process(get_proper_message(ChannelBroadcastDataMessage().encode()))
+
+        self.assertEqual(len(self.table), 2)
+        self.assertEqual(self.table.ignored, 1)
+        self.assertIn((0x0B, 2, 0x01), self.table)
+        self.assertNotIn((0x78, 2, 0x01), self.table)
+
+        device = self.table.get(0x78, 1, 0x01)
+        self.assertEqual(device.key, (0x78, 1, 0x01))
+        self.assertEqual(device.count, 5)
+        self.assertEqual(device.first_seen, 100.0)
+        self.assertEqual(device.last_seen, 101.0)
+        self.assertAlmostEqual(device.rate, 4.0)
+        self.assertEqual(device.rssi, -54)
+        self.assertEqual(device.payload, b'\x04' * 8)
+        self.assertEqual(self.table.get(0x0B, 2, 0x01).rssi, None)
+        self.assertEqual(self.table.get(0x78, 3, 0x01), None)
+
+        self.assertEqual(sorted(device.device_number for device in self.table), [1, 2])
+        self.table.clear()
+        self.assertEqual(len(self.table), 0)
+
+    def test_ttl(self):
+        table = DeviceTable(ttl=10.0, clock=lambda: self.now)
+        table.process(extended(1))
+        for i in range(30):
+            self.now += 1.0
+            table.process(extended(2))
+        self.assertEqual(len(table), 1)
+        self.assertNotIn((0x78, 1, 0x01), table)
+        self.assertEqual([device.device_number for device in table.devices()], [2])
+        self.assertEqual(table.evicted, 1)
+
+    def test_many(self):
+        for i in range(300):
+            self.table.process(extended(i))
+        self.assertEqual(len(self.table), 300)
+        self.assertEqual(self.table.get(0x78, 299, 0x01).count, 1)
+
+
+class ScanModeTest(unittest.TestCase):
+    def setUp(self):
+        self.driver = CannedDriver('canned')
+        self.driver.open()
+        self.node = Node(self.driver)
+        self.node.networks = [NetworkKey('net')]
+        self.node.channels = [Channel(self.node, 0), Channel(self.node, 1)]
+        self.node.evm.start()
+
+        for request in (ChannelAssignMessage(), ChannelIDMessage(),
+                        LibConfigMessage(EXTENDED_FORMAT_FLAG_CHANNEL_ID |
+                                         EXTENDED_FORMAT_FLAG_RSSI),
+                        OpenRxScanModeMessage(), ChannelCloseMessage(),
+                        ChannelUnassignMessage()):
+            response = ChannelEventMessage(message_id=request.msg_id).encode()
+            if isinstance(request, ChannelCloseMessage):
+                response += ChannelEventMessage(message_id=MESSAGE_CHANNEL_EVENT_RF,
+                                                message_code=EVENT_CHANNEL_CLOSED).encode()
+            self.driver.responses[request.encode()] = (lambda response=response: response)
+
+    def tearDown(self):
+        self.node.evm.stop()
+        self.driver.close()
+
+    def test_scan(self):
+        self.assertRaises(NodeError, self.node.startScan)
+        self.node.options = (0x00, 0x00, CAPABILITIES_SCAN_MODE_ENABLED |
+                             CAPABILITIES_EXT_MESSAGE_ENABLED, 0x00)
+        table = self.node.startScan()
+        self.assertFalse(self.node.channels[0].is_free)
+        self.assertRaises(NodeError, self.node.startScan)
+
+        for number in (7, 8, 7):
+            self.node.respond_with(extended(number, rssi=-40))
+        for i in range(100):
+            if sum(device.count for device in table) == 3:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.get(0x78, 7, 0x01).count, 2)
+
+        self.node.stopScan()
+        self.assertTrue(self.node.channels[0].is_free)
+        self.assertRaises(NodeError, self.node.stopScan)
+
+    def test_refused(self):
+        self.node.options = (0x00, 0x00, CAPABILITIES_SCAN_MODE_ENABLED |
+                             CAPABILITIES_EXT_MESSAGE_ENABLED, 0x00)
+        sent = []
+        request = LibConfigMessage(EXTENDED_FORMAT_FLAG_CHANNEL_ID | EXTENDED_FORMAT_FLAG_RSSI)
+        self.driver.responses[request.encode()] = ChannelEventMessage(
+            message_id=MESSAGE_LIB_CONFIG, message_code=INVALID_MESSAGE).encode
+        request = LibConfigMessage(0x00)
+        response = ChannelEventMessage(message_id=MESSAGE_LIB_CONFIG).encode()
+        self.driver.responses[request.encode()] = \
+            lambda: sent.append(request) or response
+
+        self.assertRaises(NodeError, self.node.startScan)
+        self.assertTrue(self.node.channels[0].is_free)
+        self.assertEqual(sent, [request])
+        self.assertEqual(self.node.scan_table, None)
+        self.assertEqual(self.node.channels[0].cb, [])